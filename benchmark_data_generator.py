@@ -0,0 +1,306 @@
+'''
+SyntheticDataGenerator class generates realistic synthetic data for all the data sources used by the programme.
+The data has the same columns, formats and kinds of errors as the real data sources so the whole programme
+(extraction, cleaning, upload, schema update and queries) can be benchmarked at different scales.
+
+At scale 1 the number of rows is similar to the real data sources, scale 10 and 100 multiply the number of rows.
+
+Methods:
+-------
+generate_all()
+    Generates all data sets and returns them as a dictionary of Pandas DataFrames (or a list of dictionaries for the stores API).
+
+write_files(data, folder)
+    Saves the card details PDF, the products CSV, the date events JSON and the store API payloads in the folder.
+    Returns a dictionary with the paths to the saved files.
+
+    Parameters:
+    ----------
+    data: dict
+        Data sets returned by the generate_all() method.
+    folder: string
+        Folder where the files will be saved.
+
+load_source_tables(engine, data)
+    Uploads legacy_users and orders_table to the source database. The tables are uploaded as they are (like the real source
+    tables), without the final column types and partitioning of the output tables from table_schemas.
+
+    Parameters:
+    ----------
+    engine: db_engine
+        DB Engine object initiated with the init_db_engine() method from DatabaseConnector class.
+    data: dict
+        Data sets returned by the generate_all() method.
+'''
+
+import fitz
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import uuid
+
+
+######### VARIABLES #########
+# Number of rows generated at scale 1 (similar to the real data sources)
+base_row_counts = {
+    'legacy_users': 15000,
+    'card_details': 15000,
+    'stores': 450,
+    'products': 1850,
+    'orders': 120000,
+}
+# Share of rows filled with random text (the real data sources contain such rows which are removed by cleaning)
+garbage_rows_ratio = 0.001
+# Characters of the random text (upper case letters and digits like in the real data, so the text is rarely a valid number)
+garbage_characters = list('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
+# Values used to generate the data
+first_names = ['Sigfried', 'Guy', 'Harry', 'Darren', 'Garry', 'Sophie', 'Emma', 'Olivia', 'Jacob', 'Lena', 'Lukas', 'Anna', 'Liam', 'Noah', 'Mia']
+last_names = ['Noack', 'Allen', 'Lawrence', 'Hussain', 'Stone', 'Smith', 'Jones', 'Muller', 'Schmidt', 'Brown', 'Wilson', 'Taylor', 'Davies', 'Evans']
+companies = ['Heydrich Junitz KG', 'Fox Ltd', 'Johnson, Jones and Harris', 'Andrews-Duncan', 'Hoffmann AG', 'Baker Group', 'Walsh PLC']
+countries = [('United Kingdom', 'GB', 'Europe'), ('Germany', 'DE', 'Europe'), ('United States', 'US', 'America')]
+country_weights = [0.5, 0.3, 0.2]
+date_formats = ['%Y-%m-%d', '%Y %B %d', '%Y/%m/%d', '%B %Y %d']
+card_providers = ['VISA 16 digit', 'VISA 13 digit', 'Mastercard', 'American Express', 'Discover', 'JCB 16 digit', 'Maestro', 'Diners Club / Carte Blanche']
+store_types = ['Local', 'Super Store', 'Mall Kiosk', 'Outlet']
+localities = ['London', 'Manchester', 'Berlin', 'Munich', 'New York', 'Chicago', 'High Wycombe', 'Hamburg', 'Boston', 'Leeds']
+product_categories = ['toys-and-games', 'sports-and-leisure', 'pets', 'homeware', 'health-and-beauty', 'food-and-drink', 'diy']
+weight_units = ['kg', 'g', 'oz', 'ml', 'multi']
+time_periods = ['Morning', 'Midday', 'Evening', 'Late_Hours']
+
+
+######### CLASS #########
+class SyntheticDataGenerator:
+    def __init__(self, scale=1, seed=0):
+        self.scale = scale
+        self.rng = np.random.default_rng(seed)
+
+
+    def __rows(self, name):
+        return int(base_row_counts[name] * self.scale)
+
+
+    def __uuids(self, count):
+        return [str(uuid.UUID(bytes=self.rng.bytes(16), version=4)) for _ in range(count)]
+
+
+    def __choice(self, values, count, weights=None):
+        return np.asarray(values, dtype=object)[self.rng.choice(len(values), size=count, p=weights)]
+
+
+    def __dates(self, count, start, end):
+        # random dates between start and end written in one of the date formats used by the real data
+        days = pd.Timestamp(end).toordinal() - pd.Timestamp(start).toordinal()
+        dates = pd.Timestamp(start) + pd.to_timedelta(self.rng.integers(0, days, size=count), unit='D')
+        formats = self.__choice(date_formats, count, [0.97, 0.01, 0.01, 0.01])
+        return [date.strftime(date_format) for date, date_format in zip(dates, formats)]
+
+
+    def __garbage(self, df):
+        # replace a small share of rows with random text in every column, like in the real data sources
+        count = max(1, int(len(df) * garbage_rows_ratio))
+        rows = self.rng.choice(len(df), size=count, replace=False)
+        for column in df.columns:
+            if df[column].dtype == object:
+                df.loc[df.index[rows], column] = [''.join(text) for text in self.__choice(garbage_characters, (count, 10))]
+        return df
+
+
+    def generate_users(self):
+        count = self.__rows('legacy_users')
+        country = self.rng.choice(len(countries), size=count, p=country_weights)
+        df = pd.DataFrame({
+            'index': np.arange(count),
+            'first_name': self.__choice(first_names, count),
+            'last_name': self.__choice(last_names, count),
+            'date_of_birth': self.__dates(count, '1940-01-01', '2006-01-01'),
+            'company': self.__choice(companies, count),
+            'email_address': [f'user{number}@example.com' for number in range(count)],
+            'address': [f'{number % 300 + 1} Example Street\nExample Town' for number in range(count)],
+            'country': [countries[item][0] for item in country],
+            'country_code': [countries[item][1] for item in country],
+            'phone_number': [f'+44 {number:010d}' for number in self.rng.integers(0, 10**10, size=count)],
+            'join_date': self.__dates(count, '1992-01-01', '2022-06-01'),
+            'user_uuid': self.__uuids(count),
+        })
+        return self.__garbage(df)
+
+
+    def generate_card_details(self):
+        count = self.__rows('card_details')
+        card_numbers = self.rng.choice(9 * 10**15, size=count, replace=False) + 10**15
+        df = pd.DataFrame({
+            'card_number': card_numbers.astype(str).astype(object),
+            'expiry_date': [f'{month:02d}/{year:02d}' for month, year in zip(self.rng.integers(1, 13, size=count), self.rng.integers(23, 32, size=count))],
+            'card_provider': self.__choice(card_providers, count),
+            'date_payment_confirmed': self.__dates(count, '1995-01-01', '2022-06-01'),
+        })
+        # a few card numbers in the real data start with question marks
+        question_marks = self.rng.random(count) < 0.01
+        df.loc[question_marks, 'card_number'] = '???' + df.loc[question_marks, 'card_number']
+        return df
+
+
+    def generate_stores(self):
+        count = self.__rows('stores')
+        country = self.rng.choice(len(countries), size=count, p=country_weights)
+        stores = []
+        for number in range(count):
+            name, code, continent = countries[country[number]]
+            store_type = 'Web Portal' if number == 0 else str(self.__choice(store_types, 1)[0])
+            locality = str(self.__choice(localities, 1)[0])
+            stores.append({
+                'index': number,
+                'address': 'N/A' if number == 0 else f'{number} High Street\n{locality}',
+                'longitude': 'N/A' if number == 0 else str(round(self.rng.uniform(-120, 20), 5)),
+                'lat': None,
+                'locality': 'N/A' if number == 0 else locality,
+                'store_code': f'WEB-{number:07d}W' if number == 0 else f'{locality[:2].upper()}-{number:06d}{code[0]}',
+                'staff_numbers': str(int(self.rng.integers(5, 120))),
+                'opening_date': self.__dates(1, '1990-01-01', '2022-01-01')[0],
+                'store_type': store_type,
+                'latitude': 'N/A' if number == 0 else str(round(self.rng.uniform(25, 60), 5)),
+                'country_code': code,
+                'continent': continent,
+            })
+        return stores
+
+
+    def generate_products(self):
+        count = self.__rows('products')
+        units = self.__choice(weight_units, count, [0.3, 0.4, 0.1, 0.1, 0.1])
+        values = self.rng.uniform(0.05, 150, size=count).round(2)
+        weights = []
+        for unit, value in zip(units, values):
+            if unit == 'kg':
+                weights.append(f'{value}kg')
+            elif unit == 'g':
+                weights.append(f'{int(value * 10)}g')
+            elif unit == 'oz':
+                weights.append(f'{int(value)}oz')
+            elif unit == 'ml':
+                weights.append(f'{int(value * 10)}ml')
+            else:
+                weights.append(f'{int(self.rng.integers(2, 13))} x {int(self.rng.integers(10, 500))}g')
+        df = pd.DataFrame({
+            'product_name': [f'Product {number}' for number in range(count)],
+            'product_price': [f'£{price:.2f}' for price in self.rng.uniform(0.5, 1500, size=count)],
+            'weight': weights,
+            'category': self.__choice(product_categories, count),
+            'EAN': (self.rng.choice(9 * 10**12, size=count, replace=False) + 10**12).astype(str),
+            'date_added': self.__dates(count, '2000-01-01', '2022-06-01'),
+            'uuid': self.__uuids(count),
+            'removed': self.__choice(['Still_avaliable', 'Removed'], count, [0.9, 0.1]),
+            'product_code': [f'{chr(97 + number % 26)}{number % 10}-{number:07d}' for number in range(count)],
+        })
+        return df
+
+
+    def generate_date_events(self):
+        count = self.__rows('orders')
+        timestamps = pd.Timestamp('1992-01-01') + pd.to_timedelta(self.rng.integers(0, 30 * 365 * 86400, size=count), unit='s')
+        hours = timestamps.hour
+        df = pd.DataFrame({
+            'timestamp': timestamps.strftime('%H:%M:%S'),
+            'month': timestamps.month.astype(str),
+            'year': timestamps.year.astype(str),
+            'day': timestamps.day.astype(str),
+            'time_period': np.select([hours < 10, hours < 15, hours < 21], time_periods[:3], time_periods[3]),
+            'date_uuid': self.__uuids(count),
+        })
+        return self.__garbage(df)
+
+
+    def generate_orders(self, users, card_details, stores, products, date_events):
+        count = self.__rows('orders')
+        card_numbers = card_details['card_number'].str.lstrip('?').to_numpy()
+        store_codes = [store['store_code'] for store in stores]
+        df = pd.DataFrame({
+            'level_0': np.arange(count),
+            'index': np.arange(count),
+            'date_uuid': date_events['date_uuid'].to_numpy()[self.rng.permutation(count)],
+            'first_name': self.__choice(first_names, count),
+            'last_name': self.__choice(last_names, count),
+            'user_uuid': users['user_uuid'].to_numpy()[self.rng.integers(0, len(users), size=count)],
+            'card_number': card_numbers[self.rng.integers(0, len(card_numbers), size=count)],
+            'store_code': np.asarray(store_codes, dtype=object)[self.rng.integers(0, len(store_codes), size=count)],
+            'product_code': products['product_code'].to_numpy()[self.rng.integers(0, len(products), size=count)],
+            '1': None,
+            'product_quantity': self.rng.integers(1, 14, size=count),
+        })
+        return df
+
+
+    def generate_all(self):
+        '''
+        generate_all()
+            Generates all data sets and returns them as a dictionary of Pandas DataFrames (or a list of dictionaries for the stores API).
+        '''
+        data = {
+            'legacy_users': self.generate_users(),
+            'card_details': self.generate_card_details(),
+            'stores': self.generate_stores(),
+            'products': self.generate_products(),
+            'date_events': self.generate_date_events(),
+        }
+        data['orders_table'] = self.generate_orders(data['legacy_users'], data['card_details'], data['stores'], data['products'], data['date_events'])
+        return data
+
+
+    def write_files(self, data, folder):
+        '''
+        write_files(data, folder)
+            Saves the card details PDF, the products CSV, the date events JSON and the store API payloads in the folder.
+            Returns a dictionary with the paths to the saved files.
+
+            Parameters:
+            ----------
+            data: dict
+                Data sets returned by the generate_all() method.
+            folder: string
+                Folder where the files will be saved.
+        '''
+        folder = Path(folder)
+        folder.mkdir(parents=True, exist_ok=True)
+        paths = {
+            'card_details': folder / 'card_details.pdf',
+            'products': folder / 'products.csv',
+            'date_events': folder / 'date_details.json',
+            'stores': folder / 'stores.json',
+        }
+        self.__write_pdf(data['card_details'], paths['card_details'])
+        data['products'].to_csv(paths['products'])
+        data['date_events'].to_json(paths['date_events'])
+        with open(paths['stores'], 'w') as file:
+            json.dump(data['stores'], file)
+        return {name: str(path) for name, path in paths.items()}
+
+
+    def __write_pdf(self, df, path, rows_per_page=50):
+        # write the table as plain text columns which tabula reads back as one table per page
+        column_positions = [40, 190, 260, 420]
+        with fitz.open() as doc:
+            for start in range(0, len(df), rows_per_page):
+                page = doc.new_page()
+                rows = [list(df.columns)] + df.iloc[start:start + rows_per_page].values.tolist()
+                for row_number, row in enumerate(rows):
+                    for position, value in zip(column_positions, row):
+                        page.insert_text((position, 50 + row_number * 14), str(value), fontsize=8)
+            doc.save(str(path))
+
+
+    def load_source_tables(self, engine, data):
+        '''
+        load_source_tables(engine, data)
+            Uploads legacy_users and orders_table to the source database. The tables are uploaded as they are (like the real source
+            tables), without the final column types and partitioning of the output tables from table_schemas.
+
+            Parameters:
+            ----------
+            engine: db_engine
+                DB Engine object initiated with the init_db_engine() method from DatabaseConnector class.
+            data: dict
+                Data sets returned by the generate_all() method.
+        '''
+        for table_name in ['legacy_users', 'orders_table']:
+            data[table_name].to_sql(con=engine, name=table_name, index=False, if_exists='replace')
@@ -0,0 +1,267 @@
+'''
+End-to-end benchmark of the programme. For each scale factor the benchmark:
+    1. generates synthetic data with the SyntheticDataGenerator class,
+    2. uploads legacy_users and orders_table to a local source Postgres database,
+    3. serves the card details PDF, the date events JSON and the stores API from a local HTTP server
+       and the products CSV from a local S3 stand-in (the same HTTP server used as AWS_ENDPOINT_URL),
+    4. runs start_data_processing(), start_database_schema_update() and start_database_queries() against a local output Postgres database,
+    5. reports the time and throughput of every step and stage and saves them to the benchmark_results folder.
+
+The source and output databases need to exist on the local Postgres server before the benchmark is run.
+The S3 stand-in requires boto3 version 1.28 or newer (support for AWS_ENDPOINT_URL).
+
+Usage:
+    python3 ./benchmark_pipeline.py --scales 1 10 100 --pg-user postgres --pg-password postgres
+
+Methods:
+-------
+run_benchmark(scale, database_settings)
+    Generates the data for the scale factor, runs the whole programme and returns the metrics of all steps.
+
+    Parameters:
+    ----------
+    scale: number
+        Scale factor of the synthetic data (1 is similar in size to the real data sources).
+    database_settings: dict
+        Connection details of the local Postgres server and names of the source and output databases.
+'''
+
+import argparse
+from beautifultable import BeautifulTable
+from benchmark_data_generator import SyntheticDataGenerator
+from database_utils import DatabaseConnector
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+from pathlib import Path
+from pipeline_metrics import PipelineMetrics
+import re
+import start_data_processing as pipeline
+import threading
+import yaml
+
+
+######### VARIABLES #########
+# Folder where the generated data is saved
+benchmark_data_folder = './benchmark_data'
+# Folder where the benchmark results are saved
+benchmark_results_folder = './benchmark_results'
+# Bucket name used by the local S3 stand-in
+benchmark_bucket = 'benchmark-bucket'
+# Stages of the programme and the index of their first step in the steps list
+stages = [('data processing', 0), ('database schema', 21), ('database queries', 33)]
+
+
+######### LOCAL SOURCES SERVER #########
+class LocalSourcesHandler(BaseHTTPRequestHandler):
+    '''
+    Serves the generated files over HTTP, the stores API and S3 GetObject/HeadObject requests (path-style: /bucket/key).
+    '''
+    files = {}   # url path -> local file path
+    stores = []  # payloads returned by the stores API
+
+    def do_HEAD(self):
+        self.__respond(send_body=False)
+
+    def do_GET(self):
+        self.__respond(send_body=True)
+
+    def __respond(self, send_body):
+        store = re.fullmatch(r'/store_details/(\d+)', self.path)
+        if self.path == '/number_stores':
+            body = json.dumps({'name': 'Benchmark Stores', 'number_stores': len(self.stores)}).encode()
+            return self.__send(200, body, 'application/json', send_body)
+        if store and int(store.group(1)) < len(self.stores):
+            body = json.dumps(self.stores[int(store.group(1))]).encode()
+            return self.__send(200, body, 'application/json', send_body)
+        if self.path in self.files:
+            with open(self.files[self.path], 'rb') as file:
+                body = file.read()
+            return self.__send(200, body, 'application/octet-stream', send_body)
+        return self.__send(404, b'<Error><Code>NoSuchKey</Code></Error>', 'application/xml', send_body)
+
+    def __send(self, status, body, content_type, send_body):
+        # support ranged requests used by boto3 for large downloads
+        byte_range = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if status == 200 and byte_range:
+            start = int(byte_range.group(1))
+            end = int(byte_range.group(2)) if byte_range.group(2) else len(body) - 1
+            total = len(body)
+            body = body[start:end + 1]
+            status = 206
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', '"benchmark"')
+        self.send_header('Last-Modified', self.date_time_string())
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{start + len(body) - 1}/{total}')
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # do not print out every request
+        pass
+
+
+def start_local_sources_server(paths, stores):
+    # start the server on a free port in a background thread
+    LocalSourcesHandler.files = {
+        '/files/card_details.pdf': paths['card_details'],
+        '/files/date_details.json': paths['date_events'],
+        f'/{benchmark_bucket}/products.csv': paths['products'],
+    }
+    LocalSourcesHandler.stores = stores
+    server = ThreadingHTTPServer(('127.0.0.1', 0), LocalSourcesHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def set_environment(server_url, database_settings, folder):
+    # environmental variables override values from the .env file
+    os.environ.update({
+        'CARD_DETAILS_DATA': f'{server_url}/files/card_details.pdf',
+        'DATE_EVENTS_DATA': f'{server_url}/files/date_details.json',
+        'PRODUCTS_DATA': f's3://{benchmark_bucket}/products.csv',
+        'x_api_key': 'benchmark',
+        'retrive_store_api': f'{server_url}/store_details/',
+        'number_of_stores_api': f'{server_url}/number_stores',
+        'AWS_ENDPOINT_URL': server_url,
+        'AWS_ACCESS_KEY_ID': 'benchmark',
+        'AWS_SECRET_ACCESS_KEY': 'benchmark',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        # the synthetic orders refer to the users and date events of the garbage rows removed by cleaning
+        'ORPHAN_KEYS': 'quarantine',
+    })
+    # database credentials file with the local source and output databases
+    credentials = {}
+    for destination, database in [('SOURCE', database_settings['source_database']), ('OUTPUT', database_settings['output_database'])]:
+        credentials[destination] = {
+            'RDS_HOST': database_settings['host'],
+            'RDS_PASSWORD': database_settings['password'],
+            'RDS_USER': database_settings['user'],
+            'RDS_DATABASE': database,
+            'RDS_PORT': database_settings['port'],
+            'DATABASE_TYPE': 'postgresql',
+            'DBAPI': 'psycopg2',
+        }
+    db_creds_file = Path(folder) / 'db_creds.yaml'
+    with open(db_creds_file, 'w') as file:
+        yaml.safe_dump(credentials, file)
+    os.environ['DB_CREDS_FILE'] = str(db_creds_file)
+
+
+def prepare_sources(scale, database_settings):
+    # generate the data, start the local sources server and load the source database, returns the data folder and the server
+    folder = Path(benchmark_data_folder) / f'{scale}x'
+    print(f'\n############## Generating data at scale {scale}x: ##############\n')
+    generator = SyntheticDataGenerator(scale)
+    data = generator.generate_all()
+    paths = generator.write_files(data, folder)
+
+    server = start_local_sources_server(paths, data['stores'])
+    set_environment(f'http://127.0.0.1:{server.server_port}', database_settings, folder)
+
+    source_db_engine = DatabaseConnector().init_db_engine('SOURCE')
+    generator.load_source_tables(source_db_engine, data)
+    source_db_engine.close()
+    return folder, server
+
+
+######### BENCHMARK #########
+def run_benchmark(scale, database_settings):
+    '''
+    run_benchmark(scale, database_settings)
+        Generates the data for the scale factor, runs the whole programme and returns the metrics of all steps.
+
+        Parameters:
+        ----------
+        scale: number
+            Scale factor of the synthetic data (1 is similar in size to the real data sources).
+        database_settings: dict
+            Connection details of the local Postgres server and names of the source and output databases.
+    '''
+    folder, server = prepare_sources(scale, database_settings)
+
+    # run the whole programme with fresh step counter and metrics
+    pipeline.step_number = 0
+    pipeline.metrics = PipelineMetrics(str(folder / 'pipeline_metrics.jsonl'))
+    try:
+        pipeline.start_data_processing()
+        pipeline.start_database_schema_update()
+        pipeline.start_database_queries()
+        pipeline.metrics.end_step()
+    finally:
+        server.shutdown()
+
+    return [dict(step, stage=step_stage(pipeline.steps, step['step'])) for step in pipeline.metrics.steps]
+
+
+def step_stage(steps, step_name):
+    step_index = steps.index(step_name)
+    return [name for name, first_step in stages if step_index >= first_step][-1]
+
+
+def print_report(scale, steps):
+    # throughput of every step and stage
+    table = BeautifulTable(maxwidth=200)
+    table.columns.header = ['stage', 'step', 'wall_time_s', 'rows', 'rows_per_s', 'mb_per_s', 'peak_rss_mb']
+    for step in steps:
+        rows = max(step['rows_in'] or 0, step['rows_out'] or 0)
+        wall_time = max(step['wall_time_s'], 0.001)
+        step['rows_per_s'] = round(rows / wall_time)
+        step['mb_per_s'] = round((step['bytes_transferred'] or 0) / 1024 / 1024 / wall_time, 2)
+        table.rows.append([step['stage'], step['step'][:60], step['wall_time_s'], rows, step['rows_per_s'], step['mb_per_s'], step['peak_rss_mb']])
+
+    stage_table = BeautifulTable()
+    stage_table.columns.header = ['stage', 'wall_time_s', 'rows', 'rows_per_s']
+    for stage, _ in stages:
+        stage_steps = [step for step in steps if step['stage'] == stage]
+        wall_time = round(sum(step['wall_time_s'] for step in stage_steps), 3)
+        rows = sum(max(step['rows_in'] or 0, step['rows_out'] or 0) for step in stage_steps)
+        stage_table.rows.append([stage, wall_time, rows, round(rows / max(wall_time, 0.001))])
+
+    print(f'\n\n############## Benchmark results at scale {scale}x: ##############\n')
+    print(table)
+    print(f'\n############## Stages at scale {scale}x: ##############\n')
+    print(stage_table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end benchmark of the programme with synthetic data.')
+    parser.add_argument('--scales', nargs='+', type=float, default=[1, 10, 100], help='scale factors of the synthetic data')
+    parser.add_argument('--pg-host', default='localhost')
+    parser.add_argument('--pg-port', default=5432, type=int)
+    parser.add_argument('--pg-user', default='postgres')
+    parser.add_argument('--pg-password', default='postgres')
+    parser.add_argument('--source-database', default='mrdc_benchmark_source')
+    parser.add_argument('--output-database', default='mrdc_benchmark_output')
+    args = parser.parse_args()
+
+    database_settings = {
+        'host': args.pg_host,
+        'port': args.pg_port,
+        'user': args.pg_user,
+        'password': args.pg_password,
+        'source_database': args.source_database,
+        'output_database': args.output_database,
+    }
+
+    Path(benchmark_results_folder).mkdir(parents=True, exist_ok=True)
+    results_file = Path(benchmark_results_folder) / f'pipeline_{datetime.now().strftime("%Y%m%d%H%M%S")}.json'
+    results = {}
+    for scale in args.scales:
+        scale = int(scale) if float(scale).is_integer() else scale
+        results[f'{scale}x'] = run_benchmark(scale, database_settings)
+        print_report(scale, results[f'{scale}x'])
+        # save the results after every scale so they are not lost if a larger scale fails
+        with open(results_file, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    print(f'\n--> Benchmark results saved to: {results_file}\n')
+
+
+if __name__ == '__main__':
+    main()
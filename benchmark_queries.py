@@ -0,0 +1,178 @@
+'''
+Benchmark of the report queries. For each scale factor the benchmark:
+    1. generates synthetic data and loads the source database (the same way as benchmark_pipeline),
+    2. runs start_data_processing() and start_database_schema_update() to load the star schema to a local output Postgres database,
+    3. runs every query from report_queries (the queries of queries_data.sql run in steps 36 - 44) a few times without measuring
+       the time (warm-up) and then the given number of times measuring the time of the query and of reading all its rows,
+    4. reports p50, p95 and max latency of every query and saves them to the benchmark_results folder.
+
+The results files have the same structure for every run, so two runs (e.g. before and after a schema or index change)
+can be compared with the --compare option.
+
+The source and output databases need to exist on the local Postgres server before the benchmark is run.
+
+Usage:
+    python3 ./benchmark_queries.py --scales 1 10 --runs 20 --warmup 3 --pg-user postgres --pg-password postgres
+    python3 ./benchmark_queries.py --scales 1 10 --compare ./benchmark_results/queries_20240101120000.json
+
+Methods:
+-------
+benchmark_queries(engine, queries, runs, warmup)
+    Runs every query warmup times and then runs times measuring the latency, returns the latency statistics of every query.
+
+    Parameters:
+    ----------
+    engine: sqlalchemy.engine.Engine
+        The SQLAlchemy engine object.
+    queries: list
+        List of dictionaries with the step number, the title and the SQL query (see report_queries).
+    runs: int
+        Number of measured runs of each query.
+    warmup: int
+        Number of runs of each query before the measured runs.
+'''
+
+import argparse
+from beautifultable import BeautifulTable
+from benchmark_pipeline import benchmark_results_folder, prepare_sources
+from database_utils import DatabaseConnector
+from datetime import datetime
+import json
+import math
+from pathlib import Path
+from pipeline_metrics import PipelineMetrics
+from report_queries import report_queries
+from sqlalchemy import text
+import start_data_processing as pipeline
+import time
+
+
+######### BENCHMARK #########
+def load_star_schema(scale, database_settings):
+    # load the star schema at the scale factor with the programme (data processing and schema update)
+    folder, server = prepare_sources(scale, database_settings)
+    pipeline.step_number = 0
+    pipeline.metrics = PipelineMetrics(str(folder / 'pipeline_metrics.jsonl'))
+    try:
+        pipeline.start_data_processing()
+        pipeline.start_database_schema_update()
+        pipeline.metrics.end_step()
+    finally:
+        server.shutdown()
+
+
+def percentile(values, percent):
+    # nearest-rank percentile of the values
+    values = sorted(values)
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+def benchmark_queries(engine, queries, runs, warmup):
+    '''
+    benchmark_queries(engine, queries, runs, warmup)
+        Runs every query warmup times and then runs times measuring the latency, returns the latency statistics of every query.
+
+        Parameters:
+        ----------
+        engine: sqlalchemy.engine.Engine
+            The SQLAlchemy engine object.
+        queries: list
+            List of dictionaries with the step number, the title and the SQL query (see report_queries).
+        runs: int
+            Number of measured runs of each query.
+        warmup: int
+            Number of runs of each query before the measured runs.
+    '''
+    results = []
+    for query in queries:
+        print(f"--> Step {query['step']}: {query['title']}")
+        latencies = []
+        for run in range(warmup + runs):
+            start_time = time.perf_counter()
+            rows = engine.execute(text(query['query'])).fetchall()
+            latency = (time.perf_counter() - start_time) * 1000
+            engine.execute(text("COMMIT"))
+            if run >= warmup:
+                latencies.append(latency)
+        results.append({
+            'step': query['step'],
+            'title': query['title'],
+            'rows': len(rows),
+            'runs': runs,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'max_ms': round(max(latencies), 3),
+        })
+    return results
+
+
+def print_report(scale, results, previous_results=None):
+    # latency of every query and the change from the compared results file
+    table = BeautifulTable(maxwidth=200)
+    header = ['step', 'title', 'rows', 'p50_ms', 'p95_ms', 'max_ms']
+    if previous_results is not None:
+        header += ['previous_p50_ms', 'p50_change']
+    table.columns.header = header
+    previous_steps = {result['step']: result for result in previous_results or []}
+    for result in results:
+        row = [result['step'], result['title'][:60], result['rows'], result['p50_ms'], result['p95_ms'], result['max_ms']]
+        if previous_results is not None:
+            previous_result = previous_steps.get(result['step'])
+            if previous_result is None:
+                row += ['-', '-']
+            else:
+                row += [previous_result['p50_ms'], f"{result['p50_ms'] / max(previous_result['p50_ms'], 0.001):.2f}x"]
+        table.rows.append(row)
+
+    print(f'\n\n############## Query latency at scale {scale}x: ##############\n')
+    print(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the report queries on the star schema loaded with synthetic data.')
+    parser.add_argument('--scales', nargs='+', type=float, default=[1, 10], help='scale factors of the synthetic data')
+    parser.add_argument('--runs', default=20, type=int, help='number of measured runs of each query')
+    parser.add_argument('--warmup', default=3, type=int, help='number of runs of each query before the measured runs')
+    parser.add_argument('--skip-load', action='store_true', help='query the star schema already loaded to the OUTPUT database of the credentials file (DB_CREDS_FILE), use with a single scale')
+    parser.add_argument('--compare', help='results file of a previous run to compare with')
+    parser.add_argument('--pg-host', default='localhost')
+    parser.add_argument('--pg-port', default=5432, type=int)
+    parser.add_argument('--pg-user', default='postgres')
+    parser.add_argument('--pg-password', default='postgres')
+    parser.add_argument('--source-database', default='mrdc_benchmark_source')
+    parser.add_argument('--output-database', default='mrdc_benchmark_output')
+    args = parser.parse_args()
+
+    database_settings = {
+        'host': args.pg_host,
+        'port': args.pg_port,
+        'user': args.pg_user,
+        'password': args.pg_password,
+        'source_database': args.source_database,
+        'output_database': args.output_database,
+    }
+    previous_results = {}
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            previous_results = json.load(file)['scales']
+
+    Path(benchmark_results_folder).mkdir(parents=True, exist_ok=True)
+    results_file = Path(benchmark_results_folder) / f'queries_{datetime.now().strftime("%Y%m%d%H%M%S")}.json'
+    results = {'runs': args.runs, 'warmup': args.warmup, 'scales': {}}
+    for scale in args.scales:
+        scale = int(scale) if float(scale).is_integer() else scale
+        if not args.skip_load:
+            load_star_schema(scale, database_settings)
+        engine = DatabaseConnector().init_db_engine('OUTPUT')
+        results['scales'][f'{scale}x'] = benchmark_queries(engine, report_queries, args.runs, args.warmup)
+        engine.close()
+        print_report(scale, results['scales'][f'{scale}x'], previous_results.get(f'{scale}x') if args.compare else None)
+        # save the results after every scale so they are not lost if a larger scale fails
+        with open(results_file, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    print(f'\n--> Benchmark results saved to: {results_file}\n')
+
+
+if __name__ == '__main__':
+    main()
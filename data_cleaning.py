@@ -4,7 +4,7 @@ remove rows and columns to prepare data for upload to the output database
 
 Methods:
 -------
-clean_user_data(input_data, string_columns=[], date_columns=[], number_columns=[], integer_columns=[])
+clean_user_data(input_data, string_columns=[], date_columns=[], number_columns=[], integer_columns=[], drop_blank_columns=True)
     Changes column types based on the list of columns passed as the parameters for the data frame passed as input_data parameter. This method will also remove any blank columns or rows.
     
     Parameters:
@@ -16,9 +16,30 @@ clean_user_data(input_data, string_columns=[], date_columns=[], number_columns=[
     number_columns: string[], 
     integer_columns: string[]
         List of columns from the source DataFrame which will be converted to a data type based on the parameter name (e.g. string, dates, numbers and integers)
+    drop_blank_columns: bool
+        If False, the blank columns are kept (used when cleaning a chunk of a file, see remove_blank_columns).
+        
+remove_blank_columns(df)
+    Removes the columns where all data is blank. Used once on the whole table when the file was cleaned in chunks, 
+    as a column can be blank in one chunk only.
+    
+    Parameters:
+    ----------
+    df: DataFrame
+        A source DataFrame in which the blank columns will be removed.
+        
+add_event_timestamps(df)
+    Adds event_ts column to the date events with the timestamp of each event made of its date (year, month and day columns)
+    and its time (timestamp column), so the events can be sorted by a single column. Invalid dates and times are NaT.
+    
+    Parameters:
+    ----------
+    df: DataFrame
+        Cleaned date events DataFrame.
         
 clean_products_data(df)
-    Cleans Products data. This extracts and converts weight column to kg and price column.
+    Cleans Products data. This extracts and converts weight column to kg and price column 
+    and adds weight_class and still_available columns (the removed column is dropped).
     
     Parameters:
     ----------
@@ -34,22 +55,108 @@ clean_orders_data(df, columns_to_remove)
         A source DataFrame in which the data will be cleaned.
     columns_to_remove: string[]
         A list of columns to be removed
+
+remove_duplicate_keys(df, key_column, table_name, keep='report')
+    Finds rows with duplicated or blank primary keys before the data is uploaded and reports or removes them.
+    
+    Parameters:
+    ----------
+    df: DataFrame
+        A source DataFrame in which the keys will be checked.
+    key_column: string
+        Name of the primary key column.
+    table_name: string
+        Name of the table the data will be uploaded to (used in the messages and the quarantine file name).
+    keep: string
+        What to do with duplicated keys: 'report' - display the duplicates and stop the programme (default),
+        'first' / 'last' - keep only the first / last row of each key, 'quarantine' - move all rows with duplicated keys
+        to a CSV file in the quarantine folder. Rows with blank keys are removed in all modes except 'report'.
+
+remove_orphan_keys(df, dimension_keys, table_name, mode='report')
+    Finds rows of the fact table with foreign keys missing from the dimension tables before the data is uploaded and reports or removes them.
+    
+    Parameters:
+    ----------
+    df: DataFrame
+        A source DataFrame in which the foreign keys will be checked.
+    dimension_keys: dict
+        Dictionary with the foreign key columns as keys and the keys of the dimension tables (Series) as values.
+    table_name: string
+        Name of the table the data will be uploaded to (used in the messages and the quarantine file name).
+    mode: string
+        What to do with the rows with orphan keys: 'report' - display the orphan keys and stop the programme (default),
+        'quarantine' - move the rows to a CSV file in the quarantine folder.
+
+add_order_year(df, date_years)
+    Adds order_year column to the orders table with the year of the order taken from the date events (through date_uuid).
+    Orders whose date event has no valid year (year 0 of a blank year) are moved to a CSV file in the quarantine folder,
+    so they don't get a partition of their own.
+    
+    Parameters:
+    ----------
+    df: DataFrame
+        Orders DataFrame.
+    date_years: DataFrame
+        DataFrame with date_uuid and year columns of the date events.
+
+build_sales_rollup(df, products, stores, dates)
+    Returns the sales rollup: total sales, product quantity and number of orders by year, month, store, store type, country and channel (Web / Offline).
+    The report queries read the sales from the rollup instead of joining the whole orders table with the dimension tables.
+    All orders are included. The has_product, has_store and has_date columns show if the product, store and date of the orders 
+    were found (the dimension columns are blank if not), so each report query filters out the orders its join would leave out.
+    
+    Parameters:
+    ----------
+    df: DataFrame
+        Cleaned orders DataFrame.
+    products: DataFrame
+        DataFrame with product_code and product_price columns of the products.
+    stores: DataFrame
+        DataFrame with store_code, store_type and country_code columns of the stores.
+    dates: DataFrame
+        DataFrame with date_uuid, year and month columns of the date events.
 '''
 
+from collections import Counter
 from dateutil.parser import parse
 import pandas as pd
+from pathlib import Path
+from pipeline_logging import get_logger, log_dataframe
 import sys
 
 
+######### VARIABLES #########
+# logger of this module
+logger = get_logger(__name__)
+# Maximum number of incorrect values displayed in the warnings
+max_logged_examples = 10
+# Weight classes of the products and the weight (in kg) up to which each class is used, heavier products and products without weight need a truck
+weight_classes = ['Light', 'Mid_Sized', 'Heavy', 'Truck_Required']
+weight_class_limits = [2, 40, 140]
+# Folder where the rows removed because of invalid keys are saved
+quarantine_folder = './quarantine'
+# Allowed values of the keep parameter of remove_duplicate_keys() (DUPLICATE_KEYS in .env file)
+duplicate_keys_modes = ['report', 'first', 'last', 'quarantine']
+# Allowed values of the mode parameter of remove_orphan_keys() (ORPHAN_KEYS in .env file)
+orphan_keys_modes = ['report', 'quarantine']
+# Store types of the online sales (channel 'Web' in the sales rollup, all other store types are 'Offline')
+web_store_types = ['Web Portal']
+
+
+######### CLASS #########
+
+
 class DataCleaning:
     def __init__(self):
         self.incorrect_dates = set()
         self.conversion_errors = 0
+        # weights which could not be converted and how many times each of them occured
+        self.incorrect_weights = Counter()
     
     
-    def clean_user_data(self, input_data, string_columns=[], date_columns=[], number_columns=[], integer_columns=[]):
+    def clean_user_data(self, input_data, string_columns=[], date_columns=[], number_columns=[], integer_columns=[], drop_blank_columns=True):
         '''
-        clean_user_data(input_data, string_columns=[], date_columns=[], number_columns=[], integer_columns=[])
+        clean_user_data(input_data, string_columns=[], date_columns=[], number_columns=[], integer_columns=[], drop_blank_columns=True)
             Changes column types based on the list of columns passed as the parameters for the data frame passed as input_data parameter. 
             This method will also remove any blank columns or rows.
         
@@ -62,25 +169,27 @@ class DataCleaning:
             number_columns: string[], 
             integer_columns: string[]
                 List of columns from the source DataFrame which will be converted to a data type based on the parameter name (e.g. string, dates, numbers and integers)
+            drop_blank_columns: bool
+                If False, the blank columns are kept (used when cleaning a chunk of a file, see remove_blank_columns).
         '''
-        print('\n############## Changing column types: ##############\n') 
+        logger.info('\n############## Changing column types: ##############\n')
         try:
             cleaned_data = self.__change_column_types(input_data, string_columns, date_columns, number_columns)
         except Exception as e:
-            print(f'Error occured when trying to change the column types: {e}')
+            logger.error(f'Error occured when trying to change the column types: {e}')
             sys.exit()
         
-        print('\n\n----> Success. Data type changed successfully\n')
+        logger.info('\n\n----> Success. Data type changed successfully\n')
         
         # display datetime conversion errors
         if self.conversion_errors > 0:
-            print(f'\n############## Following {len(self.incorrect_dates)} items could not be converted to a datetime ({self.conversion_errors} errors in total): ##############\n')
-            print(self.incorrect_dates)
+            logger.warning(f'\n############## {len(self.incorrect_dates)} items could not be converted to a datetime ({self.conversion_errors} errors in total), e.g.: ##############\n')
+            logger.warning(f'{sorted(self.incorrect_dates, key=str)[:max_logged_examples]}')
+            logger.debug(f'All items which could not be converted: {self.incorrect_dates}')
             
-        print('\n\n############## Data information after column types changed: ##############\n')
-        print(cleaned_data.info())
+        log_dataframe(logger, cleaned_data, 'Data after column types changed')
         
-        print('\n\n############## Filtering blank columns and rows: ##############\n') 
+        logger.info('\n\n############## Filtering blank columns and rows: ##############\n')
         # get the number of minimum non-blank columns to keep in the df 
         # all columns minus dates and numbers = if all dates and numbers are blank 
         # then these rows are removed (at least one of these need to be non-blank)
@@ -88,13 +197,13 @@ class DataCleaning:
         if len(date_columns) > 0 or len(number_columns) > 0: # this is in case there are no numeric or date columns
             blank_columns_thresh = cleaned_data.shape[1] - len(date_columns) - len(number_columns) + 1
         try:
-            filtered_data = self.__filter_out_blanks(cleaned_data, blank_columns_thresh)
+            filtered_data = self.__filter_out_blanks(cleaned_data, blank_columns_thresh, drop_blank_columns)
         except Exception as e:
-            print(f'Error occured when trying to filter the data: {e}')
+            logger.error(f'Error occured when trying to filter the data: {e}')
             sys.exit()
         
-        print(f'----> {input_data.shape[1] - filtered_data.shape[1]} blanks columns removed.\n')
-        print(f'----> {input_data.shape[0] - filtered_data.shape[0]} blanks rows removed.\n')
+        logger.info(f'----> {input_data.shape[1] - filtered_data.shape[1]} blanks columns removed.\n')
+        logger.info(f'----> {input_data.shape[0] - filtered_data.shape[0]} blanks rows removed.\n')
                 
         # Update Int columns type
         ## get list of numeric columns (in case any of the original columns were dropped)
@@ -106,52 +215,92 @@ class DataCleaning:
                 for column in int_columns:
                     filtered_data[column]=filtered_data[column].fillna(0).astype('int64', errors='raise')
             except Exception as e:
-                print(f"An error occurred: {e}")
+                logger.error(f"An error occurred: {e}")
         
         # update time columns to show just time (no date):
         if 'timestamp' in filtered_data:
             filtered_data['timestamp'] = pd.to_datetime(filtered_data['timestamp']).dt.time
         
-        print('\n############## Data information after blank rows removed: ##############\n')
-        print(filtered_data.info())
-        print('\n############## First 5 rows of data: ##############\n')
-        print(filtered_data.head())
+        log_dataframe(logger, filtered_data, 'Data after blank rows removed')
         
         return filtered_data
       
+
+    def remove_blank_columns(self, df):
+        '''
+        remove_blank_columns(df)
+            Removes the columns where all data is blank. Used once on the whole table when the file was cleaned in chunks, 
+            as a column can be blank in one chunk only.
+            
+            Parameters:
+            ----------
+            df: DataFrame
+                A source DataFrame in which the blank columns will be removed.
+        '''
+        filtered_data = df.dropna(axis=1, how='all')
+        logger.info(f'----> {df.shape[1] - filtered_data.shape[1]} blanks columns removed.\n')
+        return filtered_data
+      
+
+    def add_event_timestamps(self, df):
+        '''
+        add_event_timestamps(df)
+            Adds event_ts column to the date events with the timestamp of each event made of its date (year, month and day columns)
+            and its time (timestamp column), so the events can be sorted by a single column. Invalid dates and times are NaT.
+            
+            Parameters:
+            ----------
+            df: DataFrame
+                Cleaned date events DataFrame.
+        '''
+        logger.info('\n\n############## Adding the event timestamps ##############\n')
+        try:
+            event_dates = pd.to_datetime(df[['year', 'month', 'day']], errors='coerce')
+            # the timestamp column keeps only the time of the event after the cleaning
+            event_times = pd.to_timedelta(df['timestamp'].astype('string'), errors='coerce')
+            df['event_ts'] = event_dates + event_times
+        except Exception as e:
+            logger.error(f'Error occured: {e}')
+            sys.exit()
+        
+        logger.info(f"----> Column event_ts added successfully, {df['event_ts'].isna().sum()} events without a valid date and time\n")
+        
+        return df
+    
+    
         
     def __change_column_types(self, input_data, string_columns=[], date_columns=[], number_columns=[]):
         df = input_data
         
         # Change string column types to string
         if len(string_columns) > 0:
-            print(f"\n----> String columns: {string_columns}\n")
+            logger.info(f"\n----> String columns: {string_columns}\n")
             try:
                 df[string_columns] = df[string_columns].astype('string')
-                print(f"    ---> Columns {string_columns} changed to string\n")
+                logger.info(f"    ---> Columns {string_columns} changed to string\n")
             except Exception as e:
-                print(f"An error occurred: {e}")
+                logger.error(f"An error occurred: {e}")
             
         # Parse date columns to datetime
         if len(date_columns) > 0:
-            print(f"\n----> Datetime columns: {date_columns}\n")
+            logger.info(f"\n----> Datetime columns: {date_columns}\n")
             try:
                 for column in date_columns:
-                    print(f"    ---> Chaning column {column} to datetime")
+                    logger.info(f"    ---> Chaning column {column} to datetime")
                     df[column] = df[column].apply(self.__parse_date)
                     df[column] = pd.to_datetime(df[column], errors='coerce')
             except Exception as e:
-                print(f"An error occurred: {e}")
+                logger.error(f"An error occurred: {e}")
         
         # Change numeric column types
         if len(number_columns) > 0:
-            print(f"\n----> Numeric columns: {number_columns}\n")
+            logger.info(f"\n----> Numeric columns: {number_columns}\n")
             try:
                 for column in number_columns:
-                    print(f"    ---> Chaning column {column} to float")
+                    logger.info(f"    ---> Chaning column {column} to float")
                     df[column] = pd.to_numeric(df[column], errors='coerce')
             except Exception as e:
-                print(f"An error occurred: {e}")
+                logger.error(f"An error occurred: {e}")
                 
         return df
 
@@ -168,16 +317,23 @@ class DataCleaning:
             return None
         
     
-    def __filter_out_blanks(self, df, blank_columns_thresh):
+    def __filter_out_blanks(self, df, blank_columns_thresh, drop_blank_columns=True):
         # drop columns where all data is blank
-        drop_col_df = df.dropna(axis=1, how='all')
+        drop_col_df = df.dropna(axis=1, how='all') if drop_blank_columns else df
         # drop rows where all numeric and date columns are blank
-        drop_df = drop_col_df.dropna(axis=0, thresh=blank_columns_thresh)
+        # (copied, so the columns can be updated without SettingWithCopyWarning when the rows are filtered)
+        drop_df = drop_col_df.dropna(axis=0, thresh=blank_columns_thresh).copy()
         return drop_df
         
     
     def __convert_product_weights(self, df):
+        self.incorrect_weights.clear()
         df['weight'] = df['weight'].apply(self.__extract_weight).astype(float)
+        
+        # display one summary of the weights which could not be converted
+        if self.incorrect_weights:
+            logger.warning(f'\n############## {len(self.incorrect_weights)} weight values could not be converted ({sum(self.incorrect_weights.values())} rows in total), e.g.: ##############\n')
+            logger.warning(f'{[value for value, _ in self.incorrect_weights.most_common(max_logged_examples)]}')
         return df
         
         
@@ -207,15 +363,17 @@ class DataCleaning:
                 return float(weight_str.replace('ml', '')) / 1000
             else:
                 raise ValueError(f"Unsupported unit: {weight_str}")
-        except Exception as e:
-            print("Error processing weight:", weight_str, e)
+        except Exception:
+            # count the values which could not be converted instead of reporting every row
+            self.incorrect_weights[str(weight_str)] += 1
             return None 
         
         
     def clean_products_data(self, df):
         '''
         clean_products_data(df)
-            Cleans Products data. This extracts and converts weight column to kg and price column.
+            Cleans Products data. This extracts and converts weight column to kg and price column 
+            and adds weight_class and still_available columns (the removed column is dropped).
         
             Parameters:
             ----------
@@ -223,25 +381,36 @@ class DataCleaning:
                 A source DataFrame in which the data will be cleaned.
         '''
         # convert product weight into kg
-        print('\n\n############## Converting weight into decimal numbers in kg: ##############\n') 
+        logger.info('\n\n############## Converting weight into decimal numbers in kg: ##############\n')
         try:
             df = self.__convert_product_weights(df)
         except Exception as e:
-            print(f'Error occured: {e}')
+            logger.error(f'Error occured: {e}')
             sys.exit()
-        print('----> Product weight column changed successfully\n')
+        logger.info('----> Product weight column changed successfully\n')
         
         # converts product price into a number
-        print('\n\n############## Converting price into decimal numbers: ##############\n') 
+        logger.info('\n\n############## Converting price into decimal numbers: ##############\n')
         try:
             df['product_price'] = df['product_price'].replace('£', '', regex=True).astype(float)
         except Exception as e:
-            print(f'Error occured: {e}')
+            logger.error(f'Error occured: {e}')
+            sys.exit()
+        logger.info('----> Product price column changed successfully\n')
+        
+        # adds the weight class and availability of the products
+        logger.info('\n\n############## Adding weight class and availability columns: ##############\n')
+        try:
+            bins = [float('-inf')] + weight_class_limits + [float('inf')]
+            df['weight_class'] = pd.cut(df['weight'], bins=bins, labels=weight_classes, right=False).astype('string').fillna(weight_classes[-1])
+            df['still_available'] = (df['removed'] != 'Removed').fillna(True).astype(bool)
+            df = df.drop(columns=['removed'])
+        except Exception as e:
+            logger.error(f'Error occured: {e}')
             sys.exit()
-        print('----> Product price column changed successfully\n')
+        logger.info('----> Columns weight_class and still_available added successfully\n')
         
-        print('\n############## Data information after weight and price converted: ##############\n')
-        print(df.info())
+        log_dataframe(logger, df, 'Data after weight and price converted')
         
         # return final dataframe
         return df
@@ -260,20 +429,220 @@ class DataCleaning:
                 A list of columns to be removed
         '''
         
-        print('\n\n############## Removing specified coloumns ##############\n')
+        logger.info('\n\n############## Removing specified coloumns ##############\n')
         try:
             df.drop(columns=columns_to_remove, inplace=True)
-            print(f'----> Success, columns {columns_to_remove} removed.\n')
+            logger.info(f'----> Success, columns {columns_to_remove} removed.\n')
         except Exception as e:
-            print(f'Error occured: {e}')
+            logger.error(f'Error occured: {e}')
             sys.exit()
        
-        print('\n############## Data information after columns removed: ##############\n')
-        print(df.info())
+        log_dataframe(logger, df, 'Data after columns removed')
+        
+        return df
+    
+    
+    def remove_duplicate_keys(self, df, key_column, table_name, keep='report'):
+        '''
+        remove_duplicate_keys(df, key_column, table_name, keep='report')
+            Finds rows with duplicated or blank primary keys before the data is uploaded and reports or removes them.
+            
+            Parameters:
+            ----------
+            df: DataFrame
+                A source DataFrame in which the keys will be checked.
+            key_column: string
+                Name of the primary key column.
+            table_name: string
+                Name of the table the data will be uploaded to (used in the messages and the quarantine file name).
+            keep: string
+                What to do with duplicated keys: 'report' - display the duplicates and stop the programme (default),
+                'first' / 'last' - keep only the first / last row of each key, 'quarantine' - move all rows with duplicated keys
+                to a CSV file in the quarantine folder. Rows with blank keys are removed in all modes except 'report'.
+        '''
+        logger.info(f"\n\n############## Checking primary key '{key_column}' of the {table_name} data ##############\n")
+        if keep not in duplicate_keys_modes:
+            logger.error(f'Error, incorrect duplicate keys mode: {keep}. Allowed modes: {duplicate_keys_modes}')
+            sys.exit()
+        
+        # duplicated() hashes the keys, so all duplicates are found in one pass
+        blank_keys = df[key_column].isna()
+        duplicated_keys = df[key_column].duplicated(keep=False) & ~blank_keys
+        if not blank_keys.any() and not duplicated_keys.any():
+            logger.info(f'----> All {df.shape[0]} keys are unique.\n')
+            return df
+        
+        duplicates = df.loc[duplicated_keys, key_column]
+        logger.warning(f'----> {table_name}: {duplicates.nunique()} duplicated keys in {duplicates.shape[0]} rows and {blank_keys.sum()} rows without a key, e.g.: {duplicates.unique()[:max_logged_examples].tolist()}\n')
+        if keep == 'report':
+            logger.error(f"Error, the primary key can't be added to the {table_name} table. Set DUPLICATE_KEYS to first, last or quarantine to remove the duplicates.")
+            sys.exit()
+        
+        if keep == 'quarantine':
+            removed_rows = blank_keys | duplicated_keys
+            self.__quarantine(df[removed_rows], f'{table_name}_duplicate_keys')
+        else:
+            removed_rows = blank_keys | df[key_column].duplicated(keep=keep)
+        logger.info(f'----> {removed_rows.sum()} rows removed.\n')
+        
+        return df[~removed_rows]
+    
+    
+    def remove_orphan_keys(self, df, dimension_keys, table_name, mode='report'):
+        '''
+        remove_orphan_keys(df, dimension_keys, table_name, mode='report')
+            Finds rows of the fact table with foreign keys missing from the dimension tables before the data is uploaded and reports or removes them.
+            
+            Parameters:
+            ----------
+            df: DataFrame
+                A source DataFrame in which the foreign keys will be checked.
+            dimension_keys: dict
+                Dictionary with the foreign key columns as keys and the keys of the dimension tables (Series) as values.
+            table_name: string
+                Name of the table the data will be uploaded to (used in the messages and the quarantine file name).
+            mode: string
+                What to do with the rows with orphan keys: 'report' - display the orphan keys and stop the programme (default),
+                'quarantine' - move the rows to a CSV file in the quarantine folder.
+        '''
+        logger.info(f'\n\n############## Checking foreign keys of the {table_name} data ##############\n')
+        if mode not in orphan_keys_modes:
+            logger.error(f'Error, incorrect orphan keys mode: {mode}. Allowed modes: {orphan_keys_modes}')
+            sys.exit()
+        
+        # isin() builds a hash set of the dimension keys, so each column is checked in one pass (blank keys are allowed by foreign keys)
+        orphan_rows = pd.Series(False, index=df.index)
+        for column, keys in dimension_keys.items():
+            orphans = df[column].notna() & ~df[column].isin(keys)
+            if orphans.any():
+                orphan_keys = df.loc[orphans, column]
+                logger.warning(f'----> {table_name}.{column}: {orphan_keys.nunique()} keys in {orphan_keys.shape[0]} rows are missing from the dimension table, e.g.: {orphan_keys.unique()[:max_logged_examples].tolist()}\n')
+            orphan_rows |= orphans
+        
+        if not orphan_rows.any():
+            logger.info(f'----> All foreign keys of {df.shape[0]} rows exist in the dimension tables.\n')
+            return df
+        if mode == 'report':
+            logger.error(f"Error, the foreign keys can't be added to the {table_name} table. Set ORPHAN_KEYS to quarantine to remove the rows with orphan keys.")
+            sys.exit()
+        
+        self.__quarantine(df[orphan_rows], f'{table_name}_orphan_keys')
+        logger.info(f'----> {orphan_rows.sum()} rows removed.\n')
+        
+        return df[~orphan_rows]
+    
+    
+    def __quarantine(self, df, file_name):
+        # save the removed rows, so they can be checked and corrected later
+        try:
+            Path(quarantine_folder).mkdir(parents=True, exist_ok=True)
+            file_path = Path(quarantine_folder) / f'{file_name}.csv'
+            df.to_csv(file_path, index=False)
+        except Exception as e:
+            logger.error(f'Error occured when saving the rows to the quarantine folder: {e}')
+            sys.exit()
+        logger.warning(f'----> {df.shape[0]} rows moved to {file_path}\n')
+    
+    
+    def add_order_year(self, df, date_years):
+        '''
+        add_order_year(df, date_years)
+            Adds order_year column to the orders table with the year of the order taken from the date events (through date_uuid).
+            Orders whose date event has no valid year (year 0 of a blank year) are moved to a CSV file in the quarantine folder,
+            so they don't get a partition of their own.
+            
+            Parameters:
+            ----------
+            df: DataFrame
+                Orders DataFrame.
+            date_years: DataFrame
+                DataFrame with date_uuid and year columns of the date events.
+        '''
+        logger.info('\n\n############## Adding the year of the orders ##############\n')
+        try:
+            years = date_years.drop_duplicates('date_uuid').set_index('date_uuid')['year']
+            df['order_year'] = df['date_uuid'].map(years).astype('Int64')
+        except Exception as e:
+            logger.error(f'Error occured: {e}')
+            sys.exit()
+        
+        missing_years = df['order_year'].isna().sum()
+        if missing_years > 0:
+            logger.warning(f'----> {missing_years} orders without a date event, they are stored in the default partition.\n')
+        # blank years of the date events are changed to 0 by clean_user_data()
+        invalid_years = (df['order_year'] < 1).fillna(False)
+        if invalid_years.any():
+            logger.warning(f'----> {invalid_years.sum()} orders with a date event without a valid year, e.g.: {df.loc[invalid_years, "order_year"].unique()[:max_logged_examples].tolist()}\n')
+            self.__quarantine(df[invalid_years], 'orders_table_invalid_years')
+            df = df[~invalid_years]
+            logger.info(f'----> {invalid_years.sum()} rows removed.\n')
+        logger.info('----> Column order_year added successfully\n')
         
         return df
     
     
+    def build_sales_rollup(self, df, products, stores, dates):
+        '''
+        build_sales_rollup(df, products, stores, dates)
+            Returns the sales rollup: total sales, product quantity and number of orders by year, month, store, store type, country and channel (Web / Offline).
+            The report queries read the sales from the rollup instead of joining the whole orders table with the dimension tables.
+            All orders are included. The has_product, has_store and has_date columns show if the product, store and date of the orders 
+            were found (the dimension columns are blank if not), so each report query filters out the orders its join would leave out.
+            
+            Parameters:
+            ----------
+            df: DataFrame
+                Cleaned orders DataFrame.
+            products: DataFrame
+                DataFrame with product_code and product_price columns of the products.
+            stores: DataFrame
+                DataFrame with store_code, store_type and country_code columns of the stores.
+            dates: DataFrame
+                DataFrame with date_uuid, year and month columns of the date events.
+        '''
+        logger.info('\n\n############## Building the sales rollup ##############\n')
+        try:
+            # look up the price, the store and the date of each order (the orphan keys have already been checked)
+            prices = products.drop_duplicates('product_code').set_index('product_code')['product_price']
+            store_details = stores.drop_duplicates('store_code').set_index('store_code')
+            date_details = dates.drop_duplicates('date_uuid').set_index('date_uuid')
+            # orders with blank foreign keys are kept by remove_orphan_keys(), the report queries joined a different set of
+            # dimension tables each (INNER JOIN), so the match of each dimension is kept instead of removing the orders
+            has_store = df['store_code'].isin(store_details.index)
+            store_types = df['store_code'].map(store_details['store_type'])
+            sales = pd.DataFrame({
+                'year': df['date_uuid'].map(date_details['year']),
+                'month': df['date_uuid'].map(date_details['month']),
+                'store_code': df['store_code'],
+                'store_type': store_types,
+                'country_code': df['store_code'].map(store_details['country_code']),
+                # the channel of the orders without a store is blank (a store without a type is Offline, the same as the CASE of the query)
+                'channel': store_types.isin(web_store_types).map({True: 'Web', False: 'Offline'}).where(has_store),
+                'has_product': df['product_code'].isin(prices.index),
+                'has_store': has_store,
+                'has_date': df['date_uuid'].isin(date_details.index),
+                'total_sales': df['product_quantity'] * df['product_code'].map(prices),
+                'product_quantity': df['product_quantity'],
+                'number_of_sales': df['date_uuid'].notna().astype('int64'),
+            })
+            
+            # min_count=1 keeps empty sums as NULL, the same as SUM in the database
+            rollup = sales.groupby(['year', 'month', 'store_code', 'store_type', 'country_code', 'channel', 'has_product', 'has_store', 'has_date'], dropna=False)[
+                ['total_sales', 'product_quantity', 'number_of_sales']
+            ].sum(min_count=1).reset_index()
+            # the sales are rounded to cents, so the sums in the database are exact
+            rollup['total_sales'] = rollup['total_sales'].round(2)
+            rollup[['year', 'month', 'product_quantity', 'number_of_sales']] = rollup[['year', 'month', 'product_quantity', 'number_of_sales']].astype('Int64')
+        except Exception as e:
+            logger.error(f'Error occured: {e}')
+            sys.exit()
+        
+        log_dataframe(logger, rollup, 'Sales rollup')
+        logger.info(f'----> Sales rollup built successfully: {df.shape[0]} orders in {rollup.shape[0]} rows\n')
+        
+        return rollup
+    
+    
     def remove_question_mark_from_column(self, df, column_name):
         """
         remove_question_mark_from_column(df, column_name)
@@ -286,11 +655,11 @@ class DataCleaning:
                 column_name: string
                     The name of the column to remove the '?' character from.
         """
-        print(f"\n\n############## Removing '?' character from column '{column_name}' ##############\n")
+        logger.info(f"\n\n############## Removing '?' character from column '{column_name}' ##############\n")
         try:
             df[column_name] = df[column_name].str.replace('?', '')
-            print(f"Question mark removed from '{column_name}' column.")
+            logger.info(f"Question mark removed from '{column_name}' column.")
             return df
         except Exception as e:
-            print(f"Error occurred: {e}")
+            logger.error(f"Error occurred: {e}")
             sys.exit()
\ No newline at end of file
@@ -3,7 +3,7 @@ DataExtractor class is a child class of DataProcessing class and contains method
 
 Methods:
 -------
-extract_from_remote_location(remote_data, data_type)
+extract_from_remote_location(remote_data, data_type, streaming=False, chunk_processor=None)
     Extract data from a remote data location (file or API) based on the data_type.
     
     Parameters:
@@ -14,6 +14,23 @@ extract_from_remote_location(remote_data, data_type)
     data_type: string
         This parameter helps to decide which data extraction method to use and which Pandas method to use to load the data into Pandas DataFrames.
         Allowed options are: api, csv, json and pdf.
+    streaming: boolean
+        If True, csv and json files are parsed while being downloaded instead of being saved to a temporary file first.
+    chunk_processor: function
+        Function called with every chunk of a streamed file (e.g. cleaning), only the returned DataFrames are kept in memory.
+        
+iter_remote_chunks(remote_data_path, data_type, chunk_rows=None)
+    Streams a remote csv or json file and yields the data as Pandas DataFrames of up to chunk_rows rows.
+    JSON files saved as an object of columns are read as a whole before the first chunk is yielded (see the method for details).
+    
+    Parameters:
+    ----------
+    remote_data_path: string
+        URL to the remote file location (https or s3).
+    data_type: string
+        Allowed options are: csv and json.
+    chunk_rows: number
+        Maximum number of rows in each yielded DataFrame. Defaults to STREAMING_CHUNK_ROWS from .env file.
         
 list_db_tables(engine)
     Returns a list of all tables available in the database defined in the engine parameter.
@@ -36,21 +53,38 @@ read_rds_table(engine, table_name)
 from data_processing import DataProcessing
 from dotenv import load_dotenv
 import fitz
+import ijson
 import os
 import pandas as pd
+from pipeline_logging import get_logger, log_dataframe
 from sqlalchemy import inspect
 import sys
 
 
+######### VARIABLES ######### 
+# logger of this module
+logger = get_logger(__name__)
+# Default number of rows parsed at once when streaming a file (can be changed with STREAMING_CHUNK_ROWS in .env file)
+default_streaming_chunk_rows = 100000
+# File extensions of line-delimited JSON files which can be parsed in chunks
+json_lines_extensions = ('.jsonl', '.ndjson')
+# Environmental variables which are never saved to the fixture bundle
+secret_variables = ['x_api_key']
+
+
+######### CLASS #########
 class DataExtractor(DataProcessing):
     def __init__(self):
         # initiate dotenv to load environmental variables from .env file
         load_dotenv()
+        super().__init__()
+        # number of rows parsed at once when streaming a file
+        self.streaming_chunk_rows = int(os.getenv('STREAMING_CHUNK_ROWS', default_streaming_chunk_rows))
 
 
-    def extract_from_remote_location(self, remote_data, data_type):
+    def extract_from_remote_location(self, remote_data, data_type, streaming=False, chunk_processor=None):
         '''
-        extract_from_remote_location(remote_data, data_type)
+        extract_from_remote_location(remote_data, data_type, streaming=False, chunk_processor=None)
             Extract data from a remote data location (file or API) based on the data_type.
             
             Parameters:
@@ -61,42 +95,55 @@ class DataExtractor(DataProcessing):
             data_type: string
                 This parameter helps to decide which data extraction method to use and which Pandas method to use to load the data into Pandas DataFrames.
                 Allowed options are: api, csv, json and pdf.
+            streaming: boolean
+                If True, csv and json files are parsed while being downloaded instead of being saved to a temporary file first.
+                PDF files always need to be downloaded as tabula reads them from the local disk.
+            chunk_processor: function
+                Function called with every chunk of a streamed file (e.g. cleaning), only the returned DataFrames are kept in memory,
+                so the whole raw file is never held in memory at once.
         '''
+        # PDF files can not be streamed
+        streaming = streaming and data_type in ['csv', 'json']
+        
         # check if data type is correct
         if data_type == 'api':
             env_variables = {}
             for variable in remote_data:
-                env_variables[variable] = os.getenv(variable)
+                env_variables[variable] = self.__getenv(variable)
             
             headers = self.__create_headers(env_variables['x_api_key'])
             number_of_stores_api = env_variables['number_of_stores_api']
             retrive_store_api = env_variables['retrive_store_api']
             
-            print('\n############## Accessing the API: ##############')
+            logger.info('\n############## Accessing the API: ##############')
             number_of_stores = super().retrive_data_from_api(number_of_stores_api, headers)['number_stores']
-            print(f"\n--> There are {number_of_stores} stores available in the API\n\n")
+            logger.info(f"\n--> There are {number_of_stores} stores available in the API\n\n")
     
         elif data_type in ['pdf', 'csv', 'json']:
-            print('\n############## Accessing the file: ##############')
-            remote_data_path = os.getenv(remote_data)
-            print(f'\n--> Data link: {remote_data_path}\n\n')
+            logger.info('\n############## Accessing the file: ##############')
+            remote_data_path = self.__getenv(remote_data)
+            logger.info(f'\n--> Data link: {remote_data_path}\n\n')
             
-            if remote_data_path:
-                print('\n############## Checking the file: ##############') 
+            if remote_data_path and streaming:
+                logger.info(f"\n--> The file will be streamed in chunks of {self.streaming_chunk_rows} rows.\n\n")
+            elif remote_data_path:
+                logger.info('\n############## Checking the file: ##############')
                 # download the file to a temporary folder
                 downloaded_file = super().download_file(remote_data_path, data_type)
-                print(f"\n-->File accessed successfully.\n\n")
+                logger.info(f"\n-->File accessed successfully.\n\n")
             else:
                 # stop the programme if the remote_data_path could not be read from .env file
-                print(f'\n--> Error, could not get remote_data_path from .env file.\n\n')
+                logger.error(f'\n--> Error, could not get remote_data_path from .env file.\n\n')
                 sys.exit()
         else:
             # stop the programme if the data_type is incorrect
-            print(f'\n--> Error, data_type should be one of the following options: pdf, csv, json or api.\n\n')
+            logger.error(f'\n--> Error, data_type should be one of the following options: pdf, csv, json or api.\n\n')
             sys.exit()
             
-        print('\n############## Processing the data: ##############\n\n')
-        if data_type == 'json':
+        logger.info('\n############## Processing the data: ##############\n\n')
+        if streaming:
+            extracted_df = self.__process_stream(remote_data_path, data_type, chunk_processor)
+        elif data_type == 'json':
             extracted_df = pd.read_json(downloaded_file)
         elif data_type == 'csv':
             extracted_df = pd.read_csv(downloaded_file, index_col=0)
@@ -105,25 +152,112 @@ class DataExtractor(DataProcessing):
         elif data_type == 'api':
             extracted_df = self.__process_api_data(retrive_store_api, number_of_stores, data_type, headers)
 
-        print(f'\n--> Data loaded successfully\n\n')
-        print('\n############## First 5 rows of data: ##############\n') 
-        print(extracted_df.head())
-        print('\n\n############## Data information: ##############\n')
-        print(extracted_df.info())
+        logger.info(f'\n--> Data loaded successfully, {extracted_df.shape[0]} rows and {extracted_df.shape[1]} columns.\n\n')
+        log_dataframe(logger, extracted_df, 'Extracted data')
         # return extracted data frame
         return extracted_df
             
             
+    def __getenv(self, variable):
+        # in replay mode the recorded value is used (if recorded), in record mode the value is saved to the fixture bundle
+        if self.extraction_mode == 'replay':
+            recorded_value = self.fixture_bundle.get_variable(variable)
+            return recorded_value if recorded_value is not None else os.getenv(variable)
+        value = os.getenv(variable)
+        if self.extraction_mode == 'record' and variable not in secret_variables:
+            self.fixture_bundle.save_variable(variable, value)
+        return value
+    
+    
+    def iter_remote_chunks(self, remote_data_path, data_type, chunk_rows=None):
+        '''
+        iter_remote_chunks(remote_data_path, data_type, chunk_rows=None)
+            Streams a remote csv or json file and yields the data as Pandas DataFrames of up to chunk_rows rows.
+            Parsing overlaps the download and only one chunk of the file is kept in memory at a time, except for JSON objects of columns.
+            Line-delimited JSON files (.jsonl or .ndjson) are parsed in chunks by Pandas. Other JSON files are parsed incrementally
+            with ijson and arrays of records are yielded in chunks of records. JSON objects of columns (e.g. {"column": {"0": value}}) are not
+            streamed: a row is complete only when the last column has been read, so all columns are read into memory (one column at a time,
+            without keeping the raw text or the parsed JSON objects) and then yielded in chunks of rows.
+            
+            Parameters:
+            ----------
+            remote_data_path: string
+                URL to the remote file location (https or s3).
+            data_type: string
+                Allowed options are: csv and json.
+            chunk_rows: number
+                Maximum number of rows in each yielded DataFrame. Defaults to STREAMING_CHUNK_ROWS from .env file.
+        '''
+        chunk_rows = chunk_rows or self.streaming_chunk_rows
+        stream = super().open_stream(remote_data_path)
+        try:
+            if data_type == 'csv':
+                for chunk in pd.read_csv(stream, index_col=0, chunksize=chunk_rows):
+                    yield chunk
+            elif data_type == 'json' and remote_data_path.lower().endswith(json_lines_extensions):
+                for chunk in pd.read_json(stream, lines=True, chunksize=chunk_rows):
+                    yield chunk
+            elif data_type == 'json':
+                yield from self.__iter_json_chunks(stream, chunk_rows)
+            else:
+                logger.error(f'\n--> Error, only csv and json files can be streamed.\n\n')
+                sys.exit()
+            # read the rest of the stream (e.g. trailing whitespace), so the recorded fixture file is complete
+            while stream.read(self.network_read_size):
+                pass
+        finally:
+            stream.close()
+            
+            
+    def __iter_json_chunks(self, stream, chunk_rows):
+        # the first character of the file shows if it is an array of records or an object of columns
+        first_character = stream.peek(64).lstrip()[:1]
+        if first_character == b'[':
+            records = []
+            for record in ijson.items(stream, 'item', use_float=True):
+                records.append(record)
+                if len(records) == chunk_rows:
+                    yield pd.DataFrame(records)
+                    records = []
+            if records:
+                yield pd.DataFrame(records)
+        else:
+            # the whole table is needed before the first row is complete, so this layout is read into memory and only yielded in chunks
+            # each column is turned into a Series as soon as it is read, so the parsed JSON objects are released column by column
+            columns = {column: pd.Series(values) for column, values in ijson.kvitems(stream, '', use_float=True)}
+            df = pd.DataFrame(columns)
+            del columns
+            # the row labels are numbers saved as strings in the JSON file
+            if df.index.astype(str).str.isdigit().all():
+                df.index = df.index.astype('int64')
+            for start in range(0, df.shape[0], chunk_rows):
+                # copies, so the chunks can be changed by the chunk processor without changing the whole DataFrame
+                yield df.iloc[start:start + chunk_rows].copy()
+    
+    
+    def __process_stream(self, remote_data_path, data_type, chunk_processor=None):
+        try:
+            # only the processed chunks are kept, the raw chunks are released one by one
+            chunks = [chunk_processor(chunk) if chunk_processor else chunk for chunk in self.iter_remote_chunks(remote_data_path, data_type)]
+            final_df = pd.concat(chunks)
+            del chunks
+        except Exception as e:
+            logger.error(f'Error occured when streaming the data: {e}')
+            sys.exit()
+        
+        return final_df
+    
+    
     def __process_pdf_file(self, file_path, data_type):
         # check the number of pages in the pdf file
         page_count = self.__get_page_count(file_path)
-        print(f"--> There are {page_count} pages in the PDF\n\n")
+        logger.info(f"--> There are {page_count} pages in the PDF\n\n")
         dfs = super().process_with_progress(file_path, page_count, data_type)
         # concatenate all pages into a single data frame
         try:
             final_df = pd.concat(dfs, ignore_index=True)
         except Exception as e:
-            print(f'Error occured when concatenating pages data: {e}')
+            logger.error(f'Error occured when concatenating pages data: {e}')
             sys.exit()
 
         return final_df
@@ -135,7 +269,7 @@ class DataExtractor(DataProcessing):
                 page_count = doc.page_count
                 return page_count
         except Exception as e:
-            print(f'Error occured: {e}')
+            logger.error(f'Error occured: {e}')
             sys.exit()
             
             
@@ -154,7 +288,7 @@ class DataExtractor(DataProcessing):
             df = pd.DataFrame(dfs)
             df = df.set_index('index')  # Set 'index' column as the DataFrame index
         except Exception as e:
-            print(f'Error occured when retriving data: {e}')
+            logger.error(f'Error occured when retriving data: {e}')
             sys.exit()
 
         return df
@@ -171,30 +305,37 @@ class DataExtractor(DataProcessing):
                 DB Engine object initiated with the init_db_engine() method from DatabaseConnector class.
         '''
         # get a list of tables in the db
-        if engine:
+        if engine or self.extraction_mode == 'replay':
             try:
-                inspector = inspect(engine)
-                tables = inspector.get_table_names()
+                if self.extraction_mode == 'replay':
+                    tables = self.fixture_bundle.load_json('rds:tables')
+                else:
+                    inspector = inspect(engine)
+                    tables = inspector.get_table_names()
             except Exception as e:
-                print(f'Error occured when reading tables from the DB: {e}')
-                engine.close()
+                logger.error(f'Error occured when reading tables from the DB: {e}')
+                if engine:
+                    engine.close()
                 sys.exit()
+            
+            if self.extraction_mode == 'record':
+                self.fixture_bundle.save_json('rds:tables', tables)
                 
             if len(tables) == 0:
-                print('There are no tables in the database.')
+                logger.info('There are no tables in the database.')
                 return
             elif len(tables) == 1:
-                print(f'\n--> There is {len(tables)} table available in the database\n') 
+                logger.info(f'\n--> There is {len(tables)} table available in the database\n')
             else:
-                print(f'\n--> There are {len(tables)} tables available in the database\n') 
+                logger.info(f'\n--> There are {len(tables)} tables available in the database\n')
             if len(tables) > 0:
-                print('\n############## Available tables: ##############\n') 
-                print(tables)
+                logger.info('\n############## Available tables: ##############\n')
+                logger.info(f'{tables}')
         
             return tables
             
         else:
-            print(f'Error, the DB engine was not initiated correctly.')
+            logger.error(f'Error, the DB engine was not initiated correctly.')
             sys.exit()
             
             
@@ -212,7 +353,12 @@ class DataExtractor(DataProcessing):
         '''
         # read data from the selected table and creat a panda dataframe
         try:
-            data = pd.read_sql_table(table_name, engine)
+            if self.extraction_mode == 'replay':
+                data = self.fixture_bundle.load_frame('rds:' + table_name)
+            else:
+                data = pd.read_sql_table(table_name, engine)
+            if self.extraction_mode == 'record':
+                self.fixture_bundle.save_frame('rds:' + table_name, data)
             
             if 'index' in data:
                 data = data.set_index('index')  # Set 'index' column as the DataFrame index
@@ -220,15 +366,13 @@ class DataExtractor(DataProcessing):
                 data.rename(columns={'level_0': 'index'}, inplace=True) # rename column for orders_table
                 data = data.set_index('index')
         except Exception as e:
-            print(f'Error occured when reading the data from {table_name} table: {e}')
-            engine.close()
+            logger.error(f'Error occured when reading the data from {table_name} table: {e}')
+            if engine:
+                engine.close()
             sys.exit()
     
-        print(f'\n--> {data.shape[0]} rows and {data.shape[1]} columns read from table name {table_name}.\n') 
-        print('\n############## First 5 rows of data: ##############\n') 
-        print(data.head())
-        print('\n\n############## Data information: ##############\n')
-        print(data.info())
+        logger.info(f'\n--> {data.shape[0]} rows and {data.shape[1]} columns read from table name {table_name}.\n')
+        log_dataframe(logger, data, f'Table {table_name}')
         return data
     
     
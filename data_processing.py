@@ -37,26 +37,99 @@ retrive_data_from_api(api_url, headers)
         An API URL where from the data should be extracted.
     headers: object {}
         A headers object which is required for API connection containing API KEY and Content-Type.
+        
+open_stream(remote_file_path)
+    Opens a remote file (https or s3) as a buffered binary stream without saving it to the local disk.
+    
+    Parameters:
+    ----------
+    remote_file_path: string
+        URL to the remote file location which need to be streamed.
+        
+pop_bytes_transferred()
+    Returns the number of bytes downloaded from the remote data sources since the last call and resets the counter.
+    
+Extraction modes (EXTRACTION_MODE in .env file):
+    live - data is read from the remote data sources (default),
+    record - data is read from the remote data sources and every response is saved to the fixture bundle (FIXTURE_BUNDLE folder),
+    replay - data is read from the fixture bundle only, no connection to the remote data sources is made.
 '''
 
 import boto3
+from fixture_bundle import FixtureBundle
+import io
+import logging
+import os
 from pathlib import Path
+from pipeline_logging import get_logger
 import requests
 import sys
 import tabula
 
 
 ######### VARIABLES ######### 
+# logger of this module
+logger = get_logger(__name__)
 # Temporary folder name
 temporary_folder_name = 'temp_files'
 # Temporary file name (without extension)
 temporary_file_name = 'temporary'
+# Default number of bytes read from the network in one go (can be changed with NETWORK_READ_SIZE in .env file)
+default_network_read_size = 1024 * 1024
+# Allowed extraction modes (can be changed with EXTRACTION_MODE in .env file)
+extraction_modes = ['live', 'record', 'replay']
+# Default folder of the fixture bundle used in record and replay modes (can be changed with FIXTURE_BUNDLE in .env file)
+default_fixture_bundle_folder = './fixture_bundle'
 
 
 ######### CLASS #########       
+class ChunkedStream(io.RawIOBase):
+    '''
+    Read-only file-like object built on top of an iterator of byte chunks (e.g. HTTP response or S3 object body).
+    It allows Pandas to parse the data while it is still being downloaded.
+    '''
+    def __init__(self, chunks, on_close=None):
+        self.__chunks = chunks
+        self.__buffer = memoryview(b'')
+        self.__on_close = on_close
+        
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        # get the next non-empty chunk if the current one has been fully read
+        while len(self.__buffer) == 0:
+            try:
+                self.__buffer = memoryview(next(self.__chunks))
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self.__buffer))
+        buffer[:size] = self.__buffer[:size]
+        self.__buffer = self.__buffer[size:]
+        return size
+    
+    def close(self):
+        if not self.closed and self.__on_close:
+            self.__on_close()
+        super().close()
+
+
 class DataProcessing():
-    def __initi__(self):
-        pass
+    def __init__(self):
+        # number of bytes read from the network in one go
+        self.network_read_size = int(os.getenv('NETWORK_READ_SIZE', default_network_read_size))
+        # number of bytes downloaded from the remote data sources
+        self.bytes_transferred = 0
+        # live, record or replay mode and the fixture bundle used to record or replay the data sources
+        self.extraction_mode = os.getenv('EXTRACTION_MODE', 'live').lower()
+        if self.extraction_mode not in extraction_modes:
+            logger.error(f'\n--> Error, EXTRACTION_MODE should be one of the following options: {", ".join(extraction_modes)}.\n\n')
+            sys.exit()
+        self.fixture_bundle = None
+        if self.extraction_mode != 'live':
+            bundle_folder = os.getenv('FIXTURE_BUNDLE', default_fixture_bundle_folder)
+            self.fixture_bundle = FixtureBundle(bundle_folder, create=self.extraction_mode == 'record')
+            logger.info(f'\n--> Extraction mode: {self.extraction_mode}, fixture bundle: {bundle_folder}')
     
     
     def download_file(self, remote_file_path, data_type):
@@ -71,19 +144,26 @@ class DataProcessing():
             data_type: string
                 This parameter will be used as the local file extension e.g. pdf, csv, json.
         '''
+        # the file is read straight from the fixture bundle in replay mode
+        if self.extraction_mode == 'replay':
+            return self.fixture_bundle.file_path('file:' + remote_file_path)
+        
         # Create temporary file path with extension
         temporary_folder = self.__create_folder()
         temporary_file_path = temporary_folder + temporary_file_name + '.' + data_type
         
         # Downlaod the file
         source = remote_file_path.split(':')
-        if source[0] == 'https':
+        if source[0] in ['http', 'https']:
             downloaded_file = self.__download_file_from_https(remote_file_path, temporary_file_path)
         elif source[0] == 's3':
             downloaded_file = self.__download_file_from_s3(remote_file_path, temporary_file_path)
         else:
-            print(f'\n--> Error, the remote file path has incorrect format.\n\n')
+            logger.error(f'\n--> Error, the remote file path has incorrect format.\n\n')
             sys.exit()
+        
+        if self.extraction_mode == 'record':
+            self.fixture_bundle.save_file('file:' + remote_file_path, downloaded_file)
             
         return downloaded_file
 
@@ -93,7 +173,7 @@ class DataProcessing():
         try:
             Path('./' + temporary_folder_name).mkdir(parents=True, exist_ok=True)
         except Exception as e:
-            print(f'Error occured: {e}')
+            logger.error(f'Error occured: {e}')
             sys.exit()
         
         return './' + temporary_folder_name + '/'
@@ -106,13 +186,14 @@ class DataProcessing():
                 response.raise_for_status()  # Raise an exception for error status codes
                 try:
                     with open(local_file_path, 'wb') as f:
-                        for chunk in response.iter_content(1024):
+                        for chunk in response.iter_content(self.network_read_size):
                             f.write(chunk)
+                            self.bytes_transferred += len(chunk)
                 except Exception as e:
-                    print(f'Error occured: {e}')
+                    logger.error(f'Error occured: {e}')
                     sys.exit()
         except Exception as e:
-            print(f'Error occured: {e}')
+            logger.error(f'Error occured: {e}')
             sys.exit()
         
         return local_file_path
@@ -120,22 +201,102 @@ class DataProcessing():
     
     def __download_file_from_s3(self, remote_file_path, local_file_path):
         ## bucket address and file path
-        s = remote_file_path
-        bucket = s[s.find('s3://')+len('s3://'):s.rfind('/')]
-        file_path = s[s.rfind('/')+1:]
+        bucket, file_path = self.__split_s3_path(remote_file_path)
         
         # download the file to the temporary folder
         try:
             s3 = boto3.client('s3')
             s3.download_file(bucket, file_path, local_file_path)
             s3.close()
+            self.bytes_transferred += os.path.getsize(local_file_path)
         except Exception as e:
-            print(f'Error occured: {e}')
+            logger.error(f'Error occured: {e}')
             sys.exit()
         
         return local_file_path
     
     
+    def __split_s3_path(self, remote_file_path):
+        # s3://bucket-name/path/to/file.csv -> ('bucket-name', 'path/to/file.csv')
+        bucket, _, file_path = remote_file_path[len('s3://'):].partition('/')
+        return bucket, file_path
+    
+    
+    def open_stream(self, remote_file_path):
+        '''
+        open_stream(remote_file_path)
+            Opens a remote file (https or s3) as a buffered binary stream without saving it to the local disk.
+            The data is read from the network in blocks of network_read_size bytes while the stream is being consumed.
+            The stream should be closed after use.
+            
+            Parameters:
+            ----------
+            remote_file_path: string
+                URL to the remote file location which need to be streamed.
+        '''
+        # the file is read straight from the fixture bundle in replay mode
+        if self.extraction_mode == 'replay':
+            return open(self.fixture_bundle.file_path('file:' + remote_file_path), 'rb', buffering=self.network_read_size)
+        
+        source = remote_file_path.split(':')
+        try:
+            if source[0] in ['http', 'https']:
+                response = requests.get(remote_file_path, stream=True)
+                response.raise_for_status()  # Raise an exception for error status codes
+                chunks, close = response.iter_content(self.network_read_size), response.close
+            elif source[0] == 's3':
+                bucket, file_path = self.__split_s3_path(remote_file_path)
+                body = boto3.client('s3').get_object(Bucket=bucket, Key=file_path)['Body']
+                chunks, close = body.iter_chunks(self.network_read_size), body.close
+            else:
+                logger.error(f'\n--> Error, the remote file path has incorrect format.\n\n')
+                sys.exit()
+        except Exception as e:
+            logger.error(f'Error occured: {e}')
+            sys.exit()
+        
+        # save the chunks to the fixture bundle while they are being read in record mode
+        if self.extraction_mode == 'record':
+            fixture_file = self.fixture_bundle.open_file_writer('file:' + remote_file_path, Path(file_path if source[0] == 's3' else remote_file_path).suffix)
+            chunks = self.__record_chunks(chunks, fixture_file)
+            close = self.__close_all(close, fixture_file.close)
+        
+        raw_stream = ChunkedStream(self.__count_bytes(chunks), close)
+        return io.BufferedReader(raw_stream, buffer_size=self.network_read_size)
+    
+    
+    def __count_bytes(self, chunks):
+        # pass the chunks through and count the downloaded bytes
+        for chunk in chunks:
+            self.bytes_transferred += len(chunk)
+            yield chunk
+            
+            
+    def __record_chunks(self, chunks, fixture_file):
+        # pass the chunks through and save them to the fixture bundle, the file is added to the bundle only when the whole stream has been read
+        for chunk in chunks:
+            fixture_file.write(chunk)
+            yield chunk
+        fixture_file.commit()
+            
+            
+    def __close_all(self, *close_functions):
+        def close():
+            for close_function in close_functions:
+                close_function()
+        return close
+    
+    
+    def pop_bytes_transferred(self):
+        '''
+        pop_bytes_transferred()
+            Returns the number of bytes downloaded from the remote data sources since the last call and resets the counter.
+        '''
+        bytes_transferred = self.bytes_transferred
+        self.bytes_transferred = 0
+        return bytes_transferred
+    
+    
     def process_with_progress(self, source_url, total_items, source_type, headers={}):
         '''
         process_with_progress(source_url, total_items, source_type, headers={}):
@@ -167,13 +328,13 @@ class DataProcessing():
                     df = self.retrive_data_from_api(f"{source_url}{item_number - 1}", headers)
                     dfs.extend([df])
                 else:
-                    print(f'\n--> Error, the source type has incorrect format.\n\n')
+                    logger.error(f'\n--> Error, the source type has incorrect format.\n\n')
                     sys.exit()
                 
             except Exception as e:
-                print(f'Error occured when processing page no. {item_number}: {e}')
+                logger.error(f'Error occured when processing page no. {item_number}: {e}')
                 sys.exit()
-        print('\n')
+        logger.info('')
         return dfs
     
     
@@ -189,6 +350,9 @@ class DataProcessing():
         total: number
             Number of total items to process
         '''
+        # the progress bar is not displayed in the quiet mode
+        if not logger.isEnabledFor(logging.INFO):
+            return
         bar_len = 60
         filled_len = int(round(bar_len * count / float(total)))
 
@@ -211,14 +375,22 @@ class DataProcessing():
             headers: object {}
                 A headers object which is required for API connection containing API KEY and Content-Type.
         '''
+        # the response is read from the fixture bundle in replay mode
+        if self.extraction_mode == 'replay':
+            return self.fixture_bundle.load_json('api:' + api_url)
+        
         # create a get request to the api endpoint
         response = requests.get(api_url, headers=headers)
         if response.status_code == 200:
+            self.bytes_transferred += len(response.content)
             # Access the response data as JSON
             data = response.json()
         else:
-            print(f"Request failed with status code: {response.status_code}")
-            print(f"Response Text: {response.text}")
+            logger.error(f"Request failed with status code: {response.status_code}")
+            logger.error(f"Response Text: {response.text}")
             sys.exit()
+        
+        if self.extraction_mode == 'record':
+            self.fixture_bundle.save_json('api:' + api_url, data)
             
         return data
\ No newline at end of file
@@ -1,54 +1,447 @@
 '''
 DatabaseQuery is a class and contains a method helping to return data from the database for the specified query.
 
+The report queries (steps 36 - 44) are registered as materialized views (report_step_<step number>), so the reports are read 
+from the views and don't aggregate the whole fact table every time. Every load creates the tables again, so the views are dropped
+with drop_report_views() before the data is loaded and are created again by the report queries of the same run. Only when the reports
+are run without a new load (e.g. the query stage alone), the views are refreshed with REFRESH MATERIALIZED VIEW CONCURRENTLY,
+which uses the unique index on the key columns of each query (see report_queries).
+
+When a QueryCache is provided, the results are read from the cache if none of the tables used by the query has changed
+since the result was saved (see query_cache). The results of the report queries are cached by the report query (so by the versions
+of the tables the view is built from), and the views of the cached queries are not refreshed. The cache is checked and the result
+is read in one step, and the view is refreshed only when the result is not in the cache.
+
+Only the first rows of the results are printed out (QUERY_PREVIEW_ROWS in .env file, default 100). The results of query_database
+and of the report queries are read in chunks (QUERY_FETCH_ROWS, default 10000) from a server-side cursor, so large results don't need
+to fit in memory, and all rows can be saved to a CSV or Parquet file (the results of the report queries are saved to
+<REPORT_EXPORT_FOLDER>/report_step_<step number>.csv when REPORT_EXPORT_FOLDER is set in .env file).
+
 Methods:
 -------
-query_database(engine, query)
-    Executes a query on the database using the provided engine and prints out the results.
+query_database(engine, query, export_file=None)
+    Executes a query on the database using the provided engine, prints out the first rows of the results and returns the number of rows.
+    The rows are read from the database in chunks.
+    
+    Parameters:
+    ----------
+    engine: sqlalchemy.engine.Engine
+        The SQLAlchemy engine object.
+    query: string
+        The SQL query to execute.
+    export_file: string
+        Path to the .csv or .parquet file all rows of the result are saved to (Parquet files need pyarrow). 
+        The rows are not saved if not provided.
+
+query_report_views(engine, queries, max_workers=4, export_folder=None)
+    Runs all report queries at the same time, each query on a separate connection from the connection pool of the engine:
+    creates or refreshes the materialized view of the query (REFRESH MATERIALIZED VIEW CONCURRENTLY), the views of queries which have
+    changed (or whose key has changed) are created again and the views of queries whose results are in the query cache are skipped,
+    and reads the results from the view (and saves them to the export folder if provided). Returns a generator which prints out the results
+    in the order of the queries and yields the number of rows and the time (in seconds) taken by each query, so the next query result
+    is printed when the next value is requested.
+    
+    Parameters:
+    ----------
+    engine: sqlalchemy.engine.Engine
+        The SQLAlchemy engine object.
+    queries: list
+        List of dictionaries with the step number, the title, the key and the SQL query (see report_queries).
+    max_workers: int
+        Maximum number of queries run at the same time (and connections used).
+    export_folder: string
+        Folder where all rows of each query result are saved as report_step_<step number>.csv. The rows are not saved if not provided.
+
+drop_report_views(engine)
+    Drops the materialized views of the report queries before the tables they are built from are loaded again.
     
     Parameters:
     ----------
     engine: sqlalchemy.engine.Engine
         The SQLAlchemy engine object.
+
+query_snapshot(snapshot, query)
+    Executes a query on the Parquet snapshot of the star schema (offline mode), prints out the first rows of the results and returns the number of rows.
+    
+    Parameters:
+    ----------
+    snapshot: StarSchemaSnapshot
+        Snapshot of the star schema tables.
     query: string
         The SQL query to execute.
+
+profile_queries(engine, queries)
+    Runs each query with EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) using the QueryProfiler, prints out the summary of each plan
+    and the differences from the previous profiling run.
+    
+    Parameters:
+    ----------
+    engine: sqlalchemy.engine.Engine
+        The SQLAlchemy engine object.
+    queries: list
+        List of dictionaries with the step number, the title and the SQL query (see report_queries).
 '''
 
 from beautifultable import BeautifulTable
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import hashlib
+import os
+from pathlib import Path
+from pipeline_logging import get_logger
 from sqlalchemy import text
 import sys
+from threading import Lock
+import time
 
 
+######### VARIABLES #########
+# logger of this module
+logger = get_logger(__name__)
+# prefix of the materialized views of the report queries
+report_view_prefix = 'report_step_'
+# column added to the views to keep the order of the rows of the query
+report_row_column = 'report_row'
+# default number of rows printed out for each query (QUERY_PREVIEW_ROWS in .env file)
+default_preview_rows = 100
+# default number of rows read from the database at once (QUERY_FETCH_ROWS in .env file)
+default_fetch_rows = 10000
+# results with more rows are not saved in the query cache
+cache_row_limit = 100000
+
+
+######### CLASS #########
 class DatabaseQuery:
-    def __init__(self):
-        pass
+    def __init__(self, query_cache=None, query_profiler=None):
+        self.query_cache = query_cache
+        self.query_profiler = query_profiler
+        # read when the class is initiated, so the values from .env file loaded by the programme are used
+        self.preview_rows = int(os.getenv('QUERY_PREVIEW_ROWS', default_preview_rows))
+        self.fetch_rows = int(os.getenv('QUERY_FETCH_ROWS', default_fetch_rows))
+        # the query cache is shared by the queries run at the same time
+        self.__cache_lock = Lock()
      
-    def query_database(self, engine, query):
+    def query_database(self, engine, query, export_file=None):
+        """
+        Executes a query on the database using the provided engine, prints out the first rows of the results and returns the number of rows.
+        The rows are read from the database in chunks.
+
+        Parameters:
+        ----------
+            engine: sqlalchemy.engine.Engine
+                The SQLAlchemy engine object.
+            query: string 
+                The SQL query to execute.
+            export_file: string
+                Path to the .csv or .parquet file all rows of the result are saved to (Parquet files need pyarrow). 
+                The rows are not saved if not provided.
+        """
+        logger.info('')
+        exporter = None
+        try:
+            columns, chunks = self.__stream_query(engine, query)
+            exporter = self.__open_exporter(export_file, columns) if export_file else None
+            preview, row_count = self.__read_chunks(chunks, exporter)
+            self.__print_result(columns, preview, row_count=row_count)
+        except Exception as e:
+            logger.error(f'Error occurred when reading tables from the DB: {e}')
+            engine.close()
+            sys.exit()
+        finally:
+            if exporter:
+                exporter.close()
+        
+        if export_file:
+            logger.info(f'--> {row_count} rows saved to {export_file}.')
+        logger.info("\n--> Query run successfully.\n")
+        return row_count
+    
+    def query_report_views(self, engine, queries, max_workers=4, export_folder=None):
+        """
+        Runs all report queries at the same time, each query on a separate connection from the connection pool of the engine:
+        creates or refreshes the materialized view of the query (REFRESH MATERIALIZED VIEW CONCURRENTLY), the views of queries which have
+        changed (or whose key has changed) are created again and the views of queries whose results are in the query cache are skipped,
+        and reads the results from the view (and saves them to the export folder if provided). Returns a generator which prints out the results
+        in the order of the queries and yields the number of rows and the time (in seconds) taken by each query, so the next query result
+        is printed when the next value is requested.
+
+        Parameters:
+        ----------
+            engine: sqlalchemy.engine.Engine
+                The SQLAlchemy engine object.
+            queries: list
+                List of dictionaries with the step number, the title, the key and the SQL query (see report_queries).
+            max_workers: int
+                Maximum number of queries run at the same time (and connections used).
+            export_folder: string
+                Folder where all rows of each query result are saved as report_step_<step number>.csv. The rows are not saved if not provided.
+        """
+        with ThreadPoolExecutor(max_workers=max(int(max_workers), 1)) as executor:
+            # all queries are started at once, so the report stage takes about as long as the slowest query
+            futures = [executor.submit(self.__run_report_query, engine, query, export_folder) for query in queries]
+            for future in futures:
+                logger.info('')
+                try:
+                    columns, preview, row_count, query_time = future.result()
+                    self.__print_result(columns, preview, row_count=row_count)
+                except Exception as e:
+                    logger.error(f'Error occurred when running the report query: {e}')
+                    for other_future in futures:
+                        other_future.cancel()
+                    engine.close()
+                    sys.exit()
+                
+                logger.info(f"\n--> Query run successfully in {query_time:.3f}s.\n")
+                yield row_count, query_time
+    
+    def drop_report_views(self, engine):
         """
-        Executes a query on the database using the provided engine and prints out the results.
+        Drops the materialized views of the report queries before the tables they are built from are loaded again.
 
         Parameters:
         ----------
             engine: sqlalchemy.engine.Engine
                 The SQLAlchemy engine object.
+        """
+        logger.info('')
+        try:
+            view_names = [row[0] for row in engine.execute(text("SELECT matviewname FROM pg_matviews WHERE schemaname = current_schema() AND starts_with(matviewname, :prefix)"), {'prefix': report_view_prefix})]
+            for view_name in view_names:
+                view_query = f'DROP MATERIALIZED VIEW IF EXISTS {view_name}'
+                logger.info(f'Executing query: {view_query}')
+                engine.execute(text(view_query))
+            engine.execute(text("COMMIT"))
+        except Exception as e:
+            logger.error(f'Error occurred when dropping the report views: {e}')
+            engine.close()
+            sys.exit()
+        
+        logger.info(f"--> {len(view_names)} report views dropped, they are created again by the report queries.")
+    
+    def query_snapshot(self, snapshot, query):
+        """
+        Executes a query on the Parquet snapshot of the star schema (offline mode), prints out the first rows of the results and returns the number of rows.
+
+        Parameters:
+        ----------
+            snapshot: StarSchemaSnapshot
+                Snapshot of the star schema tables.
             query: string 
                 The SQL query to execute.
         """
-        print("")
+        logger.info('')
+        try:
+            columns, rows = snapshot.run_query(query)
+            self.__print_result(columns, rows)
+        except Exception as e:
+            logger.error(f'Error occurred when reading tables from the snapshot: {e}')
+            sys.exit()
+        
+        logger.info("\n--> Query run successfully.\n")
+        return len(rows)
+    
+    def profile_queries(self, engine, queries):
+        """
+        Runs each query with EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) using the QueryProfiler, prints out the summary of each plan
+        and the differences from the previous profiling run.
+
+        Parameters:
+        ----------
+            engine: sqlalchemy.engine.Engine
+                The SQLAlchemy engine object.
+            queries: list
+                List of dictionaries with the step number, the title and the SQL query (see report_queries).
+        """
+        logger.info('')
+        if self.query_profiler is None:
+            logger.warning('--> Query profiler has not been provided, the queries are not profiled.')
+            return
+        
         try:
-            result = engine.execute(text(query))
-            # initiate the table
-            table = BeautifulTable()
-            # add the headers
-            table.columns.header = result.keys()
-            # add the rows
-            for row in result:
-                table.rows.append(row)
-            
-            print(table)
+            # the report queries are profiled, not their materialized views
+            for query in queries:
+                self.query_profiler.profile(engine, query['step'], query['title'], query['query'])
+            self.query_profiler.diff()
         except Exception as e:
-            print(f'Error occurred when reading tables from the DB: {e}')
+            logger.error(f'Error occurred when profiling the queries: {e}')
             engine.close()
             sys.exit()
         
-        print("\n--> Query run successfully.\n")
+        logger.info(f"\n--> {len(queries)} queries profiled, the plans are saved in {self.query_profiler.run_folder}.\n")
+    
+    def __run_report_query(self, engine, query, export_folder=None):
+        # update the view of the report query and read its results on a separate connection from the connection pool of the engine,
+        # returns the columns, the first rows, the number of rows and the time taken by the query
+        start_time = time.perf_counter()
+        connection = engine.engine.connect()
+        exporter = None
+        try:
+            # the result is looked up and read from the cache at once, so it can't be removed by another query in between,
+            # the key is read before the view is refreshed, so the result is saved with the versions of the tables it was read from
+            cached_result, cache_key = None, None
+            if self.query_cache is not None:
+                with self.__cache_lock:
+                    cache_key = self.query_cache.key(connection, query['query'])
+                    cached_result = self.query_cache.get(connection, query['query'], cache_key)
+            if cached_result is not None:
+                # the view doesn't need to be refreshed when the result is read from the cache
+                logger.info(f"--> Result of step {query['step']} is in the query cache, its view is not refreshed.")
+                view_columns, rows = cached_result
+                chunks = self.__cached_chunks(rows)
+            else:
+                self.__update_report_view(connection, query)
+                view_columns, chunks = self.__stream_query(connection, f"SELECT * FROM {report_view_prefix}{query['step']} ORDER BY {report_row_column}", query['query'], cache_key)
+            # the column keeping the order of the rows is not printed out or saved
+            indexes = [i for i, column in enumerate(view_columns) if column != report_row_column]
+            columns = [view_columns[i] for i in indexes]
+            chunks = ([tuple(row[i] for i in indexes) for row in chunk] for chunk in chunks)
+            if export_folder:
+                exporter = self.__open_exporter(Path(export_folder) / f"{report_view_prefix}{query['step']}.csv", columns)
+            preview, row_count = self.__read_chunks(chunks, exporter)
+        finally:
+            if exporter:
+                exporter.close()
+            connection.close()
+        return columns, preview, row_count, time.perf_counter() - start_time
+    
+    def __update_report_view(self, engine, query):
+        # create the materialized view of the report query or refresh it if the query hasn't changed
+        view_name = f"{report_view_prefix}{query['step']}"
+        # the hash of the query and its key is saved as the comment of the view to find the views of the queries which have changed
+        query_hash = hashlib.md5((query['query'] + '|' + ','.join(query['key'])).encode()).hexdigest()
+        key_columns = ', '.join(f'"{column}"' for column in query['key'])
+        view_comment = engine.execute(text("SELECT obj_description(to_regclass(:view_name), 'pg_class')"), {'view_name': view_name}).scalar()
+        if view_comment == query_hash:
+            # REFRESH ... CONCURRENTLY doesn't block the reads of the view
+            view_queries = [f'REFRESH MATERIALIZED VIEW CONCURRENTLY {view_name}']
+        else:
+            view_queries = [
+                f'DROP MATERIALIZED VIEW IF EXISTS {view_name}',
+                f"CREATE MATERIALIZED VIEW {view_name} AS SELECT row_number() OVER () AS {report_row_column}, report.* FROM ({query['query'].strip().rstrip(';')}) AS report WITH DATA",
+                # REFRESH ... CONCURRENTLY needs a unique index, it is built on the grouping key of the query so the rows
+                # are matched by their key and not by their position in the result
+                f'CREATE UNIQUE INDEX {view_name}_key ON {view_name} ({key_columns})',
+                f"COMMENT ON MATERIALIZED VIEW {view_name} IS '{query_hash}'",
+            ]
+        for view_query in view_queries:
+            logger.info(f'Executing query: {view_query}')
+            engine.execute(text(view_query))
+        engine.execute(text("COMMIT"))
+    
+    def __stream_query(self, engine, query, cache_query=None, cache_key=None):
+        # return the columns and a generator of chunks of rows, the rows are read from a server-side cursor
+        # (the result is cached by cache_query when provided, e.g. by the report query of a materialized view,
+        # the cache is not checked when cache_key is provided, the caller has already checked it with this key)
+        cache_query = cache_query or query
+        fetch_rows = self.fetch_rows
+        if self.query_cache is not None and cache_key is None:
+            with self.__cache_lock:
+                cache_key = self.query_cache.key(engine, cache_query)
+                cached_result = self.query_cache.get(engine, cache_query, cache_key)
+            if cached_result is not None:
+                columns, rows = cached_result
+                return columns, self.__cached_chunks(rows)
+        
+        # the transactions are ended with COMMIT queries, so the database driver doesn't know that no transaction is open and
+        # wouldn't open one before the query, the server-side cursor only exists in a transaction, so the driver is committed as well
+        engine.connection.commit()
+        result = engine.execution_options(stream_results=True).execute(text(query))
+        columns = list(result.keys())
+        
+        def chunks():
+            # rows of small results are kept for the query cache
+            cached_rows = [] if self.query_cache is not None else None
+            while True:
+                chunk = result.fetchmany(fetch_rows)
+                if not chunk:
+                    break
+                if cached_rows is not None:
+                    cached_rows.extend(chunk)
+                    if len(cached_rows) > cache_row_limit:
+                        cached_rows = None
+                yield chunk
+            result.close()
+            if cached_rows is not None:
+                with self.__cache_lock:
+                    self.query_cache.put(engine, cache_query, columns, cached_rows, cache_key)
+        
+        return columns, chunks()
+    
+    def __cached_chunks(self, rows):
+        # split the rows read from the query cache into chunks of the same size as the chunks read from the database
+        return (rows[i:i + self.fetch_rows] for i in range(0, len(rows), self.fetch_rows))
+    
+    def __read_chunks(self, chunks, exporter=None):
+        # read all chunks of the result, only the first rows are kept for printing, the rest is exported and released
+        preview, row_count = [], 0
+        for chunk in chunks:
+            preview.extend(chunk[:self.preview_rows - len(preview)])
+            row_count += len(chunk)
+            if exporter:
+                exporter.write(chunk)
+        return preview, row_count
+    
+    def __open_exporter(self, export_file, columns):
+        # open a writer saving chunks of rows to a CSV or Parquet file
+        export_path = Path(export_file)
+        export_path.parent.mkdir(parents=True, exist_ok=True)
+        if export_path.suffix == '.csv':
+            return CsvExporter(export_path, columns)
+        elif export_path.suffix == '.parquet':
+            return ParquetExporter(export_path, columns)
+        raise ValueError(f'{export_file} must be a .csv or .parquet file.')
+    
+    def __print_result(self, columns, rows, row_count=None):
+        # print out the first rows of the result as a table
+        # initiate the table
+        table = BeautifulTable()
+        # add the headers
+        table.columns.header = columns
+        # add the rows
+        for row in rows[:self.preview_rows]:
+            table.rows.append(row)
+        
+        print(table)
+        row_count = len(rows) if row_count is None else row_count
+        if row_count > len(table.rows):
+            logger.info(f'--> First {len(table.rows)} of {row_count} rows displayed.')
+
+
+class CsvExporter:
+    # saves chunks of rows to a CSV file
+    def __init__(self, export_path, columns):
+        self.file = open(export_path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+    
+    def write(self, rows):
+        self.writer.writerows(rows)
+    
+    def close(self):
+        self.file.close()
+
+
+class ParquetExporter:
+    # saves chunks of rows to a Parquet file, each chunk is a row group
+    def __init__(self, export_path, columns):
+        # pyarrow is only needed for Parquet files
+        import pyarrow
+        import pyarrow.parquet
+        self.pyarrow = pyarrow
+        self.export_path = export_path
+        self.columns = columns
+        self.writer = None
+    
+    def write(self, rows):
+        data = {column: [row[i] for row in rows] for i, column in enumerate(self.columns)}
+        if self.writer is None:
+            # the schema is taken from the first chunk
+            table = self.pyarrow.table(data)
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.export_path, table.schema)
+        else:
+            table = self.pyarrow.table(data, schema=self.writer.schema)
+        self.writer.write_table(table)
+    
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
@@ -1,43 +1,25 @@
 '''
-DatabaseSchema class is used to alter the schema of the database tables. It contains methods to alter the data types of the columns, create new columns, add primary and foreign keys, and remove question marks from the card_number column in the dim_card_details table.
+DatabaseSchema class is used to alter the schema of the database tables. It contains methods to display the data types of the columns, add primary and foreign keys, and remove question marks from the card_number column in the dim_card_details table.
 
-Methods:
--------
-alter_rds_table_column_types(engine, table_name, columns_and_types)
-    Alter the data types of the columns in the table specified in the table_name parameter from the database specified in the engine parameter.
+The columns and keys of the tables are read from the database catalog once and only the changes which are needed are made,
+so running the schema update on an unchanged database doesn't change anything.
 
-    Parameters:
-    ----------
-    engine: db_engine
-        DB Engine object initiated with the init_db_engine() method from DatabaseConnector class.
-    table_name: string
-        Table name from which the data should be returned.
-    columns_and_types: dict
-        Dictionary with column names as keys and new data types as values.
-        
-create_category_column(engine, table_name, column_name)
-    Creates a new column in a database table and populates it with category values based on the weight column.
+In low lock mode (LOW_LOCK_SCHEMA_UPDATE=1 in .env file) the keys are built without blocking the queries on the output database:
+primary keys are attached to unique indexes created with CREATE INDEX CONCURRENTLY and foreign keys are added NOT VALID and validated separately.
 
-    Parameters:
-    ----------
-    engine: db_engine
-        DB Engine object initiated with the init_db_engine() method from DatabaseConnector class.
-    table_name: string
-        Table name from which the data should be returned.
-    column_name: string
-        Name of the new column to be created.
-        
-create_availability_column(engine, table_name, column_name)
-    Creates a new column in the specified table to represent the availability status of products.
+Methods:
+-------
+display_column_types(engine, table_name, title='Column types')
+    Displays the data types of the columns in the table specified in the table_name parameter.
 
     Parameters:
     ----------
     engine: db_engine
         DB Engine object initiated with the init_db_engine() method from DatabaseConnector class.
     table_name: string
-        Table name from which the data should be returned.
-    column_name: string
-        Name of the new column to be created.
+        Table name from which the column types should be displayed.
+    title: string
+        Title displayed above the column types.
         
 add_primary_keys(engine, tables_and_keys)
     Adds primary keys to the specified tables in the database.
@@ -61,6 +43,20 @@ add_foreign_keys(engine, table_name, foreign_keys)
     foreign_keys: dict
         Dictionary containing the foreign table names as keys and the corresponding foreign keys as values.
         
+add_indexes(engine, table_name, columns, queries)
+    Adds indexes to the columns of a table which are used by the queries and reports which queries each index speeds up.
+
+    Parameters:
+    ----------
+    engine: db_engine
+        DB Engine object initiated with the init_db_engine() method from DatabaseConnector class.
+    table_name: string
+        Table name to which the indexes should be added.
+    columns: list
+        Columns which should be indexed when they are used by the queries (see indexed_columns in table_schemas).
+    queries: list
+        List of dictionaries with the step number, the title and the SQL query (see report_queries).
+        
 remove_question_mark_from_dim_card_details(engine)
     Removes question marks from the card_number column in the dim_card_details table.
 
@@ -70,178 +66,112 @@ remove_question_mark_from_dim_card_details(engine)
         DB Engine object initiated with the init_db_engine() method from DatabaseConnector class.
 '''
 
-from turtle import up
-from sqlalchemy import inspect, text
+import json
+from pipeline_logging import get_logger
+import re
+from sqlalchemy import text
 import sys
+import uuid
 
 
+######### VARIABLES #########
+# logger of this module
+logger = get_logger(__name__)
+# columns, primary keys and foreign keys of all tables are read from the catalog with these queries
+catalog_columns_query = '''
+    SELECT table_name, column_name, data_type, character_maximum_length
+    FROM information_schema.columns
+    WHERE table_schema = current_schema()
+'''
+catalog_constraints_query = '''
+    SELECT
+        con.conname AS constraint_name,
+        con.contype AS constraint_type,
+        con.convalidated AS validated,
+        rel.relname AS table_name,
+        foreign_rel.relname AS foreign_table,
+        ARRAY(
+            SELECT att.attname
+            FROM unnest(con.conkey) AS key_columns(attnum)
+            INNER JOIN pg_attribute att ON att.attrelid = con.conrelid AND att.attnum = key_columns.attnum
+        ) AS columns
+    FROM pg_constraint con
+    INNER JOIN pg_class rel ON rel.oid = con.conrelid
+    INNER JOIN pg_namespace nsp ON nsp.oid = rel.relnamespace
+    LEFT JOIN pg_class foreign_rel ON foreign_rel.oid = con.confrelid
+    WHERE nsp.nspname = current_schema() AND con.contype IN ('p', 'f')
+'''
+catalog_partitions_query = '''
+    SELECT parent.relname, child.relname
+    FROM pg_inherits
+    INNER JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    INNER JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    INNER JOIN pg_namespace nsp ON nsp.oid = parent.relnamespace
+    WHERE nsp.nspname = current_schema() AND parent.relkind = 'p'
+'''
+catalog_indexes_query = '''
+    SELECT tablename, indexname
+    FROM pg_indexes
+    WHERE schemaname = current_schema()
+'''
+
+
+######### CLASS #########
 class DatabaseSchema:
-    def __init__(self):
-        pass
+    def __init__(self, low_lock=False):
+        # low lock mode builds the keys without blocking the queries on the output database (LOW_LOCK_SCHEMA_UPDATE=1 in .env file)
+        self.low_lock = low_lock
+        # columns and keys of the database read once from the catalog and read again only after the schema is changed
+        self.__catalog = None
     
      
-    def alter_rds_table_column_types(self, engine, table_name, columns_and_types):
+    def display_column_types(self, engine, table_name, title='Column types'):
         '''
-        alter_rds_table_column_types(engine, table_name, columns_and_types)
-            Alter the data types of the columns in the table specified in the table_name parameter from the database specified in the engine parameter.
+        display_column_types(engine, table_name, title='Column types')
+            Displays the data types of the columns in the table specified in the table_name parameter.
             
             Parameters:
             ----------
             engine: db_engine
                 DB Engine object initiated with the init_db_engine() method from DatabaseConnector class.
             table_name: string
-                Table name from which the data should be returned.
-            columns_and_types: dict
-                Dictionary with column names as keys and new data types as values.
+                Table name from which the column types should be displayed.
+            title: string
+                Title displayed above the column types.
         '''
-        # Check the original column types using SQLAlchemy's Inspector
-        try:
-            inspector = inspect(engine)
-            columns = inspector.get_columns(table_name)
-        except Exception as e:
-            print(f'Error occured when reading tables from the DB: {e}')
-            engine.close()
-            sys.exit()
-        
-        print(f"\n############## Original column types in the '{table_name}' table: ##############\n") 
-        for column in columns:
-            print(f"Column '{column['name']}' has data type: {column['type']}")
-        
-        # Alter the column types
-        try:
-            # Iterate over the columns and execute ALTER TABLE statements
-            for column_name, data_type in columns_and_types.items():
-                if data_type == 'varchar':
-                    characters = self.__max_characters_in_column(engine, table_name, column_name)
-                    new_data_type = f'VARCHAR({characters})'
-                elif data_type == 'uuid':
-                    new_data_type = f'UUID USING {column_name}::UUID'
-                else:
-                    new_data_type = data_type
-                    
-                alter_query = text(f'ALTER TABLE {table_name} ALTER COLUMN "{column_name}" TYPE {new_data_type}')
-                print('Executing query:', alter_query)
-                engine.execute(alter_query)
-
-            # Commit the transaction to make the changes persistent in the database
-            engine.execute(text("COMMIT"))
-
-            print(f"\n--> Columns in table '{table_name}' types changed successfully.\n") 
-        except Exception as e:
-            print(f"Error occurred: {e}")
-            engine.close()
-            sys.exit()
-            
-        # Check the updated column types using SQLAlchemy's Inspector
-        inspector = inspect(engine)
-        columns = inspector.get_columns(table_name)
+        columns = self.__read_catalog(engine)['columns'].get(table_name, {})
         
-        print(f"\n############## Updated column types in the '{table_name}' table: ##############\n") 
-        for column in columns:
-            print(f"Column '{column['name']}' has data type: {column['type']}")
+        logger.info(f"\n############## {title} in the '{table_name}' table: ##############\n")
+        for column_name, (data_type, length) in columns.items():
+            logger.info(f"Column '{column_name}' has data type: {data_type}{f'({length})' if length else ''}")
             
             
-    def __max_characters_in_column(self, engine, table_name, column_name):
-        query = text(f'SELECT MAX(LENGTH("{column_name}")) FROM {table_name};')
-        characters = engine.execute(query)
-
-        return characters.fetchone()[0]
-
-    
-    def create_category_column(self, engine, table_name, column_name):
-            """
-            Creates a new column in a database table and populates it with category values based on the weight column.
-
-            Args:
-                engine (sqlalchemy.engine.Engine): The SQLAlchemy engine object.
-                table_name (str): The name of the table.
-                column_name (str): The name of the column to be created.
-
-            Raises:
-                Exception: If an error occurs during the column creation or data population.
-
-            Returns:
-                None
-            """
-            try: 
-                # Add column if doesn't exist
-                engine.execute(text(
-                    f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {column_name} VARCHAR(255) DEFAULT ''",
-                ))
-                engine.execute(text("COMMIT"))
-            except Exception as e:
-                print(f"Error occurred: {e}")
-                engine.close()
-                sys.exit()
-                
-            try:
-                update_query = text(f"UPDATE {table_name} SET {column_name} = CASE WHEN weight < 2 THEN 'Light' WHEN weight >= 2 AND weight < 40 THEN 'Mid_Sized' WHEN weight >= 40 AND weight < 140 THEN 'Heavy' ELSE 'Truck_Required' END;")
-                print('Executing query:', update_query)
-                engine.execute(update_query)
-
-                # Commit the transaction to make the changes persistent in the database
-                engine.execute(text("COMMIT"))
-
-                print(f"\n--> The {column_name} column in table '{table_name}' has been added successfully.\n") 
-            except Exception as e:
-                print(f"Error occurred: {e}")
-                engine.close()
-                sys.exit()
-            
-            
-    def create_availability_column(self, engine, table_name, column_name):
-        """
-        Creates a new column in the specified table to represent the availability status of products.
-        
-        Args:
-            engine (sqlalchemy.engine.Engine): The SQLAlchemy engine object used to execute SQL statements.
-            table_name (str): The name of the table where the column will be added.
-            column_name (str): The name of the new column to be created.
-        """
-        try:
-            # Add the column if it doesn't exist
-            update_query = text(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {column_name} BOOLEAN")
-            print('Executing query:', update_query)
-            engine.execute(update_query)
-            engine.execute(text("COMMIT"))
-            
-            # Update the column with the availability status
-            update_query = text("SELECT column_name FROM information_schema.columns WHERE table_name = 'dim_products' AND column_name = 'removed'")
-            print('Executing query:', update_query)
-            result = engine.execute(update_query)
-
-            # If the column exists, update the new column with the availability status
-            if result.fetchone():
-                try:
-                    update_query = text(f"UPDATE {table_name} SET {column_name} = CASE WHEN removed = 'Removed' THEN False ELSE True END;")
-                    print('Executing query:', update_query)
-                    engine.execute(update_query)
-                    # Commit the transaction to make the changes persistent in the database
-                    engine.execute(text("COMMIT"))
-                except Exception as e:
-                    print(f"Error occurred: {e}")
-                    engine.close()
-                    sys.exit()
-            
-        except Exception as e:
-            print(f"Error occurred: {e}")
-            engine.close()
-            sys.exit()
-            
-        # Remove 'removed' column
+    def __read_catalog(self, engine):
+        # read the columns and keys of all tables with two queries and keep them until the schema is changed
+        if self.__catalog is not None:
+            return self.__catalog
         try:
-            update_query = text(f"ALTER TABLE {table_name} DROP COLUMN IF EXISTS removed")
-            print('Executing query:', update_query)
-            engine.execute(update_query)
+            catalog = {'columns': {}, 'primary_keys': {}, 'foreign_keys': {}, 'indexes': {}, 'partitions': {}}
+            for table_name, column_name, data_type, length in engine.execute(text(catalog_columns_query)):
+                catalog['columns'].setdefault(table_name, {})[column_name] = (data_type, length)
+            for constraint_name, constraint_type, validated, table_name, foreign_table, columns in engine.execute(text(catalog_constraints_query)):
+                if constraint_type == 'p':
+                    catalog['primary_keys'][table_name] = (constraint_name, list(columns))
+                else:
+                    catalog['foreign_keys'].setdefault(table_name, {})[constraint_name] = (foreign_table, list(columns), validated)
+            for table_name, index_name in engine.execute(text(catalog_indexes_query)):
+                catalog['indexes'].setdefault(table_name, set()).add(index_name)
+            for table_name, partition_name in engine.execute(text(catalog_partitions_query)):
+                catalog['partitions'].setdefault(table_name, []).append(partition_name)
             engine.execute(text("COMMIT"))
         except Exception as e:
-            print(f"Error occurred: {e}")
+            logger.error(f'Error occured when reading the database catalog: {e}')
             engine.close()
             sys.exit()
-            
-        print(f"\n--> The {column_name} column in table '{table_name}' has been updated successfully.\n") 
-        
-        
+        self.__catalog = catalog
+        return self.__catalog
+    
+    
     def add_primary_keys(self, engine, tables_and_keys):
         """
         Adds primary keys to the specified tables in the database.
@@ -253,7 +183,20 @@ class DatabaseSchema:
         Returns:
             None
         """
-        print("")
+        logger.info('')
+        # Only the tables which don't have the right primary key yet are changed
+        current_keys = self.__read_catalog(engine)['primary_keys']
+        existing_keys = {table_name: key_column for table_name, key_column in tables_and_keys.items() if table_name in current_keys and current_keys[table_name][1] == [key_column]}
+        for table_name, key_column in existing_keys.items():
+            logger.info(f"--> Column '{key_column}' is already the primary key in table '{table_name}'.")
+        tables_and_keys = {table_name: key_column for table_name, key_column in tables_and_keys.items() if table_name not in existing_keys}
+        if len(tables_and_keys) == 0:
+            return
+        self.__catalog = None
+        
+        if self.low_lock:
+            self.__add_primary_keys_low_lock(engine, tables_and_keys)
+            return
         # Add the keys to the tables
         try:
             # Iterate over the tables and execute ALTER TABLE statements
@@ -264,14 +207,14 @@ class DatabaseSchema:
 
                 # Add the new primary key to the table
                 add_primary_key_query = text(f'ALTER TABLE {table_name} ADD PRIMARY KEY ({key_column})')
-                print('Executing query:', add_primary_key_query)
+                logger.info(f'Executing query: {add_primary_key_query}')
                 engine.execute(add_primary_key_query)
-                print(f"--> Column '{key_column}' has been changed to primary key in table '{table_name}'.") 
+                logger.info(f"--> Column '{key_column}' has been changed to primary key in table '{table_name}'.")
                 
             # Commit the transaction to make the changes persistent in the database
             engine.execute(text("COMMIT"))
         except Exception as e:
-            print(f"Error occurred: {e}")
+            logger.error(f"Error occurred: {e}")
             engine.close()
             sys.exit()
             
@@ -288,30 +231,218 @@ class DatabaseSchema:
             Returns:
                 None
             """
-            print("")
+            logger.info('')
+            # Only the keys which don't exist yet are added, the keys added NOT VALID are only validated
+            current_keys = self.__read_catalog(engine)['foreign_keys'].get(table_name, {})
+            keys_to_add = {}
+            keys_to_validate = {}
+            for foreign_table, foreign_key in foreign_keys.items():
+                current_key = current_keys.get(f'{table_name}_{foreign_table}_{foreign_key}_fkey')
+                if current_key is None or current_key[:2] != (foreign_table, [foreign_key]):
+                    keys_to_add[foreign_table] = foreign_key
+                elif not current_key[2]:
+                    keys_to_validate[foreign_table] = foreign_key
+                else:
+                    logger.info(f"--> Column '{foreign_key}' is already a foreign key in table '{table_name}' and links to table '{foreign_table}'s.")
+            foreign_keys = keys_to_add
+            if len(foreign_keys) == 0 and len(keys_to_validate) == 0:
+                return
+            # NOT VALID foreign keys are not supported on partitioned tables, so the keys are added and validated at once
+            partitioned = table_name in self.__read_catalog(engine)['partitions']
+            if partitioned and self.low_lock:
+                logger.warning(f"--> Table '{table_name}' is partitioned, the foreign keys are added and validated at once.")
+            self.__catalog = None
+            
+            if (self.low_lock and not partitioned) or len(keys_to_validate) > 0:
+                self.__add_foreign_keys_low_lock(engine, table_name, foreign_keys, keys_to_validate)
+                return
             # Add the keys to the table
             try:
                 # Iterate over the tables and execute ALTER TABLE statements
                 for foreign_table, foreign_key in foreign_keys.items():
                     # Drop the existing primary key constraint if it exists
                     drop_constraint_query = text(f'ALTER TABLE {table_name} DROP CONSTRAINT IF EXISTS {table_name}_{foreign_table}_{foreign_key}_fkey')
-                    print('Executing query:', drop_constraint_query)
+                    logger.info(f'Executing query: {drop_constraint_query}')
                     engine.execute(drop_constraint_query)
 
                     # Add the new primary key to the table
                     add_foreign_key_query = text(f'ALTER TABLE {table_name} ADD CONSTRAINT {table_name}_{foreign_table}_{foreign_key}_fkey FOREIGN KEY ({foreign_key}) REFERENCES {foreign_table}({foreign_key})')
-                    print('Executing query:', add_foreign_key_query)
+                    logger.info(f'Executing query: {add_foreign_key_query}')
                     engine.execute(add_foreign_key_query)
-                    print(f"--> Column '{foreign_key}' has been changed to foreign key in table '{table_name}' and links to table '{foreign_table}'s.") 
+                    logger.info(f"--> Column '{foreign_key}' has been changed to foreign key in table '{table_name}' and links to table '{foreign_table}'s.")
                     
                 # Commit the transaction to make the changes persistent in the database
                 engine.execute(text("COMMIT"))
             except Exception as e:
-                print(f"Error occurred: {e}")
+                logger.error(f"Error occurred: {e}")
                 engine.close()
                 sys.exit()
             
             
+    def __add_primary_keys_low_lock(self, engine, tables_and_keys):
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction, so a separate connection in autocommit mode is used
+        try:
+            # it also waits for all open transactions, so the transaction of the main connection is finished first
+            engine.execute(text("COMMIT"))
+            autocommit_engine = engine.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        except Exception as e:
+            logger.error(f"Error occurred: {e}")
+            engine.close()
+            sys.exit()
+            
+        try:
+            for table_name, key_column in tables_and_keys.items():
+                index_name = f'{table_name}_pkey_index'
+                check_name = f'{table_name}_{key_column}_not_null'
+                queries = [
+                    # build the unique index without blocking reads and writes of the table
+                    f'DROP INDEX CONCURRENTLY IF EXISTS {index_name}',
+                    f'CREATE UNIQUE INDEX CONCURRENTLY {index_name} ON {table_name} ({key_column})',
+                    # a validated NOT NULL check lets the primary key skip the scan of the table under the exclusive lock
+                    f'ALTER TABLE {table_name} DROP CONSTRAINT IF EXISTS {check_name}',
+                    f'ALTER TABLE {table_name} ADD CONSTRAINT {check_name} CHECK ({key_column} IS NOT NULL) NOT VALID',
+                    f'ALTER TABLE {table_name} VALIDATE CONSTRAINT {check_name}',
+                    # swap the old primary key for the new index, both statements only take the lock for a moment
+                    f'ALTER TABLE {table_name} DROP CONSTRAINT IF EXISTS {table_name}_pkey CASCADE',
+                    f'ALTER TABLE {table_name} ADD CONSTRAINT {table_name}_pkey PRIMARY KEY USING INDEX {index_name}',
+                    f'ALTER TABLE {table_name} DROP CONSTRAINT {check_name}',
+                ]
+                for query in queries:
+                    logger.info(f'Executing query: {query}')
+                    autocommit_engine.execute(text(query))
+                logger.info(f"--> Column '{key_column}' has been changed to primary key in table '{table_name}'.")
+        except Exception as e:
+            logger.error(f"Error occurred: {e}")
+            autocommit_engine.close()
+            engine.close()
+            sys.exit()
+            
+        autocommit_engine.close()
+        
+        
+    def __add_foreign_keys_low_lock(self, engine, table_name, foreign_keys, keys_to_validate={}):
+        try:
+            # add all constraints as NOT VALID first, so the existing rows are not checked while the table is locked
+            for foreign_table, foreign_key in foreign_keys.items():
+                constraint_name = f'{table_name}_{foreign_table}_{foreign_key}_fkey'
+                drop_constraint_query = text(f'ALTER TABLE {table_name} DROP CONSTRAINT IF EXISTS {constraint_name}')
+                logger.info(f'Executing query: {drop_constraint_query}')
+                engine.execute(drop_constraint_query)
+                add_foreign_key_query = text(f'ALTER TABLE {table_name} ADD CONSTRAINT {constraint_name} FOREIGN KEY ({foreign_key}) REFERENCES {foreign_table}({foreign_key}) NOT VALID')
+                logger.info(f'Executing query: {add_foreign_key_query}')
+                engine.execute(add_foreign_key_query)
+                engine.execute(text("COMMIT"))
+            
+            # validate the existing rows separately, this doesn't block reads and writes of the tables
+            for foreign_table, foreign_key in {**foreign_keys, **keys_to_validate}.items():
+                validate_query = text(f'ALTER TABLE {table_name} VALIDATE CONSTRAINT {table_name}_{foreign_table}_{foreign_key}_fkey')
+                logger.info(f'Executing query: {validate_query}')
+                engine.execute(validate_query)
+                engine.execute(text("COMMIT"))
+                logger.info(f"--> Column '{foreign_key}' has been changed to foreign key in table '{table_name}' and links to table '{foreign_table}'s.")
+        except Exception as e:
+            logger.error(f"Error occurred: {e}")
+            engine.close()
+            sys.exit()
+            
+            
+    def add_indexes(self, engine, table_name, columns, queries):
+        '''
+        add_indexes(engine, table_name, columns, queries)
+            Adds indexes to the columns of a table which are used by the queries and reports which queries each index speeds up.
+            
+            Parameters:
+            ----------
+            engine: db_engine
+                DB Engine object initiated with the init_db_engine() method from DatabaseConnector class.
+            table_name: string
+                Table name to which the indexes should be added.
+            columns: list
+                Columns which should be indexed when they are used by the queries (see indexed_columns in table_schemas).
+            queries: list
+                List of dictionaries with the step number, the title and the SQL query (see report_queries).
+        '''
+        logger.info('')
+        # queries which use the table and the columns used by each of them
+        table_queries = [query for query in queries if re.search(rf'\b{table_name}\b', query['query'])]
+        columns_used = {column: [query for query in table_queries if re.search(rf'\b{column}\b', query['query'])] for column in dict.fromkeys(columns)}
+        for column in [column for column, column_queries in columns_used.items() if len(column_queries) == 0]:
+            logger.warning(f"--> Column '{column}' of table '{table_name}' is not used by any query, it is not indexed.")
+        
+        # only the columns used by the queries are indexed, indexes which already exist are kept
+        existing_indexes = self.__read_catalog(engine)['indexes'].get(table_name, set())
+        indexes = {f'{table_name}_{column}_index': column for column, column_queries in columns_used.items() if len(column_queries) > 0}
+        new_indexes = {index_name: column for index_name, column in indexes.items() if index_name not in existing_indexes}
+        for index_name in indexes.keys() - new_indexes.keys():
+            logger.info(f"--> Index '{index_name}' already exists in table '{table_name}'.")
+        if len(new_indexes) == 0:
+            return
+        self.__catalog = None
+        
+        # time the queries using the new indexes before and after the indexes are created
+        measured_queries = [query for query in table_queries if any(query in columns_used[column] for column in new_indexes.values())]
+        timings_before = {query['step']: self.__explain_query(engine, query['query']) for query in measured_queries}
+        
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction, so a separate connection in autocommit mode is used in low lock mode
+        index_engine = None
+        try:
+            engine.execute(text("COMMIT"))
+            index_engine = engine.engine.connect().execution_options(isolation_level='AUTOCOMMIT') if self.low_lock else engine
+            for index_name, column in new_indexes.items():
+                query = f'CREATE INDEX {"CONCURRENTLY " if self.low_lock else ""}IF NOT EXISTS {index_name} ON {table_name} ({column})'
+                logger.info(f'Executing query: {query}')
+                index_engine.execute(text(query))
+            # update the statistics so the planner can use the new indexes
+            index_engine.execute(text(f'ANALYZE {table_name}'))
+            if self.low_lock:
+                index_engine.close()
+            else:
+                engine.execute(text("COMMIT"))
+        except Exception as e:
+            logger.error(f"Error occurred: {e}")
+            if self.low_lock and index_engine is not None:
+                index_engine.close()
+            engine.close()
+            sys.exit()
+        
+        timings_after = {query['step']: self.__explain_query(engine, query['query']) for query in measured_queries}
+        
+        # report which steps each new index speeds up
+        logger.info(f"\n############## New indexes in the '{table_name}' table: ##############\n")
+        for index_name, column in new_indexes.items():
+            logger.info(f"--> Index '{index_name}' on column '{column}':")
+            for query in columns_used[column]:
+                time_before, _ = timings_before[query['step']]
+                time_after, indexes_used = timings_after[query['step']]
+                index_used = index_name in indexes_used
+                used = 'used by the query plan' if index_used else 'not used by the query plan'
+                faster = 'faster' if index_used and time_after < time_before else 'not faster'
+                logger.info(f"    STEP {query['step']}: {query['title']} - {time_before:.1f} ms -> {time_after:.1f} ms ({used}, {faster})")
+                
+                
+    def __explain_query(self, engine, query):
+        # returns the execution time of the query in ms and the names of the indexes used by the query plan
+        try:
+            result = engine.execute(text(f'EXPLAIN (ANALYZE, FORMAT JSON) {query.strip().rstrip(";")}')).fetchone()[0]
+            engine.execute(text("COMMIT"))
+        except Exception as e:
+            logger.error(f"Error occurred: {e}")
+            engine.close()
+            sys.exit()
+        
+        # the plan is returned as JSON, the database driver may return it as a string
+        if isinstance(result, str):
+            result = json.loads(result)
+        indexes_used = set()
+        plans = [result[0]['Plan']]
+        while plans:
+            plan = plans.pop()
+            if 'Index Name' in plan:
+                indexes_used.add(plan['Index Name'])
+            plans.extend(plan.get('Plans', []))
+        return result[0]['Execution Time'], indexes_used
+    
+    
     def remove_question_mark_from_dim_card_details(self, engine):
         """
         Removes question marks from the card_number column in the dim_card_details table.
@@ -326,16 +457,25 @@ class DatabaseSchema:
             None
         """
         try:
+            # The card numbers are usually cleaned before the upload, so the table is only updated when a card number still starts with '?'
+            exists_query = text("SELECT EXISTS (SELECT 1 FROM dim_card_details WHERE card_number LIKE '?%')")
+            if not engine.execute(exists_query).scalar():
+                engine.execute(text("COMMIT"))
+                logger.info("--> There are no question marks in card_number column, nothing to change.")
+                return
+
             # Execute the UPDATE statement
             update_query = text("UPDATE dim_card_details SET card_number = REPLACE(card_number, '?', '') WHERE card_number LIKE '?%'")
-            print('Executing query:', update_query)
+            logger.info(f'Executing query: {update_query}')
             engine.execute(update_query)
+            # a new marker in the comment of the table tells the query cache the table has changed
+            engine.execute(text(f"COMMENT ON TABLE dim_card_details IS 'update {uuid.uuid4().hex}'"))
 
             # Commit the transaction to make the changes persistent in the database
             engine.execute(text("COMMIT"))
 
-            print("Question mark removed from card_number column.")
+            logger.info("Question mark removed from card_number column.")
         except Exception as e:
-            print(f"Error occurred: {e}")
+            logger.error(f"Error occurred: {e}")
             engine.close()
             sys.exit()
\ No newline at end of file
@@ -1,6 +1,8 @@
 '''
 DatabaseConnector class contains methods allowing to initiate connection to the database and uploading data to a database
 
+When a StarSchemaSnapshot is provided, the uploaded tables are also saved to its Parquet files (see star_schema_snapshot).
+
 Methods:
 -------
 init_db_engine(destination)
@@ -11,8 +13,10 @@ init_db_engine(destination)
     destination: string
         This should equal to either SOURCE or OUTPUT and will indicate which database to initiate.
         
-upload_to_db(db_engine, data, table_name)
-    Uploads data to a database.
+upload_to_db(db_engine, data, table_name, partitioning=None)
+    Uploads data to a database. Tables listed in table_schemas are created with their final column types before the data is uploaded.
+    VARCHAR columns are sized to the longest text of the DataFrame column, so the table is not scanned to size them.
+    A new load marker is saved as the comment of the table (used by the query cache to find the tables which have been loaded again).
     
     Parameters:
     ----------
@@ -22,29 +26,66 @@ upload_to_db(db_engine, data, table_name)
         Data to be uploaded to the database.
     table_name: string
         Name of the table the data will be uploaded to.
+    partitioning: dict
+        Partitioning of the table (see partitioning_options in table_schemas), the table is not partitioned if not provided.
+        The rows are stored in the right partitions by the database.
+
+replace_partition(db_engine, data, table_name, partitioning, partition_value)
+    Replaces a single year partition of a table partitioned by LIST (e.g. the orders of one year) with new data, the other partitions
+    are not changed. The data is uploaded to a separate table with the columns of the partitioned table, which is then swapped with
+    the old partition in one transaction, so the table can be queried during the upload. The year is checked to be a positive integer
+    before it is written into the queries. The sales rollup is not changed, it needs to be built again from all orders.
+    
+    Parameters:
+    ----------
+    db_engine: db_engine
+        DB Engine object initiated with the init_db_engine() method.
+    data: [data]
+        Data of the partition.
+    table_name: string
+        Name of the partitioned table.
+    partitioning: dict
+        Partitioning of the table used when the table was created.
+    partition_value: int
+        Year stored in the partition.
 '''
 
-from sqlalchemy import create_engine
+import os
+import pandas as pd
+from pipeline_logging import get_logger
+import re
+from sqlalchemy import create_engine, text
 import sys
+from table_schemas import default_column_types, table_schemas
+import uuid
 import yaml
 
 
+######### VARIABLES #########
+# logger of this module
+logger = get_logger(__name__)
+# Default database credentials file (can be changed with DB_CREDS_FILE environmental variable)
+default_db_creds_file = '.db_creds.yaml'
+
+
+######### CLASS #########
 class DatabaseConnector:
-    def __init__(self):
-        pass
+    def __init__(self, snapshot=None):
+        self.snapshot = snapshot
     
     def __read_db_creds(self, destination):
         # destination is either SOURCE or OUTPUT 
         # read the db credentials or throw an error
+        db_creds_file = os.getenv('DB_CREDS_FILE', default_db_creds_file)
         try:
-            with open('.db_creds.yaml', 'r') as file:
+            with open(db_creds_file, 'r') as file:
                 credentials = yaml.safe_load(file)
                 return credentials[destination]
         except FileNotFoundError:
-            print('Error: .db_creds.yaml not found.')
+            logger.error(f'Error: {db_creds_file} not found.')
             return None
         except yaml.YAMLError as e:
-            print(f'Error loading YAML: {e}')
+            logger.error(f'Error loading YAML: {e}')
             return None
         
     def init_db_engine(self, destination):
@@ -60,7 +101,7 @@ class DatabaseConnector:
         credentials = self.__read_db_creds(destination)
         if credentials is None:
             # Handle the case where credentials are not loaded
-            print('Error, credentials has not been initialised')
+            logger.error('Error, credentials has not been initialised')
             return None
         
         # The credentials are loaded, so prepare the database connection details
@@ -75,17 +116,18 @@ class DatabaseConnector:
         try:
             engine = create_engine(f"{DATABASE_TYPE}+{DBAPI}://{USER}:{PASSWORD}@{ENDPOINT}:{PORT}/{DATABASE}").connect()
         except Exception as e:
-            print(f'Error occured when creating engine: {e}')
+            logger.error(f'Error occured when creating engine: {e}')
             sys.exit()
         
         # engine created successfully
-        print(f'\n--> Success. {destination} database connection established')
+        logger.info(f'\n--> Success. {destination} database connection established')
         return engine
         
-    def upload_to_db(self, db_engine, data, table_name):
+    def upload_to_db(self, db_engine, data, table_name, partitioning=None):
         '''
-        upload_to_db(db_engine, data, table_name)
-            Uploads data to a database.
+        upload_to_db(db_engine, data, table_name, partitioning=None)
+            Uploads data to a database. Tables listed in table_schemas are created with their final column types before the data is uploaded.
+            VARCHAR columns are sized to the longest text of the DataFrame column, so the table is not scanned to size them.
             
             Parameters:
             ----------
@@ -95,18 +137,151 @@ class DatabaseConnector:
                 Data to be uploaded to the database.
             table_name: string
                 Name of the table the data will be uploaded to.
+            partitioning: dict
+                Partitioning of the table (see partitioning_options in table_schemas), the table is not partitioned if not provided.
+                The rows are stored in the right partitions by the database.
         '''
         try:
-            data.to_sql(con=db_engine, name=table_name, index=False, if_exists='replace')
+            if table_name in table_schemas:
+                # create the table with its final column types, so the data goes straight into typed columns
+                self.__create_table(db_engine, data, table_name, table_schemas[table_name], partitioning)
+                data.to_sql(con=db_engine, name=table_name, index=False, if_exists='append')
+            else:
+                data.to_sql(con=db_engine, name=table_name, index=False, if_exists='replace')
+            # a new load marker in the comment of the table tells the query cache the table has been loaded again
+            db_engine.execute(text(f"COMMENT ON TABLE {table_name} IS 'load {uuid.uuid4().hex}'"))
+            db_engine.execute(text("COMMIT"))
         except Exception as e:
-            print(f'Error occured when uploading data to the DB: {e}')
+            logger.error(f'Error occured when uploading data to the DB: {e}')
             db_engine.close()
             sys.exit()
         
-        print(f'\n--> Success. There were {data.shape[0]} rows and {data.shape[1]} columns uploaded to table: {table_name}.\n')
-
-
-
-
-
-
+        logger.info(f'\n--> Success. There were {data.shape[0]} rows and {data.shape[1]} columns uploaded to table: {table_name}.\n')
+        if self.snapshot is not None:
+            self.snapshot.save(data, table_name)
+        
+    def replace_partition(self, db_engine, data, table_name, partitioning, partition_value):
+        '''
+        replace_partition(db_engine, data, table_name, partitioning, partition_value)
+            Replaces a single year partition of a table partitioned by LIST (e.g. the orders of one year) with new data, the other partitions
+            are not changed. The data is uploaded to a separate table with the columns of the partitioned table, which is then swapped with
+            the old partition in one transaction, so the table can be queried during the upload. The year is checked to be a positive integer
+            before it is written into the queries. The sales rollup is not changed, it needs to be built again from all orders.
+            
+            Parameters:
+            ----------
+            db_engine: db_engine
+                DB Engine object initiated with the init_db_engine() method.
+            data: [data]
+                Data of the partition.
+            table_name: string
+                Name of the partitioned table.
+            partitioning: dict
+                Partitioning of the table used when the table was created.
+            partition_value: int
+                Year stored in the partition.
+        '''
+        if partitioning['method'] != 'list':
+            logger.error(f"Error, only LIST partitions can be replaced, table {table_name} is partitioned by {partitioning['method'].upper()}.")
+            db_engine.close()
+            sys.exit()
+        try:
+            year = self.__partition_years([partition_value])[0]
+        except (TypeError, ValueError) as e:
+            logger.error(f'Error, the partition value must be a year: {e}')
+            db_engine.close()
+            sys.exit()
+        
+        column = partitioning['column']
+        partition_name = self.__partition_name(table_name, year)
+        new_partition_name = f'{partition_name}_new'
+        # only the rows of the partition can be attached
+        partition_data = data[data[column] == year]
+        if partition_data.shape[0] < data.shape[0]:
+            logger.warning(f'--> {data.shape[0] - partition_data.shape[0]} rows are not from the partition {partition_name} and are not uploaded.')
+        
+        try:
+            # upload the data to a new table with the same columns as the partitioned table
+            db_engine.execute(text(f'DROP TABLE IF EXISTS {new_partition_name}'))
+            db_engine.execute(text(f'CREATE TABLE {new_partition_name} (LIKE {table_name} INCLUDING DEFAULTS)'))
+            db_engine.execute(text("COMMIT"))
+            partition_data.to_sql(con=db_engine, name=new_partition_name, index=False, if_exists='append')
+            partition_exists = db_engine.execute(text('SELECT to_regclass(:partition_name) IS NOT NULL'), {'partition_name': partition_name}).scalar()
+            
+            # the check constraint lets ATTACH PARTITION skip the scan of the new partition
+            queries = [
+                f'ALTER TABLE {new_partition_name} ADD CONSTRAINT {new_partition_name}_check CHECK ("{column}" IS NOT NULL AND "{column}" = {year})',
+                f'ALTER TABLE {table_name} DETACH PARTITION {partition_name}' if partition_exists else None,
+                f'DROP TABLE IF EXISTS {partition_name}',
+                f'ALTER TABLE {new_partition_name} RENAME TO {partition_name}',
+                f'ALTER TABLE {table_name} ATTACH PARTITION {partition_name} FOR VALUES IN ({year})',
+                f'ALTER TABLE {partition_name} DROP CONSTRAINT {new_partition_name}_check',
+                # a new load marker tells the query cache the table has changed
+                f"COMMENT ON TABLE {table_name} IS 'load {uuid.uuid4().hex}'",
+            ]
+            # the partition is swapped in one transaction
+            with db_engine.begin():
+                for query in filter(None, queries):
+                    logger.info(f'Executing query: {query}')
+                    db_engine.execute(text(query))
+        except Exception as e:
+            logger.error(f'Error occured when replacing the partition: {e}')
+            db_engine.close()
+            sys.exit()
+        
+        logger.info(f'\n--> Success. There were {partition_data.shape[0]} rows uploaded to partition: {partition_name}.\n')
+        
+    def __create_table(self, db_engine, data, table_name, columns_and_types, partitioning=None):
+        # drop the previous table (CASCADE removes the foreign keys pointing to it, they are added again by the schema update)
+        # and create it again with the column types from the schema
+        columns = ', '.join(f'"{column_name}" {self.__column_type(data, column_name, columns_and_types.get(column_name))}' for column_name in data.columns)
+        partition_by = f' PARTITION BY {partitioning["method"].upper()} ("{partitioning["column"]}")' if partitioning else ''
+        db_engine.execute(text(f'DROP TABLE IF EXISTS {table_name} CASCADE'))
+        create_query = text(f'CREATE TABLE {table_name} ({columns}){partition_by}')
+        logger.info(f'Executing query: {create_query}')
+        db_engine.execute(create_query)
+        if partitioning:
+            self.__create_partitions(db_engine, data, table_name, partitioning)
+        db_engine.execute(text("COMMIT"))
+        
+    def __create_partitions(self, db_engine, data, table_name, partitioning):
+        if partitioning['method'] == 'list':
+            # one partition for each value and the default partition for rows without the value
+            # the LIST partitions are by year, so the values are checked to be years before they are written into the query
+            try:
+                values = self.__partition_years(data[partitioning['column']].dropna().unique())
+            except (TypeError, ValueError) as e:
+                logger.error(f"Error, values of the partition column {partitioning['column']} must be years: {e}")
+                db_engine.close()
+                sys.exit()
+            queries = [f'CREATE TABLE {self.__partition_name(table_name, value)} PARTITION OF {table_name} FOR VALUES IN ({value})' for value in values]
+            queries.append(f'CREATE TABLE {table_name}_default PARTITION OF {table_name} DEFAULT')
+        else:
+            partitions = partitioning['partitions']
+            queries = [f'CREATE TABLE {table_name}_p{remainder} PARTITION OF {table_name} FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})' for remainder in range(partitions)]
+        for query in queries:
+            logger.info(f'Executing query: {query}')
+            db_engine.execute(text(query))
+            
+    def __partition_years(self, values):
+        # sorted years of the LIST partitions, raises ValueError if any value is not a positive integer (e.g. year 0 of a blank date)
+        years = sorted({int(value) for value in values})
+        if any(float(value) != int(value) for value in values) or any(year < 1 for year in years):
+            raise ValueError(f'{[value for value in values if float(value) != int(value) or int(value) < 1][:10]} are not years')
+        return years
+        
+    def __partition_name(self, table_name, value):
+        # partition name made of the table name and the value, e.g. orders_table_2019
+        return table_name + '_' + re.sub(r'\W', '_', str(value))
+    
+    def __column_type(self, data, column_name, data_type):
+        if data_type == 'varchar':
+            # size the column to the longest text in the DataFrame (at least 1 character)
+            characters = data[column_name].astype('string').str.len().max()
+            return f'VARCHAR({1 if pd.isna(characters) else max(int(characters), 1)})'
+        elif data_type == 'uuid':
+            return 'UUID'
+        elif data_type is not None:
+            return data_type
+        # columns not in the schema get a type based on the DataFrame column
+        return default_column_types.get(pd.api.types.infer_dtype(data[column_name], skipna=True), 'TEXT')
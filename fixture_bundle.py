@@ -0,0 +1,164 @@
+'''
+FixtureBundle class stores responses from the data sources (API JSON, downloaded files, RDS result sets and non-secret .env values)
+in a local folder, so the data extraction can later be replayed offline, without credentials and at full local speed.
+
+Every saved item is identified by a key (e.g. 'api:<url>', 'file:<url>', 'rds:<table_name>') and listed in the manifest.json file in the bundle folder.
+
+Methods:
+-------
+has(key)
+    Returns True if an item with the key is saved in the bundle.
+
+save_json(key, data) / load_json(key)
+    Saves / loads JSON data, e.g. API responses.
+
+save_file(key, local_file_path) / file_path(key)
+    Copies a downloaded file into the bundle / returns the path to the file saved in the bundle.
+
+open_file_writer(key, extension='')
+    Opens a new file in the bundle for writing (used to record streamed files chunk by chunk). The data is written to a temporary file,
+    which is added to the bundle only when commit() is called, so an interrupted stream doesn't leave a truncated file in the bundle.
+
+save_frame(key, df) / load_frame(key)
+    Saves / loads a Pandas DataFrame, e.g. RDS result sets.
+
+save_variable(name, value) / get_variable(name)
+    Saves / returns a value of an environmental variable.
+'''
+
+from datetime import datetime
+import hashlib
+import json
+import pandas as pd
+from pathlib import Path
+from pipeline_logging import get_logger
+import shutil
+import sys
+
+
+######### VARIABLES #########
+# logger of this module
+logger = get_logger(__name__)
+# Name of the file listing all items saved in the bundle
+manifest_file_name = 'manifest.json'
+
+
+######### CLASS #########
+class FixtureBundle:
+    def __init__(self, folder, create=False):
+        self.folder = Path(folder)
+        self.__manifest_path = self.folder / manifest_file_name
+        if self.__manifest_path.exists():
+            with open(self.__manifest_path, 'r') as file:
+                self.manifest = json.load(file)
+        elif create:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            self.manifest = {'created_at': datetime.now().isoformat(timespec='seconds'), 'entries': {}, 'variables': {}}
+            self.__save_manifest()
+        else:
+            logger.error(f'\n--> Error, fixture bundle not found in the folder: {self.folder}\n\n')
+            sys.exit()
+
+
+    def __save_manifest(self):
+        with open(self.__manifest_path, 'w') as file:
+            json.dump(self.manifest, file, indent=2)
+
+
+    def __entry_file_name(self, key, kind, extension):
+        # file names are based on the key hash so any URL or table name can be used as a key
+        return f"{kind}_{hashlib.sha1(key.encode()).hexdigest()[:16]}{extension}"
+
+
+    def __add_entry(self, key, kind, extension):
+        file_name = self.__entry_file_name(key, kind, extension)
+        self.manifest['entries'][key] = {'file': file_name, 'kind': kind}
+        self.__save_manifest()
+        return self.folder / file_name
+
+
+    def __entry_path(self, key):
+        if key not in self.manifest['entries']:
+            logger.error(f'\n--> Error, {key} has not been recorded in the fixture bundle {self.folder}\n\n')
+            sys.exit()
+        return self.folder / self.manifest['entries'][key]['file']
+
+
+    def has(self, key):
+        return key in self.manifest['entries']
+
+
+    def save_json(self, key, data):
+        with open(self.__add_entry(key, 'json', '.json'), 'w') as file:
+            json.dump(data, file)
+
+
+    def load_json(self, key):
+        with open(self.__entry_path(key), 'r') as file:
+            return json.load(file)
+
+
+    def save_file(self, key, local_file_path):
+        extension = Path(local_file_path).suffix
+        file_path = self.folder / self.__entry_file_name(key, 'file', extension)
+        temporary_path = file_path.with_name(file_path.name + '.tmp')
+        shutil.copyfile(local_file_path, temporary_path)
+        temporary_path.replace(file_path)
+        self.__add_entry(key, 'file', extension)
+
+
+    def file_path(self, key):
+        return str(self.__entry_path(key))
+
+
+    def open_file_writer(self, key, extension=''):
+        file_path = self.folder / self.__entry_file_name(key, 'file', extension)
+        return FixtureFileWriter(file_path, lambda: self.__add_entry(key, 'file', extension))
+
+
+    def save_frame(self, key, df):
+        df.to_pickle(self.__add_entry(key, 'frame', '.pkl'))
+
+
+    def load_frame(self, key):
+        return pd.read_pickle(self.__entry_path(key))
+
+
+    def save_variable(self, name, value):
+        self.manifest['variables'][name] = value
+        self.__save_manifest()
+
+
+    def get_variable(self, name):
+        return self.manifest['variables'].get(name)
+
+
+class FixtureFileWriter:
+    '''
+    Writes a file of the fixture bundle to a temporary file. commit() replaces the bundle file with the temporary file and adds it 
+    to the manifest, close() without commit() removes the temporary file (e.g. when the stream was interrupted).
+    '''
+    def __init__(self, file_path, on_commit):
+        self.file_path = Path(file_path)
+        self.temporary_path = self.file_path.with_name(self.file_path.name + '.tmp')
+        self.__file = open(self.temporary_path, 'wb')
+        self.__on_commit = on_commit
+        self.committed = False
+
+
+    def write(self, data):
+        self.__file.write(data)
+
+
+    def commit(self):
+        self.__file.close()
+        self.temporary_path.replace(self.file_path)
+        self.__on_commit()
+        self.committed = True
+
+
+    def close(self):
+        if not self.committed:
+            self.__file.close()
+            self.temporary_path.unlink(missing_ok=True)
+            logger.warning(f'\n--> The stream was not read completely, {self.file_path.name} has not been saved to the fixture bundle.\n')
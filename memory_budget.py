@@ -0,0 +1,231 @@
+'''
+MemoryBudget class keeps the DataFrames passed between the steps of the programme and makes sure the process stays within a memory budget.
+Every DataFrame is released as soon as the step which needs it has taken it. When the DataFrames kept in memory (their memory_usage(deep=True))
+exceed the budget, the least recently used DataFrames are spilled to local Parquet files (or pickle files if Parquet is not available) and
+are loaded back only when a later step asks for them. A DataFrame which does not fit in the budget on its own is spilled as well, so it is
+not kept in memory between the steps. The memory used by the process (RSS) is only a secondary guard: the DataFrames are also spilled
+when RSS exceeds rss_guard_factor times the budget, as RSS rarely goes down after pandas frees memory and would spill every later DataFrame.
+
+The budget is set with MEMORY_BUDGET_MB in .env file (0 or not set means no budget, DataFrames are only released when no longer needed).
+
+Methods:
+-------
+put(name, df)
+    Keeps the DataFrame until a later step takes it. Spills other DataFrames to disk if the memory budget is exceeded.
+
+    Parameters:
+    ----------
+    name: string
+        Name used to take the DataFrame later.
+    df: DataFrame
+        DataFrame to keep.
+
+get(name)
+    Returns the DataFrame (loaded back from disk if it was spilled) and keeps it for later steps.
+
+    Parameters:
+    ----------
+    name: string
+        Name of the DataFrame.
+
+pop(name)
+    Returns the DataFrame (loaded back from disk if it was spilled) and releases it, so it is not kept any longer.
+
+    Parameters:
+    ----------
+    name: string
+        Name of the DataFrame.
+
+release(name)
+    Releases the DataFrame and removes its spill file.
+
+    Parameters:
+    ----------
+    name: string
+        Name of the DataFrame.
+
+rows(name)
+    Returns the number of rows of the DataFrame without loading it back from disk.
+
+    Parameters:
+    ----------
+    name: string
+        Name of the DataFrame.
+'''
+
+from collections import OrderedDict
+import gc
+import pandas as pd
+from pathlib import Path
+from pipeline_logging import get_logger
+from pipeline_metrics import current_rss_bytes
+import sys
+
+
+######### VARIABLES #########
+# logger of this module
+logger = get_logger(__name__)
+# Default folder where DataFrames are spilled
+default_spill_folder = './temp_files/spill'
+# DataFrames are also spilled when the memory used by the process (RSS) is over this many times the budget
+rss_guard_factor = 2
+
+
+######### CLASS #########
+class MemoryBudget:
+    def __init__(self, budget_mb=0, spill_folder=default_spill_folder):
+        self.budget_bytes = int(budget_mb) * 1024 * 1024
+        self.spill_folder = Path(spill_folder)
+        self.__frames = OrderedDict() # name -> DataFrame kept in memory (least recently used first)
+        self.__spilled = {}           # name -> path of the spill file
+        self.__rows = {}              # name -> number of rows
+        self.__sizes = {}             # name -> bytes used by the DataFrame kept in memory
+
+
+    def put(self, name, df):
+        '''
+        put(name, df)
+            Keeps the DataFrame until a later step takes it. Spills other DataFrames to disk if the memory budget is exceeded.
+
+            Parameters:
+            ----------
+            name: string
+                Name used to take the DataFrame later.
+            df: DataFrame
+                DataFrame to keep.
+        '''
+        self.release(name)
+        self.__keep(name, df)
+        self.__rows[name] = df.shape[0]
+        if not self.__enforce_budget(keep=name):
+            # the DataFrame alone is over the budget, it is not kept in memory
+            self.__spill(name)
+
+
+    def get(self, name):
+        '''
+        get(name)
+            Returns the DataFrame (loaded back from disk if it was spilled) and keeps it for later steps.
+
+            Parameters:
+            ----------
+            name: string
+                Name of the DataFrame.
+        '''
+        if name in self.__spilled:
+            df = self.__load(name)
+            self.__keep(name, df)
+            if not self.__enforce_budget(keep=name):
+                # the DataFrame alone is over the budget, it is returned but only its spill file is kept
+                self.__frames.pop(name)
+                self.__sizes.pop(name)
+                return df
+            self.__spilled.pop(name).unlink(missing_ok=True)
+        elif name not in self.__frames:
+            logger.error(f'\n--> Error, {name} data is not available.\n\n')
+            sys.exit()
+        self.__frames.move_to_end(name)
+        return self.__frames[name]
+
+
+    def pop(self, name):
+        '''
+        pop(name)
+            Returns the DataFrame (loaded back from disk if it was spilled) and releases it, so it is not kept any longer.
+
+            Parameters:
+            ----------
+            name: string
+                Name of the DataFrame.
+        '''
+        df = self.get(name)
+        self.release(name)
+        return df
+
+
+    def release(self, name):
+        '''
+        release(name)
+            Releases the DataFrame and removes its spill file.
+
+            Parameters:
+            ----------
+            name: string
+                Name of the DataFrame.
+        '''
+        released = self.__frames.pop(name, None) is not None
+        self.__sizes.pop(name, None)
+        spill_path = self.__spilled.pop(name, None)
+        if spill_path:
+            spill_path.unlink(missing_ok=True)
+        self.__rows.pop(name, None)
+        if released and self.__over_budget():
+            gc.collect()
+
+
+    def rows(self, name):
+        '''
+        rows(name)
+            Returns the number of rows of the DataFrame without loading it back from disk.
+
+            Parameters:
+            ----------
+            name: string
+                Name of the DataFrame.
+        '''
+        return self.__rows.get(name, 0)
+
+
+    def __keep(self, name, df):
+        self.__frames[name] = df
+        self.__sizes[name] = int(df.memory_usage(deep=True).sum())
+
+
+    def __held_bytes(self):
+        return sum(self.__sizes.values())
+
+
+    def __over_budget(self):
+        if not self.budget_bytes:
+            return False
+        return self.__held_bytes() > self.budget_bytes or current_rss_bytes() > self.budget_bytes * rss_guard_factor
+
+
+    def __enforce_budget(self, keep):
+        # spill the least recently used DataFrames until the DataFrames kept in memory are within the budget,
+        # returns False if the process is still over the budget with only the DataFrame keep left in memory
+        while self.__over_budget():
+            candidates = [name for name in self.__frames if name != keep]
+            if not candidates:
+                logger.warning(f'\n--> Memory used by {keep} data ({self.__held_bytes() // 1024 // 1024} MB, process {current_rss_bytes() // 1024 // 1024} MB) is over the budget ({self.budget_bytes // 1024 // 1024} MB), {keep} data is kept on disk.\n')
+                return False
+            self.__spill(candidates[0])
+        return True
+
+
+    def __spill(self, name):
+        self.spill_folder.mkdir(parents=True, exist_ok=True)
+        df = self.__frames.pop(name)
+        self.__sizes.pop(name)
+        try:
+            spill_path = self.spill_folder / f'{name}.parquet'
+            df.to_parquet(spill_path)
+        except Exception:
+            # Parquet needs pyarrow and does not support all column types, pickle supports all of them
+            spill_path = self.spill_folder / f'{name}.pkl'
+            df.to_pickle(spill_path)
+        self.__spilled[name] = spill_path
+        del df
+        gc.collect()
+        logger.info(f'--> {name} data spilled to {spill_path} to stay within the memory budget.')
+
+
+    def __load(self, name):
+        # the spill file is removed by get() once the DataFrame is kept in memory
+        spill_path = self.__spilled[name]
+        if spill_path.suffix == '.parquet':
+            df = pd.read_parquet(spill_path)
+        else:
+            df = pd.read_pickle(spill_path)
+        logger.info(f'--> {name} data loaded back from {spill_path}.')
+        return df
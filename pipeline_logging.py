@@ -0,0 +1,115 @@
+'''
+Logging set up for the programme. All classes write their messages through loggers returned by get_logger()
+so the amount of output can be controlled with a log level:
+    DEBUG - everything, including expensive DataFrame diagnostics (first rows and info of every DataFrame),
+    INFO - progress of every step (default),
+    WARNING - quiet production mode, only warnings and errors.
+
+The level is read from LOG_LEVEL in .env file, QUIET=1 is a shortcut for LOG_LEVEL=WARNING.
+
+Functions:
+-------
+configure_logging(level=None)
+    Sets up the output of all loggers of the programme. Should be called once when the programme starts.
+
+    Parameters:
+    ----------
+    level: string
+        Log level name, e.g. DEBUG, INFO or WARNING. Defaults to LOG_LEVEL / QUIET from .env file.
+
+get_logger(name)
+    Returns a logger for a module of the programme.
+
+    Parameters:
+    ----------
+    name: string
+        Name of the module, usually __name__.
+
+log_dataframe(logger, df, title, level=logging.DEBUG)
+    Logs the first 5 rows and the information about a DataFrame. Nothing is computed if the level is not enabled.
+
+    Parameters:
+    ----------
+    logger: logging.Logger
+        Logger used to write the diagnostics.
+    df: DataFrame
+        DataFrame to describe.
+    title: string
+        Title displayed above the diagnostics.
+    level: number
+        Log level of the diagnostics (DEBUG by default).
+'''
+
+import io
+import logging
+import os
+import sys
+
+
+######### VARIABLES #########
+# Name of the parent logger of all loggers in the programme
+root_logger_name = 'mrdc'
+# Default log level (can be changed with LOG_LEVEL in .env file)
+default_log_level = 'INFO'
+# Log level used in the quiet production mode (QUIET=1 in .env file)
+quiet_log_level = 'WARNING'
+
+
+######### FUNCTIONS #########
+def configure_logging(level=None):
+    '''
+    configure_logging(level=None)
+        Sets up the output of all loggers of the programme. Should be called once when the programme starts.
+
+        Parameters:
+        ----------
+        level: string
+            Log level name, e.g. DEBUG, INFO or WARNING. Defaults to LOG_LEVEL / QUIET from .env file.
+    '''
+    if level is None:
+        level = quiet_log_level if os.getenv('QUIET') == '1' else os.getenv('LOG_LEVEL', default_log_level)
+
+    root_logger = logging.getLogger(root_logger_name)
+    root_logger.setLevel(level.upper())
+    if not root_logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        root_logger.addHandler(handler)
+    root_logger.propagate = False
+
+
+def get_logger(name):
+    '''
+    get_logger(name)
+        Returns a logger for a module of the programme.
+
+        Parameters:
+        ----------
+        name: string
+            Name of the module, usually __name__.
+    '''
+    return logging.getLogger(f'{root_logger_name}.{name}')
+
+
+def log_dataframe(logger, df, title, level=logging.DEBUG):
+    '''
+    log_dataframe(logger, df, title, level=logging.DEBUG)
+        Logs the first 5 rows and the information about a DataFrame. Nothing is computed if the level is not enabled.
+
+        Parameters:
+        ----------
+        logger: logging.Logger
+            Logger used to write the diagnostics.
+        df: DataFrame
+            DataFrame to describe.
+        title: string
+            Title displayed above the diagnostics.
+        level: number
+            Log level of the diagnostics (DEBUG by default).
+    '''
+    if not logger.isEnabledFor(level):
+        return
+    info = io.StringIO()
+    df.info(buf=info)
+    logger.log(level, f'\n############## {title} - first 5 rows of data: ##############\n\n{df.head()}')
+    logger.log(level, f'\n############## {title} - data information: ##############\n\n{info.getvalue()}')
@@ -0,0 +1,204 @@
+'''
+PipelineMetrics class records how long each step of the programme takes and how much memory it uses.
+Every finished step is appended as one JSON line to the metrics file and a summary table can be logged at the end of the run.
+
+Recorded values for each step:
+    - wall time and CPU time (in seconds),
+    - rows in and rows out (when reported by the programme with the record() method),
+    - bytes transferred from the remote data sources (when reported by the programme with the record() method),
+    - time of the report query run in the background for the step (when reported by the programme with the record() method),
+    - current RSS of the process at the end of the step and peak RSS during the step (in MB, the peak is sampled
+      every rss_sample_interval seconds by a background thread, so very short spikes may be missed),
+    - peak memory allocated by Python during the step (in MB, only when tracemalloc is enabled).
+
+Methods:
+-------
+start_step(step_name)
+    Starts measuring a new step. If a step is already being measured it is finished first.
+
+    Parameters:
+    ----------
+    step_name: string
+        Name of the step displayed in the summary and saved in the metrics file.
+
+end_step()
+    Finishes measuring the current step and appends its metrics to the metrics file.
+
+record(**values)
+    Adds values to the metrics of the current step. Numeric values are added to the values already recorded.
+
+    Parameters:
+    ----------
+    values: keyword arguments
+        Values to record, e.g. rows_in=100, rows_out=95, bytes_transferred=2048.
+
+print_summary()
+    Finishes the current step and logs a summary table with the metrics of all steps from this run.
+
+current_rss_bytes()
+    Returns the current resident set size (RSS) of the process in bytes.
+'''
+
+from beautifultable import BeautifulTable
+from datetime import datetime
+import json
+import os
+from pipeline_logging import get_logger
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+
+######### VARIABLES #########
+# logger of this module
+logger = get_logger(__name__)
+# Number of bytes in a megabyte
+bytes_in_mb = 1024 * 1024
+# Interval (in seconds) between the samples of the RSS used to find the peak RSS of each step
+rss_sample_interval = 0.05
+# Columns displayed in the summary table
+summary_columns = ['step', 'wall_time_s', 'cpu_time_s', 'query_time_s', 'rows_in', 'rows_out', 'bytes_transferred', 'peak_rss_mb', 'tracemalloc_peak_mb']
+
+
+######### FUNCTIONS #########
+def current_rss_bytes():
+    '''
+    current_rss_bytes()
+        Returns the current resident set size (RSS) of the process in bytes.
+        On systems without /proc the peak RSS of the whole run is returned instead.
+    '''
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+######### CLASS #########
+class PipelineMetrics:
+    def __init__(self, metrics_file, use_tracemalloc=False):
+        self.metrics_file = metrics_file
+        self.use_tracemalloc = use_tracemalloc
+        self.run_id = datetime.now().strftime('%Y%m%d%H%M%S')
+        self.steps = [] # metrics of all finished steps
+        self.__current = None
+        self.__peak_rss = 0
+        self.__sampler_stop = None
+        if self.use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+    def start_step(self, step_name):
+        '''
+        start_step(step_name)
+            Starts measuring a new step. If a step is already being measured it is finished first.
+
+            Parameters:
+            ----------
+            step_name: string
+                Name of the step displayed in the summary and saved in the metrics file.
+        '''
+        self.end_step()
+        if self.use_tracemalloc:
+            tracemalloc.reset_peak()
+        self.__current = {
+            'run_id': self.run_id,
+            'step': step_name,
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'rows_in': None,
+            'rows_out': None,
+            'bytes_transferred': None,
+            '_wall_start': time.perf_counter(),
+            '_cpu_start': time.process_time(),
+        }
+        self.__start_rss_sampler()
+
+
+    def end_step(self):
+        '''
+        end_step()
+            Finishes measuring the current step and appends its metrics to the metrics file.
+        '''
+        if self.__current is None:
+            return
+        step = self.__current
+        self.__current = None
+        self.__stop_rss_sampler()
+
+        step['wall_time_s'] = round(time.perf_counter() - step.pop('_wall_start'), 3)
+        step['cpu_time_s'] = round(time.process_time() - step.pop('_cpu_start'), 3)
+        rss = current_rss_bytes()
+        step['rss_mb'] = round(rss / bytes_in_mb, 1)
+        step['peak_rss_mb'] = round(max(self.__peak_rss, rss) / bytes_in_mb, 1)
+        step['tracemalloc_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / bytes_in_mb, 1) if self.use_tracemalloc else None
+        self.steps.append(step)
+
+        # append the step to the metrics file
+        try:
+            with open(self.metrics_file, 'a') as file:
+                file.write(json.dumps(step) + '\n')
+        except Exception as e:
+            logger.error(f'Error occured when saving the metrics: {e}')
+
+
+    def record(self, **values):
+        '''
+        record(**values)
+            Adds values to the metrics of the current step. Numeric values are added to the values already recorded.
+
+            Parameters:
+            ----------
+            values: keyword arguments
+                Values to record, e.g. rows_in=100, rows_out=95, bytes_transferred=2048.
+        '''
+        if self.__current is None:
+            return
+        for name, value in values.items():
+            if isinstance(value, (int, float)) and isinstance(self.__current.get(name), (int, float)):
+                self.__current[name] += value
+            else:
+                self.__current[name] = value
+
+
+    def print_summary(self):
+        '''
+        print_summary()
+            Finishes the current step and logs a summary table with the metrics of all steps from this run.
+        '''
+        self.end_step()
+
+        table = BeautifulTable(maxwidth=200)
+        table.columns.header = summary_columns
+        for step in self.steps:
+            table.rows.append(['' if step.get(column) is None else step.get(column) for column in summary_columns])
+
+        total_wall_time = round(sum(step['wall_time_s'] for step in self.steps), 3)
+        total_cpu_time = round(sum(step['cpu_time_s'] for step in self.steps), 3)
+
+        logger.info(f'\n\n############## Metrics summary: ##############\n\n{table}')
+        logger.info(f'\n--> Total wall time: {total_wall_time}s, total CPU time: {total_cpu_time}s.')
+        logger.info(f'--> Metrics saved to: {self.metrics_file}\n')
+
+
+    def __start_rss_sampler(self):
+        # the RSS is sampled in a background thread, so the peak is measured for this step only
+        # (ru_maxrss would give the peak of the whole run)
+        self.__peak_rss = current_rss_bytes()
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(rss_sample_interval):
+                self.__peak_rss = max(self.__peak_rss, current_rss_bytes())
+
+        threading.Thread(target=sample, daemon=True).start()
+        self.__sampler_stop = stop
+
+
+    def __stop_rss_sampler(self):
+        if self.__sampler_stop is not None:
+            self.__sampler_stop.set()
+            self.__sampler_stop = None
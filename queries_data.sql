@@ -1,3 +1,8 @@
+-- The programme runs these queries from report_queries.py. Tasks 3 - 6 and 8 read the sales_rollup table there
+-- (sales and quantity by year, month, store, store type, country and channel built when the orders are loaded)
+-- instead of joining the whole orders_table with the dimension tables. Task 9 sorts dim_date_times by its event_ts column
+-- (timestamp of the event made of year, month, day and timestamp when the data is cleaned) instead of building the timestamps in the query.
+
 
 -- #### TASK 1: No. of stores in each country #### 
 
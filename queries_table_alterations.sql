@@ -1,81 +1,125 @@
 ------------------------------------------------------------------------------------
 ---- NOTE:                                                                      ----
----- All the queries below are generated by DatabaseSchema class methods        ----
+---- All the queries below are generated by DatabaseConnector and               ----
+---- DatabaseSchema class methods                                               ----
 ---- based on the arguments passed to the methods from the main programme.      ----
----- Value of VARCHAR(?) is calculated dynamically by the methods to get        ----
----- the maximum length of the text in the column.                              ----
+---- Value of VARCHAR(?) is the maximum length of the text in the column of     ----
+---- the DataFrame before the upload, so no table is scanned to size it.        ----
 ------------------------------------------------------------------------------------
 
 -- #### TASK 1: Change the data types in the orders_table ####
-ALTER TABLE orders_table ALTER COLUMN "date_uuid" TYPE UUID USING date_uuid::UUID
-ALTER TABLE orders_table ALTER COLUMN "user_uuid" TYPE UUID USING user_uuid::UUID
-ALTER TABLE orders_table ALTER COLUMN "card_number" TYPE VARCHAR(19)
-ALTER TABLE orders_table ALTER COLUMN "store_code" TYPE VARCHAR(12)
-ALTER TABLE orders_table ALTER COLUMN "product_code" TYPE VARCHAR(11)
-ALTER TABLE orders_table ALTER COLUMN "product_quantity" TYPE smallint
+-- Table created with its final column types before the data is uploaded (other columns get a type based on the DataFrame column)
+DROP TABLE IF EXISTS orders_table CASCADE
+CREATE TABLE orders_table (
+    "date_uuid" UUID,
+    "user_uuid" UUID,
+    "card_number" VARCHAR(19),
+    "store_code" VARCHAR(12),
+    "product_code" VARCHAR(11),
+    "product_quantity" smallint,
+    ...
+)
 
 
 -- #### TASK 2: Change the data types in the dim_users table ####
-ALTER TABLE dim_users ALTER COLUMN "first_name" TYPE varchar(255)
-ALTER TABLE dim_users ALTER COLUMN "last_name" TYPE varchar(255)
-ALTER TABLE dim_users ALTER COLUMN "date_of_birth" TYPE date
-ALTER TABLE dim_users ALTER COLUMN "country_code" TYPE VARCHAR(3)
-ALTER TABLE dim_users ALTER COLUMN "user_uuid" TYPE UUID USING user_uuid::UUID
-ALTER TABLE dim_users ALTER COLUMN "join_date" TYPE date
+-- Table created with its final column types before the data is uploaded (other columns get a type based on the DataFrame column)
+DROP TABLE IF EXISTS dim_users CASCADE
+CREATE TABLE dim_users (
+    "first_name" varchar(255),
+    "last_name" varchar(255),
+    "date_of_birth" date,
+    "country_code" VARCHAR(3),
+    "user_uuid" UUID,
+    "join_date" date,
+    ...
+)
 
 
 -- #### TASK 3: Change the data types in the dim_store_details table ####
-ALTER TABLE dim_store_details ALTER COLUMN "longitude" TYPE float
-ALTER TABLE dim_store_details ALTER COLUMN "locality" TYPE varchar(255)
-ALTER TABLE dim_store_details ALTER COLUMN "store_code" TYPE VARCHAR(12)
-ALTER TABLE dim_store_details ALTER COLUMN "staff_numbers" TYPE smallint
-ALTER TABLE dim_store_details ALTER COLUMN "opening_date" TYPE date
-ALTER TABLE dim_store_details ALTER COLUMN "store_type" TYPE varchar(255)
-ALTER TABLE dim_store_details ALTER COLUMN "latitude" TYPE float
-ALTER TABLE dim_store_details ALTER COLUMN "country_code" TYPE VARCHAR(2)
-ALTER TABLE dim_store_details ALTER COLUMN "continent" TYPE varchar(255)
+-- Table created with its final column types before the data is uploaded (other columns get a type based on the DataFrame column)
+DROP TABLE IF EXISTS dim_store_details CASCADE
+CREATE TABLE dim_store_details (
+    "longitude" float,
+    "locality" varchar(255),
+    "store_code" VARCHAR(12),
+    "staff_numbers" smallint,
+    "opening_date" date,
+    "store_type" varchar(255),
+    "latitude" float,
+    "country_code" VARCHAR(2),
+    "continent" varchar(255),
+    ...
+)
 
 
 -- #### TASK 4: Categorise weight range in the dim_products table ####
--- Add a new weight category column to the dim_products table
-UPDATE dim_products 
-SET weight_class = CASE 
-    WHEN weight < 2 THEN 'Light' 
-    WHEN weight >= 2 AND weight < 40 THEN 'Mid_Sized' 
-    WHEN weight >= 40 AND weight < 140 THEN 'Heavy' 
-    ELSE 'Truck_Required' 
-END;
-
--- Add a new availability column to the dim_products table
-ALTER TABLE dim_products ADD COLUMN IF NOT EXISTS still_available BOOLEAN
-SELECT column_name FROM information_schema.columns WHERE table_name = 'dim_products' AND column_name = 'removed'
-ALTER TABLE dim_products DROP COLUMN IF EXISTS removed
+-- weight_class and still_available columns are added by DataCleaning.clean_products_data() before the data is uploaded:
+--     weight_class: 'Light' (weight < 2), 'Mid_Sized' (2 <= weight < 40), 'Heavy' (40 <= weight < 140), otherwise 'Truck_Required'
+--     still_available: False when removed = 'Removed', otherwise True (the removed column is dropped)
 
 
 -- #### TASK 5: Change the data types in the dim_products table ####
-ALTER TABLE dim_products ALTER COLUMN "product_price" TYPE float
-ALTER TABLE dim_products ALTER COLUMN "weight" TYPE float
-ALTER TABLE dim_products ALTER COLUMN "EAN" TYPE VARCHAR(17)
-ALTER TABLE dim_products ALTER COLUMN "product_code" TYPE VARCHAR(11)
-ALTER TABLE dim_products ALTER COLUMN "date_added" TYPE date
-ALTER TABLE dim_products ALTER COLUMN "uuid" TYPE UUID USING uuid::UUID
-ALTER TABLE dim_products ALTER COLUMN "still_available" TYPE boolean
-ALTER TABLE dim_products ALTER COLUMN "weight_class" TYPE VARCHAR(14)
+-- Table created with its final column types before the data is uploaded (other columns get a type based on the DataFrame column)
+DROP TABLE IF EXISTS dim_products CASCADE
+CREATE TABLE dim_products (
+    "product_price" float,
+    "weight" float,
+    "EAN" VARCHAR(17),
+    "product_code" VARCHAR(11),
+    "date_added" date,
+    "uuid" UUID,
+    "still_available" boolean,
+    "weight_class" VARCHAR(14),
+    ...
+)
 
 
 -- #### TASK 6: Change the data types in the dim_date_times table ####
-ALTER TABLE dim_date_times ALTER COLUMN "month" TYPE smallint
-ALTER TABLE dim_date_times ALTER COLUMN "year" TYPE smallint
-ALTER TABLE dim_date_times ALTER COLUMN "day" TYPE smallint
-ALTER TABLE dim_date_times ALTER COLUMN "time_period" TYPE VARCHAR(10)
-ALTER TABLE dim_date_times ALTER COLUMN "date_uuid" TYPE UUID USING date_uuid::UUID
+-- Table created with its final column types before the data is uploaded (other columns get a type based on the DataFrame column)
+DROP TABLE IF EXISTS dim_date_times CASCADE
+CREATE TABLE dim_date_times (
+    "month" smallint,
+    "year" smallint,
+    "day" smallint,
+    "time_period" VARCHAR(10),
+    "date_uuid" UUID,
+    "event_ts" timestamp,
+    ...
+)
+-- event_ts (date from year, month and day plus the time of timestamp) is added by DataCleaning.add_event_timestamps() and indexed for the query of step 44
+CREATE INDEX IF NOT EXISTS dim_date_times_event_ts_index ON dim_date_times (event_ts)
 
 
 -- #### TASK 7: Change the data types in the dim_card_details table ####
-ALTER TABLE dim_card_details ALTER COLUMN "card_number" TYPE VARCHAR(19)
-ALTER TABLE dim_card_details ALTER COLUMN "expiry_date" TYPE VARCHAR(5)
-ALTER TABLE dim_card_details ALTER COLUMN "date_payment_confirmed" TYPE date
-
+-- Table created with its final column types before the data is uploaded (other columns get a type based on the DataFrame column)
+DROP TABLE IF EXISTS dim_card_details CASCADE
+CREATE TABLE dim_card_details (
+    "card_number" VARCHAR(19),
+    "expiry_date" VARCHAR(5),
+    "date_payment_confirmed" date,
+    ...
+)
+
+
+-- #### Sales rollup used by the report queries (steps 38 - 41 and 43) ####
+-- Built by DataCleaning.build_sales_rollup() from the orders, products, stores and date events and uploaded after the orders_table
+-- All orders are included, has_product / has_store / has_date show which dimension tables have a matching row
+-- (the dimension columns are NULL if not), so each query keeps the same orders as its INNER JOINs with the dimension tables
+DROP TABLE IF EXISTS sales_rollup CASCADE
+CREATE TABLE sales_rollup (
+    "year" smallint,
+    "month" smallint,
+    "store_code" VARCHAR(?),
+    "store_type" varchar(255),
+    "country_code" VARCHAR(?),
+    "channel" VARCHAR(7),
+    "has_product" boolean,
+    "has_store" boolean,
+    "has_date" boolean,
+    "total_sales" numeric(14, 2),
+    "product_quantity" bigint,
+    "number_of_sales" bigint
+)
 
 -- #### TASK 8: Create primary keys in the dimension tables ####
 ALTER TABLE dim_users ADD PRIMARY KEY (user_uuid)
@@ -103,4 +147,11 @@ ALTER TABLE orders_table DROP CONSTRAINT IF EXISTS orders_table_dim_date_times_d
 ALTER TABLE orders_table ADD CONSTRAINT orders_table_dim_date_times_date_uuid_fkey FOREIGN KEY (date_uuid) REFERENCES dim_date_times(date_uuid)
 
 ALTER TABLE orders_table DROP CONSTRAINT IF EXISTS orders_table_dim_card_details_card_number_fkey
-ALTER TABLE orders_table ADD CONSTRAINT orders_table_dim_card_details_card_number_fkey FOREIGN KEY (card_number) REFERENCES dim_card_details(card_number)
\ No newline at end of file
+ALTER TABLE orders_table ADD CONSTRAINT orders_table_dim_card_details_card_number_fkey FOREIGN KEY (card_number) REFERENCES dim_card_details(card_number)
+
+-- No query (steps 36 - 44) reads the orders_table, the queries of the sales read sales_rollup instead, so the foreign keys
+-- of the orders_table are not indexed. The country code filtered by the query of step 43 is indexed in sales_rollup, the other queries
+-- group the whole table, so indexes of the grouping columns are not used by their query plans
+-- (CREATE INDEX CONCURRENTLY is used in low lock mode, the table is analysed so the planner can use the new indexes)
+CREATE INDEX IF NOT EXISTS sales_rollup_country_code_index ON sales_rollup (country_code)
+ANALYZE sales_rollup
@@ -0,0 +1,266 @@
+'''
+QueryCache class keeps the results of the database queries in a local folder, so the same query doesn't need to be sent
+to the database again if none of the tables used by the query has changed.
+
+Every result is identified by the normalised query text (whitespace collapsed, trailing semicolon removed) and the version of each
+table used by the query. The version is read from the database catalog: the load marker saved as the comment of the table by
+DatabaseConnector.upload_to_db() (a new value every time the table is loaded) and the file nodes of the table and of its partitions
+(these change when the table is created again, truncated or rewritten). Reading or analysing the tables doesn't change the version.
+When any table changes, the query gets a new key and is sent to the database again. The key can be read before the query is run
+and passed to get() and put(), so a result is saved with the versions of the tables it was read from.
+
+The results are saved as Parquet files (plain data, no Python objects are loaded from the cache folder).
+The cache is limited by size, the least recently used results are removed first when the limit is exceeded.
+The cache is enabled with QUERY_CACHE=1 in .env file and its size is set with QUERY_CACHE_MB (default 100 MB).
+
+Methods:
+-------
+key(engine, query)
+    Returns the key of the query result: the hash of the normalised query and the current versions of the tables used by the query.
+
+    Parameters:
+    ----------
+    engine: sqlalchemy.engine.Engine
+        The SQLAlchemy engine object.
+    query: string
+        The SQL query.
+
+get(engine, query, key=None)
+    Returns the columns and rows of the query result saved in the cache or None if the result is not cached
+    (or any of the tables used by the query has changed).
+
+    Parameters:
+    ----------
+    engine: sqlalchemy.engine.Engine
+        The SQLAlchemy engine object.
+    query: string
+        The SQL query.
+    key: string
+        Key returned by key(). The key is read from the database if not provided.
+
+put(engine, query, columns, rows, key=None)
+    Saves the query result in the cache and removes the least recently used results if the cache is too big.
+
+    Parameters:
+    ----------
+    engine: sqlalchemy.engine.Engine
+        The SQLAlchemy engine object.
+    query: string
+        The SQL query.
+    columns: list
+        Names of the columns of the result.
+    rows: list
+        Rows of the result.
+    key: string
+        Key returned by key() before the query was run. The key is read from the database if not provided.
+
+invalidate(table_names=None)
+    Removes the cached results of the queries using any of the tables (all results if table_names is not provided).
+
+    Parameters:
+    ----------
+    table_names: list
+        Names of the tables.
+'''
+
+from datetime import datetime
+import hashlib
+import json
+from pathlib import Path
+from pipeline_logging import get_logger
+import pyarrow
+import pyarrow.parquet
+import re
+from sqlalchemy import text
+
+
+######### VARIABLES #########
+# logger of this module
+logger = get_logger(__name__)
+# Default folder where the query results are saved
+default_cache_folder = './query_cache'
+# Name of the file listing all results saved in the cache
+index_file_name = 'index.json'
+# Tables, partitioned tables and materialized views which can be used by the queries (plain views have no data of their own,
+# so they don't have a version)
+relations_query = '''
+    SELECT relname
+    FROM pg_class
+    WHERE relnamespace = current_schema()::regnamespace AND relkind IN ('r', 'p', 'm')
+'''
+# Version of each table: load marker (comment of the table) and file nodes of the table and its partitions
+# (the statistics counters are not used, they change when the tables are read or analysed)
+table_versions_query = '''
+    SELECT
+        c.relname,
+        COALESCE(obj_description(c.oid, 'pg_class'), '') || '|' || string_agg(part.relfilenode::text, ',' ORDER BY part.relfilenode)
+    FROM pg_class c
+    LEFT JOIN LATERAL pg_partition_tree(c.oid) tree ON true
+    INNER JOIN pg_class part ON part.oid = COALESCE(tree.relid, c.oid)
+    WHERE c.relnamespace = current_schema()::regnamespace AND c.relname = ANY(:table_names)
+    GROUP BY c.oid, c.relname
+'''
+
+
+######### CLASS #########
+class QueryCache:
+    def __init__(self, max_size_mb=100, folder=default_cache_folder):
+        self.max_size_bytes = int(max_size_mb) * 1024 * 1024
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.__index_path = self.folder / index_file_name
+        self.index = {}
+        if self.__index_path.exists():
+            with open(self.__index_path, 'r') as file:
+                self.index = json.load(file)
+        self.hits = 0
+        self.misses = 0
+
+
+    def key(self, engine, query):
+        '''
+        key(engine, query)
+            Returns the key of the query result: the hash of the normalised query and the current versions of the tables used by the query.
+
+            Parameters:
+            ----------
+            engine: sqlalchemy.engine.Engine
+                The SQLAlchemy engine object.
+            query: string
+                The SQL query.
+        '''
+        normalised_query = self.__normalise(query)
+        table_names = self.__table_names(engine, normalised_query)
+        versions = dict(engine.execute(text(table_versions_query), {'table_names': table_names}).fetchall()) if table_names else {}
+        engine.execute(text("COMMIT"))
+
+        key_source = normalised_query + '|' + '|'.join(f'{name}={versions.get(name)}' for name in table_names)
+        return hashlib.sha1(key_source.encode()).hexdigest()
+
+
+    def get(self, engine, query, key=None):
+        '''
+        get(engine, query, key=None)
+            Returns the columns and rows of the query result saved in the cache or None if the result is not cached
+            (or any of the tables used by the query has changed).
+
+            Parameters:
+            ----------
+            engine: sqlalchemy.engine.Engine
+                The SQLAlchemy engine object.
+            query: string
+                The SQL query.
+            key: string
+                Key returned by key(). The key is read from the database if not provided.
+        '''
+        key = key or self.key(engine, query)
+        entry = self.index.get(key)
+        if entry is None or not (self.folder / entry['file']).exists():
+            self.misses += 1
+            return None
+
+        table = pyarrow.parquet.read_table(self.folder / entry['file'])
+        columns = [column.to_pylist() for column in table.columns]
+        entry['last_used'] = datetime.now().isoformat()
+        self.__save_index()
+        self.hits += 1
+        logger.info('--> Query result read from the cache.')
+        return table.column_names, list(zip(*columns))
+
+
+    def put(self, engine, query, columns, rows, key=None):
+        '''
+        put(engine, query, columns, rows, key=None)
+            Saves the query result in the cache and removes the least recently used results if the cache is too big.
+
+            Parameters:
+            ----------
+            engine: sqlalchemy.engine.Engine
+                The SQLAlchemy engine object.
+            query: string
+                The SQL query.
+            columns: list
+                Names of the columns of the result.
+            rows: list
+                Rows of the result.
+            key: string
+                Key returned by key() before the query was run. The key is read from the database if not provided.
+        '''
+        key = key or self.key(engine, query)
+        file_name = f'{key}.parquet'
+        try:
+            arrays = [pyarrow.array([row[i] for row in rows]) for i in range(len(columns))]
+            pyarrow.parquet.write_table(pyarrow.Table.from_arrays(arrays, names=list(columns)), self.folder / file_name)
+        except Exception as e:
+            # e.g. a column with values of different types, the query is sent to the database next time
+            logger.warning(f'--> Query result could not be saved in the cache: {e}')
+            (self.folder / file_name).unlink(missing_ok=True)
+            return
+
+        # results of the same query with older table versions are not needed any more
+        query_hash = self.__query_hash(query)
+        for old_key in [old_key for old_key, entry in self.index.items() if entry['query'] == query_hash and old_key != key]:
+            self.__remove(old_key)
+        self.index[key] = {
+            'file': file_name,
+            'query': query_hash,
+            'tables': self.__table_names(engine, self.__normalise(query)),
+            'size': (self.folder / file_name).stat().st_size,
+            'last_used': datetime.now().isoformat(),
+        }
+        self.__evict()
+        self.__save_index()
+
+
+    def invalidate(self, table_names=None):
+        '''
+        invalidate(table_names=None)
+            Removes the cached results of the queries using any of the tables (all results if table_names is not provided).
+
+            Parameters:
+            ----------
+            table_names: list
+                Names of the tables.
+        '''
+        keys = [key for key, entry in self.index.items() if table_names is None or set(entry['tables']) & set(table_names)]
+        for key in keys:
+            self.__remove(key)
+        self.__save_index()
+        logger.info(f'--> {len(keys)} query results removed from the cache.')
+
+
+    def __normalise(self, query):
+        # collapse whitespace and remove the trailing semicolon, so formatting changes don't change the key
+        return re.sub(r'\s+', ' ', query).strip().rstrip(';').strip()
+
+
+    def __query_hash(self, query):
+        return hashlib.sha1(self.__normalise(query).encode()).hexdigest()
+
+
+    def __table_names(self, engine, normalised_query):
+        # tables, partitioned tables and materialized views used by the query
+        relations = [row[0] for row in engine.execute(text(relations_query))]
+        engine.execute(text("COMMIT"))
+        return sorted(name for name in relations if re.search(rf'\b{re.escape(name)}\b', normalised_query))
+
+
+    def __remove(self, key):
+        entry = self.index.pop(key, None)
+        if entry:
+            (self.folder / entry['file']).unlink(missing_ok=True)
+
+
+    def __evict(self):
+        # remove the least recently used results until the cache fits in its size limit
+        total_size = sum(entry['size'] for entry in self.index.values())
+        for key in sorted(self.index, key=lambda key: self.index[key]['last_used']):
+            if total_size <= self.max_size_bytes:
+                break
+            total_size -= self.index[key]['size']
+            self.__remove(key)
+
+
+    def __save_index(self):
+        with open(self.__index_path, 'w') as file:
+            json.dump(self.index, file, indent=2)
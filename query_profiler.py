@@ -0,0 +1,237 @@
+'''
+QueryProfiler class runs the queries with EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) and saves their plans together with
+the wall time of the query to the query_profiles/<run id> folder (one JSON file for each query), so the plans from different runs
+can be compared. The profiling is enabled with QUERY_PROFILE=1 in .env file.
+
+The summary of each query lists:
+    - the plan nodes which took the most time (time of the node without the time of its child nodes),
+    - sequential scans reading at least big_table_rows rows,
+    - nodes where the actual number of rows is at least row_estimate_error_ratio times different from the planner's estimate.
+
+Methods:
+-------
+profile(engine, step, title, query)
+    Runs the query with EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON), saves the plan and the wall time, prints out and returns the summary.
+
+    Parameters:
+    ----------
+    engine: sqlalchemy.engine.Engine
+        The SQLAlchemy engine object.
+    step: int
+        Step number of the query.
+    title: string
+        Title of the query.
+    query: string
+        The SQL query.
+
+diff(previous_run_id=None)
+    Compares the plans of this run with the plans from the previous run (or the run previous_run_id), prints out and returns
+    the changes of the execution times and the queries whose plans have changed.
+
+    Parameters:
+    ----------
+    previous_run_id: string
+        Name of the folder of the run to compare with, the latest run before this run if not provided.
+'''
+
+from beautifultable import BeautifulTable
+from datetime import datetime
+import json
+from pathlib import Path
+from pipeline_logging import get_logger
+from sqlalchemy import text
+import time
+
+
+######### VARIABLES #########
+# logger of this module
+logger = get_logger(__name__)
+# Default folder where the plans are saved
+default_profiles_folder = './query_profiles'
+# number of nodes listed in the summary as the nodes which took the most time
+top_nodes = 5
+# sequential scans reading at least this number of rows are listed in the summary
+big_table_rows = 10000
+# nodes with the actual number of rows this many times higher or lower than the estimate are listed in the summary
+row_estimate_error_ratio = 10
+# queries running this many times longer than in the previous run are marked as regressions
+regression_ratio = 1.2
+
+
+######### CLASS #########
+class QueryProfiler:
+    def __init__(self, folder=default_profiles_folder, run_id=None):
+        self.folder = Path(folder)
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.run_folder = self.folder / self.run_id
+        self.run_folder.mkdir(parents=True, exist_ok=True)
+
+
+    def profile(self, engine, step, title, query):
+        '''
+        profile(engine, step, title, query)
+            Runs the query with EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON), saves the plan and the wall time, prints out and returns the summary.
+
+            Parameters:
+            ----------
+            engine: sqlalchemy.engine.Engine
+                The SQLAlchemy engine object.
+            step: int
+                Step number of the query.
+            title: string
+                Title of the query.
+            query: string
+                The SQL query.
+        '''
+        start_time = time.perf_counter()
+        result = engine.execute(text(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query.strip().rstrip(";")}')).fetchone()[0]
+        wall_time = (time.perf_counter() - start_time) * 1000
+        engine.execute(text("COMMIT"))
+        # the plan is returned as JSON, the database driver may return it as a string
+        if isinstance(result, str):
+            result = json.loads(result)
+
+        profile = {
+            'step': step,
+            'title': title,
+            'query': query,
+            'wall_time_ms': round(wall_time, 3),
+            'planning_time_ms': result[0].get('Planning Time'),
+            'execution_time_ms': result[0].get('Execution Time'),
+            'plan': result[0]['Plan'],
+        }
+        with open(self.run_folder / f'step_{step}.json', 'w') as file:
+            json.dump(profile, file, indent=2)
+
+        summary = self.__summarise(profile)
+        self.__print_summary(summary)
+        return summary
+
+
+    def diff(self, previous_run_id=None):
+        '''
+        diff(previous_run_id=None)
+            Compares the plans of this run with the plans from the previous run (or the run previous_run_id), prints out and returns
+            the changes of the execution times and the queries whose plans have changed.
+
+            Parameters:
+            ----------
+            previous_run_id: string
+                Name of the folder of the run to compare with, the latest run before this run if not provided.
+        '''
+        if previous_run_id is None:
+            previous_runs = sorted(path.name for path in self.folder.iterdir() if path.is_dir() and path.name < self.run_id)
+            if not previous_runs:
+                logger.info('--> There is no previous run to compare the query plans with.')
+                return []
+            previous_run_id = previous_runs[-1]
+
+        previous_profiles = self.__load_run(previous_run_id)
+        changes = []
+        for step, profile in sorted(self.__load_run(self.run_id).items()):
+            previous_profile = previous_profiles.get(step)
+            if previous_profile is None:
+                continue
+            time_ratio = profile['execution_time_ms'] / max(previous_profile['execution_time_ms'], 0.001)
+            changes.append({
+                'step': step,
+                'title': profile['title'],
+                'previous_time_ms': previous_profile['execution_time_ms'],
+                'time_ms': profile['execution_time_ms'],
+                'regression': time_ratio >= regression_ratio,
+                'query_changed': profile['query'] != previous_profile['query'],
+                'plan_changed': self.__plan_shape(profile['plan']) != self.__plan_shape(previous_profile['plan']),
+            })
+
+        table = BeautifulTable(maxwidth=200)
+        table.columns.header = ['Step', 'Title', f'Run {previous_run_id} (ms)', f'Run {self.run_id} (ms)', 'Regression', 'Query changed', 'Plan changed']
+        for change in changes:
+            table.rows.append([change['step'], change['title'], change['previous_time_ms'], change['time_ms'],
+                               change['regression'], change['query_changed'], change['plan_changed']])
+        print(table)
+        regressions = [change['step'] for change in changes if change['regression']]
+        if regressions:
+            logger.warning(f'--> Queries of steps {regressions} are at least {regression_ratio} times slower than in run {previous_run_id}.')
+        return changes
+
+
+    def __summarise(self, profile):
+        nodes = self.__nodes(profile['plan'])
+        slowest_nodes = sorted(nodes, key=lambda node: node['exclusive_time_ms'], reverse=True)[:top_nodes]
+        seq_scans = [node for node in nodes if node['node_type'] == 'Seq Scan' and node['rows_read'] >= big_table_rows]
+        estimate_errors = [
+            node for node in nodes
+            if max(node['actual_rows'], 1) / max(node['plan_rows'], 1) >= row_estimate_error_ratio
+            or max(node['plan_rows'], 1) / max(node['actual_rows'], 1) >= row_estimate_error_ratio
+        ]
+        return {
+            'step': profile['step'],
+            'title': profile['title'],
+            'wall_time_ms': profile['wall_time_ms'],
+            'execution_time_ms': profile['execution_time_ms'],
+            'slowest_nodes': slowest_nodes,
+            'seq_scans': seq_scans,
+            'estimate_errors': estimate_errors,
+        }
+
+
+    def __nodes(self, plan):
+        # flatten the plan tree, the exclusive time of a node is its total time minus the total time of its child nodes
+        nodes = []
+        plans = [plan]
+        while plans:
+            node = plans.pop()
+            children = node.get('Plans', [])
+            loops = node.get('Actual Loops', 1)
+            total_time = node.get('Actual Total Time', 0) * loops
+            children_time = sum(child.get('Actual Total Time', 0) * child.get('Actual Loops', 1) for child in children)
+            nodes.append({
+                'node': self.__node_name(node),
+                'node_type': node['Node Type'],
+                'exclusive_time_ms': round(max(total_time - children_time, 0), 3),
+                'actual_rows': node.get('Actual Rows', 0) * loops,
+                'plan_rows': node.get('Plan Rows', 0) * loops,
+                'rows_read': (node.get('Actual Rows', 0) + node.get('Rows Removed by Filter', 0)) * loops,
+                'shared_blocks_read': node.get('Shared Read Blocks', 0),
+            })
+            plans.extend(children)
+        return nodes
+
+
+    def __node_name(self, node):
+        name = node['Node Type']
+        if 'Relation Name' in node:
+            name += f" on {node['Relation Name']}"
+        if 'Index Name' in node:
+            name += f" using {node['Index Name']}"
+        return name
+
+
+    def __plan_shape(self, plan):
+        # node names in the order of the plan tree, used to find plans which have changed
+        shape = []
+        plans = [plan]
+        while plans:
+            node = plans.pop()
+            shape.append(self.__node_name(node))
+            plans.extend(reversed(node.get('Plans', [])))
+        return shape
+
+
+    def __load_run(self, run_id):
+        profiles = {}
+        for path in (self.folder / run_id).glob('step_*.json'):
+            with open(path, 'r') as file:
+                profile = json.load(file)
+            profiles[profile['step']] = profile
+        return profiles
+
+
+    def __print_summary(self, summary):
+        logger.info(f"\n--> Step {summary['step']} - {summary['title']}: wall time {summary['wall_time_ms']} ms, execution time {summary['execution_time_ms']} ms.")
+        table = BeautifulTable(maxwidth=200)
+        table.columns.header = ['Finding', 'Node', 'Time (ms)', 'Actual rows', 'Estimated rows', 'Blocks read']
+        for title, nodes in [('Slowest node', summary['slowest_nodes']), ('Seq scan on big table', summary['seq_scans']), ('Row estimate error', summary['estimate_errors'])]:
+            for node in nodes:
+                table.rows.append([title, node['node'], node['exclusive_time_ms'], node['actual_rows'], node['plan_rows'], node['shared_blocks_read']])
+        print(table)
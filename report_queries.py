@@ -0,0 +1,177 @@
+'''
+Catalog of the queries run by the programme on the output database (steps 36 - 44). The queries are also used by DatabaseSchema class
+to find which columns of the tables are used by the queries and need indexes.
+
+The queries of the sales (steps 38 - 41 and 43) read the sales_rollup table built when the orders are loaded (sales and quantity
+by year, month, store, store type, country and channel) instead of joining the whole orders_table with the dimension tables.
+The rollup includes all orders, so each query keeps only the orders with a matching row in the dimension tables it joined
+(has_product, has_store and has_date columns of the rollup).
+
+Variables:
+-------
+report_queries: list
+    List of dictionaries with the step number, the title, the key (columns which identify each row of the result, used by the unique
+    index of the materialized view of the query) and the SQL query of each step. Queries using PostgreSQL only syntax also have
+    offline_query, the same query for DuckDB used in the offline mode (see star_schema_snapshot).
+'''
+
+
+######### VARIABLES #########
+report_queries = [
+    {
+        'step': 36,
+        'title': 'No. of stores in each country',
+        'key': ['country'],
+        'query': '''
+            SELECT 
+                country_code AS country, 
+                COUNT(store_code) AS total_no_stores
+            FROM dim_store_details 
+            GROUP BY country
+            ORDER BY total_no_stores DESC;
+        ''',
+    },
+    {
+        'step': 37,
+        'title': 'Locations with the most stores',
+        'key': ['locality'],
+        'query': '''
+            SELECT locality, COUNT(locality) as total_no_stores
+            FROM dim_store_details
+            GROUP BY locality
+            ORDER BY total_no_stores DESC
+            LIMIT 7;
+        ''',
+    },
+    {
+        'step': 38,
+        'title': 'Which months produced the largest amount of sales',
+        'key': ['month'],
+        'query': '''
+            SELECT 
+                ROUND(SUM(total_sales), 2) AS total_sales,
+                month
+            FROM sales_rollup
+            WHERE has_product AND has_date
+            GROUP BY month
+            ORDER BY total_sales DESC
+            LIMIT 6
+        ''',
+    },
+    {
+        'step': 39,
+        'title': 'How many sales are coming from online',
+        'key': ['location'],
+        'query': '''
+            SELECT
+                SUM(number_of_sales)::bigint AS numbers_of_sales,
+                SUM(product_quantity)::bigint AS product_quantity_count,
+                channel AS location
+            FROM sales_rollup
+            WHERE has_store
+            GROUP BY location
+            ORDER BY location DESC
+        ''',
+    },
+    {
+        'step': 40,
+        'title': 'What percentage of sales come through each type of store',
+        'key': ['store_type'],
+        'query': '''
+            WITH total_sales_per_store_type AS (
+                SELECT
+                    store_type,
+                    ROUND(SUM(total_sales), 2) AS total_sales
+                FROM sales_rollup
+                WHERE has_product AND has_store
+                GROUP BY store_type
+            )
+            SELECT
+                store_type,
+                total_sales,
+                ROUND( 100 * total_sales / SUM(total_sales) OVER (), 2) AS "percentage_total(%)"
+            FROM total_sales_per_store_type
+            GROUP BY store_type, total_sales
+            ORDER BY total_sales DESC
+        ''',
+    },
+    {
+        'step': 41,
+        'title': 'Which month in each year produced the highest cost of sales',
+        'key': ['year', 'month'],
+        'query': '''
+            SELECT 
+                ROUND(SUM(total_sales), 2) AS total_sales,
+                year,
+                month
+            FROM sales_rollup
+            WHERE has_product AND has_date
+            GROUP BY year, month
+            ORDER BY total_sales DESC
+            LIMIT 10
+        ''',
+    },
+    {
+        'step': 42,
+        'title': 'What is our staff headcount',
+        # TODO: check if the query is correct as it returns different results than the expected
+        'key': ['country_code'],
+        'query': '''
+            SELECT
+                SUM(staff_numbers) as total_staff_numbers,
+                country_code
+            FROM
+                dim_store_details
+            GROUP BY country_code
+            ORDER BY total_staff_numbers DESC
+        ''',
+    },
+    {
+        'step': 43,
+        'title': 'Which German store type is selling the most',
+        'key': ['country_code', 'store_type'],
+        'query': '''
+            SELECT 
+                ROUND(SUM(total_sales), 2) AS total_sales,
+                store_type,
+                country_code
+            FROM sales_rollup
+            WHERE country_code = 'DE' AND has_product AND has_store
+            GROUP BY country_code, store_type
+            ORDER BY total_sales
+        ''',
+    },
+    {
+        'step': 44,
+        'title': 'How quickly is the company making sales',
+        'key': ['year'],
+        # the hours, minutes and seconds are taken from the average number of milliseconds (the hours are not limited to 24),
+        # so the query returns the same results on DuckDB in the offline mode
+        'query': '''
+            WITH sale_times AS (
+                SELECT 
+                    year,
+                    EXTRACT(EPOCH FROM LEAD(event_ts) OVER (ORDER BY event_ts) - event_ts) * 1000 AS time_difference_ms
+                FROM dim_date_times
+            ),
+            average_times AS (
+                SELECT 
+                    year,
+                    AVG(time_difference_ms) AS average_ms
+                FROM sale_times
+                GROUP BY year
+            )
+            SELECT 
+                year,
+                (
+                    ' "hours": ' || CAST(CAST(FLOOR(average_ms / 3600000) AS BIGINT) AS VARCHAR) || 
+                    ' "minutes": ' || CAST(CAST(FLOOR(average_ms / 60000) % 60 AS BIGINT) AS VARCHAR) || 
+                    ' "seconds": ' || CAST(CAST((average_ms % 60000) / 1000 AS DECIMAL(12, 6)) AS VARCHAR) || 
+                    ' "milliseconds": ' || CAST(CAST(average_ms % 60000 AS DECIMAL(15, 3)) AS VARCHAR)
+                ) AS actual_time_taken
+            FROM average_times
+            ORDER BY average_ms DESC
+            LIMIT 5;
+        ''',
+    },
+]
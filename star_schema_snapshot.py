@@ -0,0 +1,135 @@
+'''
+StarSchemaSnapshot class saves the cleaned tables of the star schema to Parquet files (one file for each table) when they are
+uploaded to the output database and runs the report queries on these files with DuckDB, so the reports can be created offline
+without the output database.
+
+The snapshot is saved when STAR_SCHEMA_SNAPSHOT=1 in .env file and the reports are run on the snapshot when REPORT_MODE=offline.
+Saving the snapshot needs pyarrow, running the queries needs duckdb (pip install pyarrow duckdb).
+Columns with numeric(precision, scale) type in table_schemas (e.g. total_sales of sales_rollup) are saved as Parquet decimals,
+so the sums in the offline reports are exact, the same as in the output database.
+The snapshot contains the tables as they are uploaded, changes made later in the output database (e.g. question marks removed
+from the card numbers) are not included.
+
+Methods:
+-------
+save(df, table_name)
+    Saves the table to the snapshot (replaces the previous file of the table).
+
+    Parameters:
+    ----------
+    df: DataFrame
+        Data of the table.
+    table_name: string
+        Name of the table.
+
+run_query(query)
+    Runs the query on the tables of the snapshot and returns the names of the columns and the rows of the result.
+
+    Parameters:
+    ----------
+    query: string
+        The SQL query.
+'''
+
+from decimal import Decimal
+import pandas as pd
+from pathlib import Path
+from pipeline_logging import get_logger
+import re
+import sys
+from table_schemas import table_schemas
+
+
+######### VARIABLES #########
+# logger of this module
+logger = get_logger(__name__)
+# Default folder where the Parquet files are saved
+default_snapshot_folder = './star_schema_snapshot'
+
+
+######### CLASS #########
+class StarSchemaSnapshot:
+    def __init__(self, folder=default_snapshot_folder):
+        self.folder = Path(folder)
+        self.__connection = None
+
+
+    def save(self, df, table_name):
+        '''
+        save(df, table_name)
+            Saves the table to the snapshot (replaces the previous file of the table).
+
+            Parameters:
+            ----------
+            df: DataFrame
+                Data of the table.
+            table_name: string
+                Name of the table.
+        '''
+        self.folder.mkdir(parents=True, exist_ok=True)
+        snapshot_path = self.folder / f'{table_name}.parquet'
+        # the file is replaced only when the new file is complete
+        temporary_path = snapshot_path.with_suffix('.parquet.tmp')
+        try:
+            import pyarrow
+            import pyarrow.parquet
+            table = pyarrow.Table.from_pandas(df, preserve_index=False)
+            for column, (precision, scale) in self.__decimal_columns(df, table_name).items():
+                # the values are rounded to the scale of the column, the same as in the output database
+                quantum = Decimal(1).scaleb(-scale)
+                values = [None if pd.isna(value) else Decimal(str(value)).quantize(quantum) for value in df[column]]
+                table = table.set_column(table.schema.get_field_index(column), column, pyarrow.array(values, type=pyarrow.decimal128(precision, scale)))
+            pyarrow.parquet.write_table(table, temporary_path)
+            temporary_path.replace(snapshot_path)
+        except Exception as e:
+            temporary_path.unlink(missing_ok=True)
+            logger.error(f'Error occurred when saving {table_name} to the snapshot: {e}')
+            sys.exit()
+
+        logger.info(f'--> {table_name} saved to the snapshot: {snapshot_path}')
+
+
+    def run_query(self, query):
+        '''
+        run_query(query)
+            Runs the query on the tables of the snapshot and returns the names of the columns and the rows of the result.
+
+            Parameters:
+            ----------
+            query: string
+                The SQL query.
+        '''
+        result = self.__connect().execute(query)
+        columns = [column[0] for column in result.description]
+        return columns, result.fetchall()
+
+
+    def __decimal_columns(self, df, table_name):
+        # columns of the table with numeric(precision, scale) type in table_schemas and their precision and scale
+        decimal_columns = {}
+        for column, data_type in table_schemas.get(table_name, {}).items():
+            match = re.fullmatch(r'numeric\((\d+),\s*(\d+)\)', data_type.lower())
+            if match and column in df.columns:
+                decimal_columns[column] = (int(match.group(1)), int(match.group(2)))
+        return decimal_columns
+
+
+    def __connect(self):
+        # in-process DuckDB database with a view reading each Parquet file, so the queries use the names of the tables
+        if self.__connection is None:
+            try:
+                import duckdb
+            except ImportError:
+                logger.error('Error, duckdb is needed to run the queries on the snapshot (pip install duckdb).')
+                sys.exit()
+
+            snapshot_paths = sorted(self.folder.glob('*.parquet'))
+            if not snapshot_paths:
+                logger.error(f'Error, there are no tables in the snapshot folder {self.folder}. Run the programme with STAR_SCHEMA_SNAPSHOT=1 first.')
+                sys.exit()
+
+            self.__connection = duckdb.connect()
+            for snapshot_path in snapshot_paths:
+                self.__connection.execute(f"CREATE VIEW {snapshot_path.stem} AS SELECT * FROM read_parquet('{snapshot_path.as_posix()}')")
+            logger.info(f'--> Snapshot tables: {[snapshot_path.stem for snapshot_path in snapshot_paths]}')
+        return self.__connection
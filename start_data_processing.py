@@ -16,14 +16,94 @@ from data_extraction import DataExtractor
 from database_utils import DatabaseConnector
 from database_schema import DatabaseSchema
 from database_query import DatabaseQuery
+from dotenv import load_dotenv
+from memory_budget import MemoryBudget
 import os
+from pipeline_logging import configure_logging, get_logger
+from pipeline_metrics import PipelineMetrics
+from query_cache import QueryCache
+from query_profiler import QueryProfiler
+from report_queries import report_queries
+from star_schema_snapshot import StarSchemaSnapshot
 import subprocess
+import sys
+from table_schemas import foreign_keys, indexed_columns, partitioning_options, primary_keys
+
+
+#################### VARIABLES: ####################
+divider_symbol_count = 80 # length of a divider line when priting out output
+divider_line = '#' * divider_symbol_count # symbol used as a divider line
+# list of steps
+steps = [
+    'STEP 1: Initialisation',
+    'STEP 2: Reading the list of tables from the Source DB',
+    'STEP 3: Retriving Users data from the legacy_users source db table',
+    'STEP 4: Cleaning Users data',
+    'STEP 5: Uploading Users data to the Output database',
+    'STEP 6: Retriving Card Details data from the PDF file',
+    'STEP 7: Cleaning Card Details data',
+    'STEP 8: Uploading Card Details data to the Output database',
+    'STEP 9: Retriving Stores data from API',
+    'STEP 10: Cleaning Stores data',
+    'STEP 11: Uploading Stores data to the Output database',
+    'STEP 12: Retriving and cleaning Products data from CSV file',
+    'STEP 13: Checking the primary keys of Products data',
+    'STEP 14: Uploading Products data to the Output database',
+    'STEP 15: Retriving and cleaning Date Events data from JSON file',
+    'STEP 16: Checking the primary keys of Date Events data',
+    'STEP 17: Uploading Date Events data to the Output database',
+    'STEP 18: Retriving Orders data from orders_table Source db table',
+    'STEP 19: Cleaning Orders data',
+    'STEP 20: Uploading Orders data and the sales rollup to the Output database',
+    'SUCCESS: All data has been successfully extracted, cleaned and uploaded to the DB',
+    '############################     DATABASE SCHEMA    ############################',
+    'STEP 23: Initialisation',
+    'STEP 24: Reading the list of tables from the Output DB',
+    'STEP 25: Checking table column types: orders_table',
+    'STEP 26: Checking table column types: dim_users',
+    'STEP 27: Checking table column types: dim_store_details',
+    'STEP 28: Checking table column types: dim_products',
+    'STEP 29: Checking table column types and indexes: dim_date_times',
+    'STEP 30: Checking table column types: dim_card_details',
+    'STEP 31: Adding Primary Keys to the dimensio tables',
+    'STEP 32: Adding Foreign Keys to the fact table and indexes to the sales rollup',
+    'SUCCESS: All alterations to the database schema have been successfully completed',
+    '############################     DATABASE QUERIES    ############################',
+    'STEP 35: Initialisation of the report queries',
+    'STEP 36: No. of stores in each country',
+    'STEP 37: Locations with the most stores',
+    'STEP 38: Which months produced the largest amount of sales',
+    'STEP 39: How many sales are coming from online',
+    'STEP 40: What percentage of sales come through each type of store',
+    'STEP 41: Which month in each year produced the highest cost of sales',
+    'STEP 42: What is our staff headcount',
+    'STEP 43: Which German store type is selling the most',
+    'STEP 44: How quickly is the company making sales',
+    'SUCCESS: All database queries have been successfully completed'
+]
+
+# initial step number
+step_number = 0 
+
+# folder where DataFrames are spilled when the memory budget (MEMORY_BUDGET_MB in .env file) is exceeded
+spill_folder = './temp_files/spill'
+# file where the time and memory used by each step is saved (one JSON line per step)
+metrics_file = './pipeline_metrics.jsonl'
+# load environmental variables from .env file
+load_dotenv()
+# set up the log level (LOG_LEVEL or QUIET in .env file) and the logger of this module
+configure_logging()
+logger = get_logger(__name__)
+# records time and memory used by each step, tracemalloc is used only when TRACEMALLOC_METRICS=1 (it slows down the programme)
+metrics = PipelineMetrics(metrics_file, use_tracemalloc=os.getenv('TRACEMALLOC_METRICS') == '1')
 
 
 #################### FUNCTIONS: ####################
 # function to print out the step number value 
 def print_step_number(step_no):
-    print(f'\n\n{divider_line}\n{steps[step_no]}\n{divider_line}')
+    # finish measuring the previous step and start measuring the new one
+    metrics.start_step(steps[step_no])
+    logger.info(f'\n\n{divider_line}\n{steps[step_no]}\n{divider_line}')
     global step_number
     step_number += 1 # increase the step number
 
@@ -41,17 +121,34 @@ def start_data_processing():
     print_step_number(step_number)
 
     # initialise all classes
-    db_connector = DatabaseConnector()
-    print(f'\n--> DatabaseConnector class has been initiated.')
+    # the uploaded tables are also saved to a Parquet snapshot when STAR_SCHEMA_SNAPSHOT=1
+    db_connector = DatabaseConnector(StarSchemaSnapshot() if os.getenv('STAR_SCHEMA_SNAPSHOT') == '1' else None)
+    logger.info(f'\n--> DatabaseConnector class has been initiated.')
     data_extractor = DataExtractor()
-    print(f'\n--> DataExtractor class has been initiated.')
+    logger.info(f'\n--> DataExtractor class has been initiated.')
     data_cleaning = DataCleaning()
-    print(f'\n--> DataCleaning class has been initiated.')
-
-    # create the source DB engine or throw an error
-    source_db_engine = db_connector.init_db_engine('SOURCE')
+    logger.info(f'\n--> DataCleaning class has been initiated.')
+    # DataFrames are passed between the steps through the memory budget, so each of them is released when no longer needed
+    frames = MemoryBudget(os.getenv('MEMORY_BUDGET_MB', 0), spill_folder)
+    logger.info(f'\n--> MemoryBudget class has been initiated.')
+    # orders_table can be partitioned by the year of the order or by the hash of the store code (ORDERS_PARTITIONING in .env file)
+    orders_partitioning_name = os.getenv('ORDERS_PARTITIONING', 'none')
+    if orders_partitioning_name != 'none' and orders_partitioning_name not in partitioning_options:
+        logger.error(f"Error, incorrect orders partitioning: {orders_partitioning_name}. Allowed values: {['none'] + list(partitioning_options)}")
+        sys.exit()
+    orders_partitioning = partitioning_options.get(orders_partitioning_name)
+    # what to do with duplicated primary keys found before the upload: report, first, last or quarantine (DUPLICATE_KEYS in .env file)
+    duplicate_keys_mode = os.getenv('DUPLICATE_KEYS', 'report')
+    # what to do with orders with foreign keys missing from the dimension tables: report or quarantine (ORPHAN_KEYS in .env file)
+    orphan_keys_mode = os.getenv('ORPHAN_KEYS', 'report')
+
+    # create the source DB engine or throw an error (not needed when the data is replayed from the fixture bundle)
+    source_db_engine = None if data_extractor.extraction_mode == 'replay' else db_connector.init_db_engine('SOURCE')
     # create the output DB engine or throw an error
     output_db_engine = db_connector.init_db_engine('OUTPUT')
+    # the tables are created again by the load, so the materialized views of the report queries are dropped
+    # and created again by the report queries (they are only refreshed when the reports are run without a load)
+    DatabaseQuery().drop_report_views(output_db_engine)
 
     ####### STEP 2 #######
     print_step_number(step_number)
@@ -61,7 +158,8 @@ def start_data_processing():
     ####### STEP 3 #######
     print_step_number(step_number)
     # read data from the legacy users table
-    users_data = data_extractor.read_rds_table(source_db_engine, 'legacy_users')
+    frames.put('users_data', data_extractor.read_rds_table(source_db_engine, 'legacy_users'))
+    metrics.record(rows_out=frames.rows('users_data'))
 
     ####### STEP 4 #######
     print_step_number(step_number)
@@ -70,121 +168,199 @@ def start_data_processing():
     date_columns = ['date_of_birth', 'join_date']
     number_columns=[]
     integer_columns=[]
-    output_users_data = data_cleaning.clean_user_data(users_data, string_columns, date_columns, number_columns, integer_columns)
+    metrics.record(rows_in=frames.rows('users_data'))
+    cleaned_users_data = data_cleaning.clean_user_data(frames.pop('users_data'), string_columns, date_columns, number_columns, integer_columns)
+    # check the primary keys before the upload
+    frames.put('output_users_data', data_cleaning.remove_duplicate_keys(cleaned_users_data, primary_keys['dim_users'], 'dim_users', duplicate_keys_mode))
+    del cleaned_users_data
+    metrics.record(rows_out=frames.rows('output_users_data'))
 
     ####### STEP 5 #######
     print_step_number(step_number)
     # upload data to the new database
-    db_connector.upload_to_db(output_db_engine, output_users_data, 'dim_users')
+    metrics.record(rows_in=frames.rows('output_users_data'))
+    # keep the keys to check the foreign keys of the orders before the upload
+    frames.put('dim_users_keys', frames.get('output_users_data')[[primary_keys['dim_users']]])
+    db_connector.upload_to_db(output_db_engine, frames.pop('output_users_data'), 'dim_users')
 
 
     ####### STEP 6 #######
     print_step_number(step_number)
-    orders_data = data_extractor.read_rds_table(source_db_engine, 'orders_table')
-
-    ####### STEP 7 #######
-    print_step_number(step_number)
-    string_columns = ['date_uuid', 'user_uuid', 'card_number', 'store_code', 'product_code']
-    date_columns = []
-    number_columns = []
-    integer_columns = []
-    cleaned_orders_data = data_cleaning.clean_user_data(orders_data, string_columns, date_columns, number_columns, integer_columns)
-    # remove unwanted columns
-    columns_to_remove = ['first_name', 'last_name']
-    output_orders_data = data_cleaning.clean_orders_data(cleaned_orders_data, columns_to_remove)
-
-    ####### STEP 8 #######
-    print_step_number(step_number)
-    # Uploading data to the database
-    db_connector.upload_to_db(output_db_engine, output_orders_data, 'orders_table')
-
-    ####### CLEAN UP #######
-    # close source db connection as it's not longer needed
-    source_db_engine.close()
-
-
-    ####### STEP 9 #######
-    print_step_number(step_number)
     # retrive data from PDF file
-    pdf_data = data_extractor.extract_from_remote_location('CARD_DETAILS_DATA', 'pdf')
+    frames.put('pdf_data', data_extractor.extract_from_remote_location('CARD_DETAILS_DATA', 'pdf'))
+    metrics.record(rows_out=frames.rows('pdf_data'), bytes_transferred=data_extractor.pop_bytes_transferred())
 
-    ####### STEP 10 #######
+    ####### STEP 7 #######
     print_step_number(step_number)
     # clean data
     string_columns=['card_number', 'expiry_date', 'card_provider']
     date_columns = ['date_payment_confirmed']
     number_columns = []
     integer_columns = []
-    cleaned_pdf_data = data_cleaning.clean_user_data(pdf_data, string_columns, date_columns, number_columns, integer_columns)
+    metrics.record(rows_in=frames.rows('pdf_data'))
+    cleaned_pdf_data = data_cleaning.clean_user_data(frames.pop('pdf_data'), string_columns, date_columns, number_columns, integer_columns)
     # Remove question mark from the card number column
-    output_pdf_data = data_cleaning.remove_question_mark_from_column(cleaned_pdf_data, 'card_number')
+    cleaned_pdf_data = data_cleaning.remove_question_mark_from_column(cleaned_pdf_data, 'card_number')
+    # check the primary keys before the upload
+    frames.put('output_pdf_data', data_cleaning.remove_duplicate_keys(cleaned_pdf_data, primary_keys['dim_card_details'], 'dim_card_details', duplicate_keys_mode))
+    del cleaned_pdf_data
+    metrics.record(rows_out=frames.rows('output_pdf_data'))
     
-    ####### STEP 11 #######
+    ####### STEP 8 #######
     print_step_number(step_number)
     # upload data to the new database
-    db_connector.upload_to_db(output_db_engine, output_pdf_data, 'dim_card_details')
+    metrics.record(rows_in=frames.rows('output_pdf_data'))
+    # keep the keys to check the foreign keys of the orders before the upload
+    frames.put('dim_card_details_keys', frames.get('output_pdf_data')[[primary_keys['dim_card_details']]])
+    db_connector.upload_to_db(output_db_engine, frames.pop('output_pdf_data'), 'dim_card_details')
 
 
-    ####### STEP 12 #######
+    ####### STEP 9 #######
     print_step_number(step_number)
     # Retriving data from API',
-    api_data = data_extractor.extract_from_remote_location(['x_api_key', 'retrive_store_api', 'number_of_stores_api'], 'api')
+    frames.put('api_data', data_extractor.extract_from_remote_location(['x_api_key', 'retrive_store_api', 'number_of_stores_api'], 'api'))
+    metrics.record(rows_out=frames.rows('api_data'), bytes_transferred=data_extractor.pop_bytes_transferred())
 
-    ####### STEP 13 #######
+    ####### STEP 10 #######
     print_step_number(step_number)
     # Cleaning data
     string_columns=['address', 'locality', 'store_code', 'store_type', 'country_code',	'continent']
     date_columns = ['opening_date']
     number_columns = ['longitude', 'lat', 'staff_numbers', 'latitude']
     integer_columns = ['staff_numbers']
-    output_api_data = data_cleaning.clean_user_data(api_data, string_columns, date_columns, number_columns, integer_columns)
+    metrics.record(rows_in=frames.rows('api_data'))
+    cleaned_api_data = data_cleaning.clean_user_data(frames.pop('api_data'), string_columns, date_columns, number_columns, integer_columns)
+    # check the primary keys before the upload
+    frames.put('output_api_data', data_cleaning.remove_duplicate_keys(cleaned_api_data, primary_keys['dim_store_details'], 'dim_store_details', duplicate_keys_mode))
+    del cleaned_api_data
+    metrics.record(rows_out=frames.rows('output_api_data'))
+
+    ####### STEP 11 #######
+    print_step_number(step_number)
+    # Uploading data to the database
+    metrics.record(rows_in=frames.rows('output_api_data'))
+    # keep the keys to check the foreign keys of the orders before the upload
+    frames.put('dim_store_details_keys', frames.get('output_api_data')[[primary_keys['dim_store_details']]])
+    # keep the store type and country of each store to build the sales rollup
+    frames.put('rollup_stores', frames.get('output_api_data')[['store_code', 'store_type', 'country_code']])
+    db_connector.upload_to_db(output_db_engine, frames.pop('output_api_data'), 'dim_store_details')
+
+
+    ####### STEP 12 #######
+    print_step_number(step_number)
+    # Retriving data from S3 (parsed and cleaned chunk by chunk while being downloaded, so the raw file is never held in memory)
+    string_columns=['product_name', 'product_price', 'category', 'EAN', 'uuid', 'removed', 'product_code', 'weight']
+    date_columns = ['date_added']
+    number_columns = []
+    integer_columns = []
+    def clean_products_chunk(chunk):
+        # Converting data types, extracting product_price and weight
+        # blank columns are kept in each chunk, so all chunks have the same columns
+        cleaned_chunk = data_cleaning.clean_user_data(chunk, string_columns, date_columns, number_columns, integer_columns, drop_blank_columns=False)
+        return data_cleaning.clean_products_data(cleaned_chunk)
+    cleaned_csv_data = data_extractor.extract_from_remote_location('PRODUCTS_DATA', 'csv', streaming=True, chunk_processor=clean_products_chunk)
+    frames.put('cleaned_csv_data', data_cleaning.remove_blank_columns(cleaned_csv_data))
+    del cleaned_csv_data
+    metrics.record(rows_out=frames.rows('cleaned_csv_data'), bytes_transferred=data_extractor.pop_bytes_transferred())
+
+    ####### STEP 13 #######
+    print_step_number(step_number)
+    metrics.record(rows_in=frames.rows('cleaned_csv_data'))
+    # check the primary keys before the upload
+    frames.put('output_csv_data', data_cleaning.remove_duplicate_keys(frames.pop('cleaned_csv_data'), primary_keys['dim_products'], 'dim_products', duplicate_keys_mode))
+    metrics.record(rows_out=frames.rows('output_csv_data'))
 
     ####### STEP 14 #######
     print_step_number(step_number)
     # Uploading data to the database
-    db_connector.upload_to_db(output_db_engine, output_api_data, 'dim_store_details')
+    metrics.record(rows_in=frames.rows('output_csv_data'))
+    # keep the keys to check the foreign keys of the orders before the upload
+    frames.put('dim_products_keys', frames.get('output_csv_data')[[primary_keys['dim_products']]])
+    # keep the price of each product to build the sales rollup
+    frames.put('rollup_products', frames.get('output_csv_data')[['product_code', 'product_price']])
+    db_connector.upload_to_db(output_db_engine, frames.pop('output_csv_data'), 'dim_products')
 
 
     ####### STEP 15 #######
     print_step_number(step_number)
-    # Retriving data from S3',
-    csv_data = data_extractor.extract_from_remote_location('PRODUCTS_DATA', 'csv')
+    # Retriving data from S3 / json file (the file is an object of columns, so it is read column by column and then cleaned chunk by chunk)
+    string_columns = ['time_period', 'date_uuid']
+    date_columns = ['timestamp']
+    number_columns=['month', 'year', 'day']
+    integer_columns=['month', 'year', 'day']
+    json_data_cleaning = DataCleaning()
+    def clean_date_events_chunk(chunk):
+        # blank columns are kept in each chunk, so all chunks have the same columns
+        cleaned_chunk = json_data_cleaning.clean_user_data(chunk, string_columns, date_columns, number_columns, integer_columns, drop_blank_columns=False)
+        # event_ts is used by the query of step 44 to sort the events
+        return json_data_cleaning.add_event_timestamps(cleaned_chunk)
+    cleaned_date_events_data = data_extractor.extract_from_remote_location('DATE_EVENTS_DATA', 'json', streaming=True, chunk_processor=clean_date_events_chunk)
+    frames.put('cleaned_date_events_data', json_data_cleaning.remove_blank_columns(cleaned_date_events_data))
+    del cleaned_date_events_data
+    metrics.record(rows_out=frames.rows('cleaned_date_events_data'), bytes_transferred=data_extractor.pop_bytes_transferred())
 
     ####### STEP 16 #######
     print_step_number(step_number)
-    # Converting data types
-    string_columns=['product_name', 'product_price', 'category', 'EAN', 'uuid', 'removed', 'product_code', 'weight']
-    date_columns = ['date_added']
-    number_columns = []
-    integer_columns = []
-    output_csv_data = data_cleaning.clean_user_data(csv_data, string_columns, date_columns, number_columns, integer_columns)
-    # Extracting product_price and weight
-    output_csv_data = data_cleaning.clean_products_data(output_csv_data)
+    metrics.record(rows_in=frames.rows('cleaned_date_events_data'))
+    # check the primary keys before the upload
+    frames.put('output_date_events_data', json_data_cleaning.remove_duplicate_keys(frames.pop('cleaned_date_events_data'), primary_keys['dim_date_times'], 'dim_date_times', duplicate_keys_mode))
+    metrics.record(rows_out=frames.rows('output_date_events_data'))
 
     ####### STEP 17 #######
     print_step_number(step_number)
     # Uploading data to the database
-    db_connector.upload_to_db(output_db_engine, output_csv_data, 'dim_products')
+    metrics.record(rows_in=frames.rows('output_date_events_data'))
+    if orders_partitioning and orders_partitioning['column'] == 'order_year':
+        # keep the year of each date to partition the orders by year
+        frames.put('date_years', frames.get('output_date_events_data')[['date_uuid', 'year']])
+    # keep the keys to check the foreign keys of the orders before the upload
+    frames.put('dim_date_times_keys', frames.get('output_date_events_data')[[primary_keys['dim_date_times']]])
+    # keep the year and month of each date to build the sales rollup
+    frames.put('rollup_dates', frames.get('output_date_events_data')[['date_uuid', 'year', 'month']])
+    db_connector.upload_to_db(output_db_engine, frames.pop('output_date_events_data'), 'dim_date_times')
 
 
     ####### STEP 18 #######
     print_step_number(step_number)
-    # Retriving data from S3 / json file',
-    date_events_data = data_extractor.extract_from_remote_location('DATE_EVENTS_DATA', 'json')
+    # orders are loaded after all dimension tables
+    frames.put('orders_data', data_extractor.read_rds_table(source_db_engine, 'orders_table'))
+    metrics.record(rows_out=frames.rows('orders_data'))
+
+    ####### CLEAN UP #######
+    # close source db connection as it's not longer needed
+    if source_db_engine:
+        source_db_engine.close()
 
     ####### STEP 19 #######
     print_step_number(step_number)
-    string_columns = ['time_period', 'date_uuid']
-    date_columns = ['timestamp']
-    number_columns=['month', 'year', 'day']
-    integer_columns=['month', 'year', 'day']
-    json_data_cleaning = DataCleaning()
-    output_date_events_data = json_data_cleaning.clean_user_data(date_events_data, string_columns, date_columns, number_columns, integer_columns)
+    string_columns = ['date_uuid', 'user_uuid', 'card_number', 'store_code', 'product_code']
+    date_columns = []
+    number_columns = []
+    integer_columns = []
+    metrics.record(rows_in=frames.rows('orders_data'))
+    cleaned_orders_data = data_cleaning.clean_user_data(frames.pop('orders_data'), string_columns, date_columns, number_columns, integer_columns)
+    # remove unwanted columns
+    columns_to_remove = ['first_name', 'last_name']
+    frames.put('output_orders_data', data_cleaning.clean_orders_data(cleaned_orders_data, columns_to_remove))
+    del cleaned_orders_data
+    if orders_partitioning and orders_partitioning['column'] == 'order_year':
+        # add the year of the order used as the partition key
+        frames.put('output_orders_data', data_cleaning.add_order_year(frames.pop('output_orders_data'), frames.pop('date_years')))
+    # check the foreign keys before the upload
+    dimension_keys = {foreign_key: frames.pop(f'{foreign_table}_keys')[foreign_key] for foreign_table, foreign_key in foreign_keys.items()}
+    frames.put('output_orders_data', data_cleaning.remove_orphan_keys(frames.pop('output_orders_data'), dimension_keys, 'orders_table', orphan_keys_mode))
+    del dimension_keys
+    metrics.record(rows_out=frames.rows('output_orders_data'))
 
     ####### STEP 20 #######
     print_step_number(step_number)
     # Uploading data to the database
-    db_connector.upload_to_db(output_db_engine, output_date_events_data, 'dim_date_times')
+    metrics.record(rows_in=frames.rows('output_orders_data'))
+    # the report queries read the sales from the rollup, which is much smaller than orders_table
+    sales_rollup = data_cleaning.build_sales_rollup(frames.get('output_orders_data'), frames.pop('rollup_products'), frames.pop('rollup_stores'), frames.pop('rollup_dates'))
+    db_connector.upload_to_db(output_db_engine, frames.pop('output_orders_data'), 'orders_table', orders_partitioning)
+    db_connector.upload_to_db(output_db_engine, sales_rollup, 'sales_rollup')
+    del sales_rollup
 
     ####### CLEAN UP #######
     # close connection when all data uploaded
@@ -205,12 +381,13 @@ def start_database_schema_update():
     print_step_number(step_number)
     
     # initialise all classes
+    # no tables are uploaded by the schema update, so the snapshot is not needed
     db_connector = DatabaseConnector()
-    print(f'\n--> DatabaseConnector class has been initiated.')
+    logger.info(f'\n--> DatabaseConnector class has been initiated.')
     data_extractor = DataExtractor()
-    print(f'\n--> DataExtractor class has been initiated.')
-    database_schema = DatabaseSchema()
-    print(f'\n--> DatabaseSchema class has been initiated.')
+    logger.info(f'\n--> DataExtractor class has been initiated.')
+    database_schema = DatabaseSchema(low_lock=os.getenv('LOW_LOCK_SCHEMA_UPDATE') == '1')
+    logger.info(f'\n--> DatabaseSchema class has been initiated.')
 
     # create the output DB engine or throw an error
     output_db_engine = db_connector.init_db_engine('OUTPUT')
@@ -222,126 +399,54 @@ def start_database_schema_update():
 
     ####### STEP 25 #######
     print_step_number(step_number)
-    table_name = 'orders_table'
-    columns_and_types = {
-        'date_uuid': 'uuid',
-        'user_uuid': 'uuid',
-        'card_number': 'varchar',
-        'store_code': 'varchar',
-        'product_code': 'varchar',
-        'product_quantity': 'smallint', 
-    }
-    # update column types for the orders_table
-    database_schema.alter_rds_table_column_types(output_db_engine, table_name, columns_and_types)
+    # the tables are created with their final column types when uploaded (see table_schemas), so the types are only displayed
+    database_schema.display_column_types(output_db_engine, 'orders_table')
 
 
     ####### STEP 26 #######
     print_step_number(step_number)
-    table_name = 'dim_users'
-    columns_and_types = {
-        'first_name': 'varchar(255)',
-        'last_name': 'varchar(255)',
-        'date_of_birth': 'date',
-        'country_code': 'varchar',
-        'user_uuid': 'uuid',
-        'join_date': 'date',
-    }
-    # update column types for the orders_table
-    database_schema.alter_rds_table_column_types(output_db_engine, table_name, columns_and_types)
+    database_schema.display_column_types(output_db_engine, 'dim_users')
 
 
     ####### STEP 27 #######
     print_step_number(step_number)
-    table_name = 'dim_store_details'
-    columns_and_types = {
-        'longitude': 'float',
-        'locality': 'varchar(255)',
-        'store_code': 'varchar',
-        'staff_numbers': 'smallint',
-        'opening_date': 'date',
-        'store_type': 'varchar(255)',
-        'latitude': 'float',
-        'country_code': 'varchar',
-        'continent': 'varchar(255)',
-    }
-    # update column types for the orders_table
-    database_schema.alter_rds_table_column_types(output_db_engine, table_name, columns_and_types)
+    database_schema.display_column_types(output_db_engine, 'dim_store_details')
     
     
     ####### STEP 28 #######
     print_step_number(step_number)
-    table_name = 'dim_products'
-    # create a new column for the weight class
-    database_schema.create_category_column(output_db_engine, table_name, 'weight_class')
-    # create a new column for the availability
-    database_schema.create_availability_column(output_db_engine, table_name, 'still_available')
-    columns_and_types = {
-        'product_price': 'float',
-        'weight': 'float',
-        'EAN': 'varchar',
-        'product_code': 'varchar',
-        'date_added': 'date',
-        'uuid': 'uuid',
-        'still_available': 'boolean',
-        'weight_class': 'varchar',
-    }
-    # update column types for the orders_table
-    database_schema.alter_rds_table_column_types(output_db_engine, table_name, columns_and_types)
+    # weight_class and still_available columns are added when the data is cleaned
+    database_schema.display_column_types(output_db_engine, 'dim_products')
     
     
     ####### STEP 29 #######
     print_step_number(step_number)
-    table_name = 'dim_date_times'
-    columns_and_types = {
-        'month': 'smallint',  # TODO: Milestone 3, task 6, asks to change the column type to 'varchar'. If needed then change the column type when created.
-        'year': 'smallint', # TODO: Milestone 3, task 6, asks to change the column type to 'varchar'. If needed then change the column type when created.
-        'day': 'smallint', # TODO: Milestone 3, task 6, asks to change the column type to 'varchar'. If needed then change the column type when created.
-        'time_period': 'varchar',
-        'date_uuid': 'uuid',
-    }
-    # update column types for the orders_table
-    database_schema.alter_rds_table_column_types(output_db_engine, table_name, columns_and_types)
+    database_schema.display_column_types(output_db_engine, 'dim_date_times')
+    # index the event timestamps used by the query of step 44
+    database_schema.add_indexes(output_db_engine, 'dim_date_times', indexed_columns['dim_date_times'], report_queries)
     
     
     ####### STEP 30 #######
     print_step_number(step_number)
-    table_name = 'dim_card_details'
-    columns_and_types = {
-        'card_number': 'varchar',
-        'expiry_date': 'varchar',
-        'date_payment_confirmed': 'date',
-    }
-    # update column types for the orders_table
-    database_schema.alter_rds_table_column_types(output_db_engine, table_name, columns_and_types)
+    database_schema.display_column_types(output_db_engine, 'dim_card_details')
     
     
     ####### STEP 31 #######
     print_step_number(step_number)
-    tables_and_keys = {
-        'dim_users': 'user_uuid',
-        'dim_store_details': 'store_code',
-        'dim_products': 'product_code',
-        'dim_date_times': 'date_uuid',
-        'dim_card_details': 'card_number',
-    }
     # update tables to have primary keys
-    database_schema.add_primary_keys(output_db_engine, tables_and_keys)
+    database_schema.add_primary_keys(output_db_engine, primary_keys)
    
     
     ####### STEP 32 #######
     print_step_number(step_number)
     table_name = 'orders_table'
-    foreign_keys = {
-        'dim_users': 'user_uuid',
-        'dim_store_details': 'store_code',
-        'dim_products': 'product_code',
-        'dim_date_times': 'date_uuid',
-        'dim_card_details': 'card_number',
-    }
     # remove question mark from the card details
     database_schema.remove_question_mark_from_dim_card_details(output_db_engine)
     # update tables to have primary keys
     database_schema.add_foreign_keys(output_db_engine, table_name, foreign_keys)
+    # no report query reads orders_table, the sales queries (steps 38 - 41 and 43) read sales_rollup, so only its filter (country code of step 43)
+    # is indexed, the time of each query using a new index is reported before and after the index is created
+    database_schema.add_indexes(output_db_engine, 'sales_rollup', indexed_columns['sales_rollup'], report_queries)
     
     ####### STEP 33 #######
     print_step_number(step_number)
@@ -357,248 +462,75 @@ def start_database_queries():
     ####### STEP 35 #######
     print_step_number(step_number)
     
+    if os.getenv('REPORT_MODE') == 'offline':
+        # run the report queries on the Parquet snapshot of the star schema, the output database is not used
+        start_offline_queries()
+        return
+    
     # initialise all classes
     db_connector = DatabaseConnector()
-    print(f'\n--> DatabaseConnector class has been initiated.')
-    database_query = DatabaseQuery()
-    print(f'\n--> DatabaseSchema class has been initiated.')
+    logger.info(f'\n--> DatabaseConnector class has been initiated.')
+    # results of the queries are cached locally when QUERY_CACHE=1
+    query_cache = QueryCache(os.getenv('QUERY_CACHE_MB', 100)) if os.getenv('QUERY_CACHE') == '1' else None
+    # plans of the report queries are profiled when QUERY_PROFILE=1
+    query_profiler = QueryProfiler() if os.getenv('QUERY_PROFILE') == '1' else None
+    database_query = DatabaseQuery(query_cache, query_profiler)
+    logger.info(f'\n--> DatabaseQuery class has been initiated.')
 
     # create the output DB engine or throw an error
     db_engine = db_connector.init_db_engine('OUTPUT')
 
-    ####### STEP 36 #######
-    print_step_number(step_number)
-    # No. of stores in each country
-    query = '''
-        SELECT 
-            country_code AS country, 
-            COUNT(store_code) AS total_no_stores
-        FROM dim_store_details 
-        GROUP BY country
-        ORDER BY total_no_stores DESC;
-    '''
-    database_query.query_database(db_engine, query)
-
-    ####### STEP 37 #######
-    print_step_number(step_number)
-    # locations with the most stores
-    query = '''
-        SELECT locality, COUNT(locality) as total_no_stores
-        FROM dim_store_details
-        GROUP BY locality
-        ORDER BY total_no_stores DESC
-        LIMIT 7;
-    '''
-    database_query.query_database(db_engine, query)
-    
-    
-    ####### STEP 38 #######
-    print_step_number(step_number)
-    query = '''
-        SELECT 
-            ROUND(SUM(orders_table.product_quantity * CAST(dim_products.product_price as numeric)), 2) AS total_sales,
-            dim_date_times.month
-        FROM orders_table
-        INNER JOIN dim_products
-        ON dim_products.product_code = orders_table.product_code
-        INNER JOIN dim_date_times
-        ON dim_date_times.date_uuid = orders_table.date_uuid
-        GROUP BY dim_date_times.month
-        ORDER BY total_sales DESC
-        LIMIT 6	
-    '''
-    database_query.query_database(db_engine, query)
-    
-    
-    ####### STEP 39 #######
-    print_step_number(step_number)
-    query = '''
-        SELECT
-            COUNT(o.date_uuid) AS numbers_of_sales,
-            SUM(o.product_quantity) AS product_quantity_count,
-            CASE
-                WHEN s.store_type IN ('Web Portal') THEN 'Web'
-                ELSE 'Offline'
-            END AS location
-        FROM orders_table as o
-        INNER JOIN dim_store_details as s
-        ON s.store_code = o.store_code
-        GROUP BY location
-        ORDER BY location DESC
-    '''
-    database_query.query_database(db_engine, query)
-    
-    
-    ####### STEP 40 #######
-    print_step_number(step_number)
-    query = '''
-        WITH total_sales_per_store_type AS (
-            SELECT
-                s.store_type,
-                ROUND(SUM(o.product_quantity * CAST(p.product_price as numeric)), 2) AS total_sales
-            FROM orders_table as o
-            INNER JOIN dim_products as p
-            ON p.product_code = o.product_code
-            INNER JOIN dim_store_details as s
-            ON s.store_code = o.store_code
-            GROUP BY s.store_type
-        )
-        SELECT
-            store_type,
-            total_sales,
-            ROUND( 100 * total_sales / SUM(total_sales) OVER (), 2) AS "percentage_total(%)"
-        FROM total_sales_per_store_type
-        GROUP BY store_type, total_sales
-        ORDER BY total_sales DESC
-    '''
-    database_query.query_database(db_engine, query)
-    
-    
-    ####### STEP 41 #######
-    print_step_number(step_number)
-    query = '''
-        SELECT 
-            ROUND(SUM(o.product_quantity * CAST(p.product_price as numeric)), 2) AS total_sales,
-            t.year,
-            t.month
-        FROM orders_table as o
-        INNER JOIN dim_products as p
-        ON p.product_code = o.product_code
-        INNER JOIN dim_date_times as t
-        ON t.date_uuid = o.date_uuid
-        GROUP BY t.year, t.month
-        ORDER BY total_sales DESC
-        LIMIT 10
-    '''
-    database_query.query_database(db_engine, query)
-    
-    
-    ####### STEP 42 #######
-    print_step_number(step_number)
-    query = '''
-        SELECT
-            SUM(staff_numbers) as total_staff_numbers,
-            country_code
-        FROM
-            dim_store_details
-        GROUP BY country_code
-        ORDER BY total_staff_numbers DESC
-    '''
-    # TODO: check if the query is correct as it returns different results than the expected
-    database_query.query_database(db_engine, query)
+    ####### STEPS 36 - 44 #######
+    # create or refresh the materialized views of the queries and read their results at the same time (REPORT_QUERY_WORKERS connections),
+    # the results are printed in the order of the steps, each query is a separate step
+    # the queries run in the background, so the time of each query is recorded as query_time_s (the wall time of the step
+    # only covers waiting for its result)
+    # all rows of each result are saved to REPORT_EXPORT_FOLDER when it is set
+    report_results = database_query.query_report_views(db_engine, report_queries, os.getenv('REPORT_QUERY_WORKERS', 4), os.getenv('REPORT_EXPORT_FOLDER'))
+    for report_query in report_queries:
+        print_step_number(step_number)
+        row_count, query_time = next(report_results)
+        metrics.record(rows_out=row_count, query_time_s=round(query_time, 3))
+    report_results.close()
+    if query_cache is not None:
+        logger.info(f'\n--> Query cache: {query_cache.hits} results read from the cache, {query_cache.misses} queries sent to the database.')
     
+    ####### STEP 45 #######
+    print_step_number(step_number)
+    # profile the report queries and compare their plans with the previous profiling run
+    if query_profiler is not None:
+        database_query.profile_queries(db_engine, report_queries)
     
-    ####### STEP 43 #######
-    print_step_number(step_number)
-    query = '''
-        SELECT 
-            ROUND(SUM(o.product_quantity * CAST(p.product_price as numeric)), 2) AS total_sales,
-            s.store_type,
-            s.country_code
-        FROM orders_table AS o
-        INNER JOIN dim_products as p
-        ON p.product_code = o.product_code
-        INNER JOIN dim_store_details as s
-        ON s.store_code = o.store_code
-        WHERE s.country_code = 'DE'
-        GROUP BY s.country_code, s.store_type
-        ORDER BY total_sales
-    '''
-    database_query.query_database(db_engine, query)
     
+
+def start_offline_queries():
+    # steps 35 - 45 of the offline mode (REPORT_MODE=offline)
+    database_query = DatabaseQuery()
+    logger.info(f'\n--> DatabaseQuery class has been initiated.')
+    snapshot = StarSchemaSnapshot()
+    logger.info(f'\n--> StarSchemaSnapshot class has been initiated.')
     
-    ####### STEP 44 #######
-    print_step_number(step_number)
-    query = '''
-        WITH sale_times AS (
-            SELECT 
-                year,
-                (year || '-' || month || '-' || day || ' ' || timestamp)::timestamp AS sale_date_time,
-                LEAD((year || '-' || month || '-' || day || ' ' || timestamp)::timestamp) 
-                    OVER (ORDER BY year, month, day, timestamp) AS next_sale_date_time,
-                LEAD((year || '-' || month || '-' || day || ' ' || timestamp)::timestamp) 
-                    OVER (ORDER BY year, month, day, timestamp) - (year || '-' || month || '-' || day || ' ' || timestamp)::timestamp AS time_difference
-            FROM dim_date_times
-            ORDER BY year, month, day, timestamp
-        )
-        SELECT 
-            year,
-            (
-                ' "hours": ' || EXTRACT(HOUR FROM AVG(time_difference) ) || 
-                ' "minutes": ' || EXTRACT(MINUTE FROM AVG(time_difference) ) || 
-                ' "seconds": ' || EXTRACT(SECOND FROM AVG(time_difference) ) || 
-                ' "milliseconds": ' || EXTRACT(MILLISECOND FROM AVG(time_difference)) 
-            ) AS actual_time_taken
-        FROM sale_times
-        GROUP BY year
-        ORDER BY AVG(time_difference) DESC
-        LIMIT 5;
-    '''
-    database_query.query_database(db_engine, query)
+    ####### STEPS 36 - 44 #######
+    # run each query on the snapshot in-process, each query is a separate step
+    for report_query in report_queries:
+        print_step_number(step_number)
+        # queries using PostgreSQL only syntax have a DuckDB version
+        metrics.record(rows_out=database_query.query_snapshot(snapshot, report_query.get('offline_query', report_query['query'])))
     
     ####### STEP 45 #######
     print_step_number(step_number)
     
     
-    
 if __name__ == '__main__':
-    #################### VARIABLES: ####################
-    divider_symbol_count = 80 # length of a divider line when priting out output
-    divider_line = '#' * divider_symbol_count # symbol used as a divider line
-    # list of steps
-    steps = [
-        'STEP 1: Initialisation',
-        'STEP 2: Reading the list of tables from the Source DB',
-        'STEP 3: Retriving Users data from the legacy_users source db table',
-        'STEP 4: Cleaning Users data',
-        'STEP 5: Uploading Users data to the Output database',
-        'STEP 6: Retriving Orders data from orders_table Source db table',
-        'STEP 7: Cleaning Orders data',
-        'STEP 8: Uploading Orders data to the Output database',
-        'STEP 9: Retriving Card Details data from the PDF file',
-        'STEP 10: Cleaning Card Details data',
-        'STEP 11: Uploading Card Details data to the Output database',
-        'STEP 12: Retriving Stores data from API',
-        'STEP 13: Cleaning Stores data',
-        'STEP 14: Uploading Stores data to the Output database',
-        'STEP 15: Retriving Products data from CSV file',
-        'STEP 16: Cleaning Products data',
-        'STEP 17: Uploading Products data to the Output database',
-        'STEP 18: Retriving Date Events data from JSON file',
-        'STEP 19: Cleaning Date Events data',
-        'STEP 20: Uploading Date Events data to the Output database',
-        'SUCCESS: All data has been successfully extracted, cleaned and uploaded to the DB',
-        '############################     DATABASE SCHEMA    ############################',
-        'STEP 23: Initialisation',
-        'STEP 24: Reading the list of tables from the Output DB',
-        'STEP 25: Updating table column types: orders_table',
-        'STEP 26: Updating table column types: dim_users',
-        'STEP 27: Updating table column types: dim_store_details',
-        'STEP 28: Updating table column types: dim_products',
-        'STEP 29: Updating table column types: dim_date_times',
-        'STEP 30: Updating table column types: dim_card_details',
-        'STEP 31: Adding Primary Keys to the dimensio tables',
-        'STEP 32: Adding Foreign Keys to the fact table',
-        'SUCCESS: All alterations to the database schema have been successfully completed',
-        '############################     DATABASE QUERIES    ############################',
-        'STEP 35: Initialisation',
-        'STEP 36: No. of stores in each country',
-        'STEP 37: Locations with the most stores',
-        'STEP 38: Which months produced the largest amount of sales',
-        'STEP 39: How many sales are coming from online',
-        'STEP 40: What percentage of sales come through each type of store',
-        'STEP 41: Which month in each year produced the highest cost of sales',
-        'STEP 42: What is our staff headcount',
-        'STEP 43: Which German store type is selling the most',
-        'STEP 44: How quickly is the company making sales',
-        'SUCCESS: All database queries have been successfully completed'
-    ]
-
-    # initial step number
-    step_number = 0 
-
-    start_data_processing()
-    # step_number = 21
-    start_database_schema_update()
-    # step_number = 33
-    start_database_queries()
\ No newline at end of file
+    if os.getenv('REPORT_MODE') == 'offline':
+        # the reports are created from the snapshot only, so the data processing and the schema update are skipped
+        step_number = 33
+    else:
+        start_data_processing()
+        # step_number = 21
+        start_database_schema_update()
+        # step_number = 33
+    start_database_queries()
+    
+    # print out the time and memory used by each step
+    metrics.print_summary()
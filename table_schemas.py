@@ -0,0 +1,143 @@
+'''
+Schema of the output database tables. DatabaseConnector class uses it to create the tables with their final column types
+before the data is uploaded, so the data goes straight into typed columns and the columns don't need to be altered afterwards.
+
+Column types:
+    - 'varchar' - VARCHAR sized to the longest text in the column of the uploaded DataFrame,
+    - 'uuid' - UUID,
+    - any other value is used as the PostgreSQL column type (e.g. 'varchar(255)', 'date', 'smallint', 'float', 'boolean').
+Columns which are not listed get a type based on the type of the DataFrame column (see default_column_types).
+
+Variables:
+-------
+table_schemas: dict
+    Dictionary with table names as keys and dictionaries of column names and types as values.
+    sales_rollup is built from the orders at load time and used by the report queries instead of orders_table.
+default_column_types: dict
+    Dictionary with pandas inferred types as keys and PostgreSQL column types as values.
+primary_keys: dict
+    Dictionary with dimension table names as keys and primary key columns as values.
+foreign_keys: dict
+    Dictionary with the foreign table names as keys and the foreign keys of the orders_table as values.
+indexed_columns: dict
+    Dictionary with table names as keys and lists of columns indexed when they are used by the report queries as values.
+    No report query reads orders_table (the sales queries read sales_rollup), so its foreign keys are not indexed. Only the country
+    code filtered by step 43 is indexed in sales_rollup, the queries grouping the whole table by the other columns don't use indexes.
+partitioning_options: dict
+    Dictionary with the values of ORDERS_PARTITIONING in .env file as keys and the partitioning of the orders_table as values:
+        - 'year' - one LIST partition for each year of the orders (year of the order from dim_date_times through date_uuid),
+        - 'hash' - HASH partitions of the store_code.
+'''
+
+
+######### VARIABLES #########
+table_schemas = {
+    'orders_table': {
+        'date_uuid': 'uuid',
+        'user_uuid': 'uuid',
+        'card_number': 'varchar',
+        'store_code': 'varchar',
+        'product_code': 'varchar',
+        'product_quantity': 'smallint',
+        'order_year': 'smallint', # only when orders_table is partitioned by year
+    },
+    'dim_users': {
+        'first_name': 'varchar(255)',
+        'last_name': 'varchar(255)',
+        'date_of_birth': 'date',
+        'country_code': 'varchar',
+        'user_uuid': 'uuid',
+        'join_date': 'date',
+    },
+    'dim_store_details': {
+        'longitude': 'float',
+        'locality': 'varchar(255)',
+        'store_code': 'varchar',
+        'staff_numbers': 'smallint',
+        'opening_date': 'date',
+        'store_type': 'varchar(255)',
+        'latitude': 'float',
+        'country_code': 'varchar',
+        'continent': 'varchar(255)',
+    },
+    'dim_products': {
+        'product_price': 'float',
+        'weight': 'float',
+        'EAN': 'varchar',
+        'product_code': 'varchar',
+        'date_added': 'date',
+        'uuid': 'uuid',
+        'still_available': 'boolean',
+        'weight_class': 'varchar',
+    },
+    'dim_date_times': {
+        'month': 'smallint',  # TODO: Milestone 3, task 6, asks to change the column type to 'varchar'. If needed then change the column type here.
+        'year': 'smallint', # TODO: Milestone 3, task 6, asks to change the column type to 'varchar'. If needed then change the column type here.
+        'day': 'smallint', # TODO: Milestone 3, task 6, asks to change the column type to 'varchar'. If needed then change the column type here.
+        'time_period': 'varchar',
+        'date_uuid': 'uuid',
+        'event_ts': 'timestamp',
+    },
+    'dim_card_details': {
+        'card_number': 'varchar',
+        'expiry_date': 'varchar',
+        'date_payment_confirmed': 'date',
+    },
+    'sales_rollup': {
+        'year': 'smallint',
+        'month': 'smallint',
+        'store_code': 'varchar',
+        'store_type': 'varchar(255)',
+        'country_code': 'varchar',
+        'channel': 'varchar',
+        'has_product': 'boolean',
+        'has_store': 'boolean',
+        'has_date': 'boolean',
+        'total_sales': 'numeric(14, 2)',
+        'product_quantity': 'bigint',
+        'number_of_sales': 'bigint',
+    },
+}
+
+# column types used for the columns not listed in table_schemas (keys are the values returned by pandas.api.types.infer_dtype)
+default_column_types = {
+    'string': 'TEXT',
+    'integer': 'BIGINT',
+    'floating': 'DOUBLE PRECISION',
+    'mixed-integer-float': 'DOUBLE PRECISION',
+    'decimal': 'NUMERIC',
+    'boolean': 'BOOLEAN',
+    'datetime64': 'TIMESTAMP',
+    'datetime': 'TIMESTAMP',
+    'date': 'DATE',
+    'time': 'TIME',
+}
+
+primary_keys = {
+    'dim_users': 'user_uuid',
+    'dim_store_details': 'store_code',
+    'dim_products': 'product_code',
+    'dim_date_times': 'date_uuid',
+    'dim_card_details': 'card_number',
+}
+
+foreign_keys = {
+    'dim_users': 'user_uuid',
+    'dim_store_details': 'store_code',
+    'dim_products': 'product_code',
+    'dim_date_times': 'date_uuid',
+    'dim_card_details': 'card_number',
+}
+
+indexed_columns = {
+    'dim_date_times': ['event_ts'],
+    'sales_rollup': ['country_code'],
+}
+
+# number of partitions when orders_table is partitioned by the hash of the store code
+hash_partitions = 8
+
+partitioning_options = {
+    'year': {'method': 'list', 'column': 'order_year'},
+    'hash': {'method': 'hash', 'column': 'store_code', 'partitions': hash_partitions},
+}
@@ -0,0 +1,140 @@
+import duckdb
+import pandas as pd
+import pytest
+
+import data_cleaning
+from data_cleaning import DataCleaning
+
+
+def products_chunk(weights):
+    return pd.DataFrame({'product_name': ['p'] * len(weights),
+                         'product_price': ['£1.50'] * len(weights),
+                         'weight': weights,
+                         'removed': ['Still_avaliable'] * len(weights),
+                         'date_added': ['2020-01-01'] * len(weights)})
+
+
+def test_chunks_keep_blank_columns_until_concatenated():
+    cleaning = DataCleaning()
+    string_columns = ['product_name', 'product_price', 'weight', 'removed']
+    chunks = []
+    for chunk in [products_chunk(['1kg', '500g']), products_chunk([None, None])]:
+        cleaned_chunk = cleaning.clean_user_data(chunk, string_columns, ['date_added'], drop_blank_columns=False)
+        chunks.append(cleaning.clean_products_data(cleaned_chunk))
+    assert chunks[0].columns.tolist() == chunks[1].columns.tolist()
+    df = cleaning.remove_blank_columns(pd.concat(chunks))
+    # the rows without a weight are blank rows, but the chunk is still cleaned without a missing column
+    assert df.shape[0] == 2
+    assert 'weight' in df
+
+
+def test_remove_blank_columns():
+    df = pd.DataFrame({'a': [1, 2], 'b': [None, None]})
+    assert DataCleaning().remove_blank_columns(df).columns.tolist() == ['a']
+
+
+def test_orders_without_a_valid_year_are_quarantined(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_cleaning, 'quarantine_folder', str(tmp_path))
+    orders = pd.DataFrame({'date_uuid': ['d1', 'd2', 'd3', None], 'product_quantity': [1, 2, 3, 4]})
+    # the blank year of d2 has been changed to 0 by clean_user_data()
+    date_years = pd.DataFrame({'date_uuid': ['d1', 'd2', 'd3'], 'year': [2020, 0, 2021]})
+    df = DataCleaning().add_order_year(orders, date_years)
+    assert df['product_quantity'].tolist() == [1, 3, 4]
+    assert df['order_year'].isna().tolist() == [False, False, True]
+    assert pd.read_csv(tmp_path / 'orders_table_invalid_years.csv')['date_uuid'].tolist() == ['d2']
+
+
+def test_weight_class_and_still_available_match_the_baseline_queries():
+    # weights on both sides of each class limit, a weight which can't be converted and a blank availability
+    products = products_chunk(['1999g', '2kg', '39.99kg', '40kg', '139kg', '140kg', 'unknown', '500g'])
+    products['removed'] = ['Still_avaliable', 'Removed', 'Still_avaliable', 'Removed', None, 'Still_avaliable', 'Removed', None]
+    df = DataCleaning().clean_products_data(products.copy())
+    # the CASE expressions of the baseline schema update (queries_table_alterations.sql, task 4)
+    connection = duckdb.connect()
+    connection.register('dim_products', pd.DataFrame({'weight': df['weight'], 'removed': products['removed']}))
+    expected = connection.execute('''
+        SELECT CASE
+                   WHEN weight < 2 THEN 'Light'
+                   WHEN weight >= 2 AND weight < 40 THEN 'Mid_Sized'
+                   WHEN weight >= 40 AND weight < 140 THEN 'Heavy'
+                   ELSE 'Truck_Required'
+               END AS weight_class,
+               CASE WHEN removed = 'Removed' THEN False ELSE True END AS still_available
+        FROM dim_products''').df()
+    assert 'removed' not in df
+    assert df['weight_class'].tolist() == expected['weight_class'].tolist()
+    assert df['still_available'].tolist() == expected['still_available'].tolist()
+
+
+def stores_with_duplicate_keys():
+    return pd.DataFrame({'store_code': ['s1', 's2', 's1', None, 's3', 's2'], 'staff_numbers': [1, 2, 3, 4, 5, 6]})
+
+
+def test_unique_keys_are_kept():
+    df = pd.DataFrame({'store_code': ['s1', 's2'], 'staff_numbers': [1, 2]})
+    assert DataCleaning().remove_duplicate_keys(df, 'store_code', 'dim_store_details') is df
+
+
+@pytest.mark.parametrize('keep, staff_numbers', [('first', [1, 2, 5]), ('last', [3, 5, 6])])
+def test_duplicate_keys_keep_one_row_and_blank_keys_are_removed(keep, staff_numbers):
+    df = DataCleaning().remove_duplicate_keys(stores_with_duplicate_keys(), 'store_code', 'dim_store_details', keep)
+    assert df['staff_numbers'].tolist() == staff_numbers
+
+
+def test_duplicate_keys_are_quarantined(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_cleaning, 'quarantine_folder', str(tmp_path))
+    df = DataCleaning().remove_duplicate_keys(stores_with_duplicate_keys(), 'store_code', 'dim_store_details', 'quarantine')
+    assert df['staff_numbers'].tolist() == [5]
+    quarantined = pd.read_csv(tmp_path / 'dim_store_details_duplicate_keys.csv')
+    assert quarantined['staff_numbers'].tolist() == [1, 2, 3, 4, 6]
+
+
+@pytest.mark.parametrize('keep', ['report', 'unknown'])
+def test_duplicate_keys_stop_the_programme_when_reported(keep):
+    with pytest.raises(SystemExit):
+        DataCleaning().remove_duplicate_keys(stores_with_duplicate_keys(), 'store_code', 'dim_store_details', keep)
+
+
+def orders_with_orphan_keys():
+    return pd.DataFrame({'store_code': ['s1', 'x1', None, 's2', 's1'],
+                         'product_code': ['p1', 'p1', 'p2', 'x2', None],
+                         'product_quantity': [1, 2, 3, 4, 5]})
+
+
+def orders_dimension_keys():
+    return {'store_code': pd.Series(['s1', 's2']), 'product_code': pd.Series(['p1', 'p2'])}
+
+
+def test_orphan_keys_are_quarantined_and_blank_keys_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_cleaning, 'quarantine_folder', str(tmp_path))
+    df = DataCleaning().remove_orphan_keys(orders_with_orphan_keys(), orders_dimension_keys(), 'orders_table', 'quarantine')
+    assert df['product_quantity'].tolist() == [1, 3, 5]
+    assert pd.read_csv(tmp_path / 'orders_table_orphan_keys.csv')['product_quantity'].tolist() == [2, 4]
+
+
+def test_orders_without_orphan_keys_are_kept():
+    orders = orders_with_orphan_keys().iloc[[0, 2, 4]]
+    assert DataCleaning().remove_orphan_keys(orders, orders_dimension_keys(), 'orders_table') is orders
+
+
+@pytest.mark.parametrize('mode', ['report', 'unknown'])
+def test_orphan_keys_stop_the_programme_when_reported(mode):
+    with pytest.raises(SystemExit):
+        DataCleaning().remove_orphan_keys(orders_with_orphan_keys(), orders_dimension_keys(), 'orders_table', mode)
+
+
+def test_event_timestamps_are_made_of_the_date_and_time_of_the_events():
+    cleaning = DataCleaning()
+    # the date events are cleaned as in step 15 (a blank year becomes 0, the timestamp keeps only the time)
+    events = pd.DataFrame({'timestamp': ['22:00:06', '09:05:00', '12:00:00', '13:30:00'],
+                           'month': ['9', '2', '2', None],
+                           'year': ['2012', '2020', '2021', '2022'],
+                           'day': ['19', '29', '29', '1'],
+                           'time_period': ['Evening', 'Morning', 'Midday', 'Midday'],
+                           'date_uuid': ['d1', 'd2', 'd3', 'd4']})
+    cleaned_events = cleaning.clean_user_data(events, ['time_period', 'date_uuid'], ['timestamp'], ['month', 'year', 'day'],
+                                              ['month', 'year', 'day'], drop_blank_columns=False)
+    df = cleaning.add_event_timestamps(cleaned_events)
+    # 29 February 2021 and month 0 are not valid dates
+    assert df['event_ts'].tolist()[:2] == [pd.Timestamp('2012-09-19 22:00:06'), pd.Timestamp('2020-02-29 09:05:00')]
+    assert df['event_ts'].isna().tolist() == [False, False, True, True]
@@ -0,0 +1,62 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from data_extraction import DataExtractor
+from data_processing import DataProcessing
+
+
+@pytest.fixture
+def extractor(monkeypatch):
+    monkeypatch.setenv('EXTRACTION_MODE', 'live')
+    return DataExtractor()
+
+
+def stream_from(monkeypatch, content):
+    # the remote file is read from memory instead of the network
+    monkeypatch.setattr(DataProcessing, 'open_stream', lambda self, path: io.BufferedReader(io.BytesIO(content.encode())))
+
+
+def test_csv_is_yielded_in_chunks(monkeypatch, extractor):
+    stream_from(monkeypatch, ',a,b\n0,1,x\n1,2,y\n2,3,z\n')
+    chunks = list(extractor.iter_remote_chunks('s3://bucket/file.csv', 'csv', chunk_rows=2))
+    assert [chunk.shape[0] for chunk in chunks] == [2, 1]
+    assert pd.concat(chunks)['a'].tolist() == [1, 2, 3]
+
+
+def test_json_array_is_yielded_in_chunks(monkeypatch, extractor):
+    records = [{'a': i, 'b': str(i)} for i in range(5)]
+    stream_from(monkeypatch, json.dumps(records))
+    chunks = list(extractor.iter_remote_chunks('s3://bucket/file.json', 'json', chunk_rows=2))
+    assert [chunk.shape[0] for chunk in chunks] == [2, 2, 1]
+    assert pd.concat(chunks)['b'].tolist() == ['0', '1', '2', '3', '4']
+
+
+def test_json_lines_are_yielded_in_chunks(monkeypatch, extractor):
+    stream_from(monkeypatch, '\n'.join(json.dumps({'a': i}) for i in range(3)) + '\n')
+    chunks = list(extractor.iter_remote_chunks('s3://bucket/file.jsonl', 'json', chunk_rows=2))
+    assert [chunk.shape[0] for chunk in chunks] == [2, 1]
+
+
+def test_json_object_of_columns_is_yielded_in_chunks(monkeypatch, extractor):
+    content = json.dumps({'timestamp': {'0': '22:00:06', '1': '17:24:46', '2': None},
+                          'month': {'0': '9', '1': '2', '2': 'NULL'},
+                          'date_uuid': {'0': 'a', '1': 'b', '2': 'c'}})
+    stream_from(monkeypatch, content)
+    chunks = list(extractor.iter_remote_chunks('s3://bucket/file.json', 'json', chunk_rows=2))
+    assert [chunk.shape[0] for chunk in chunks] == [2, 1]
+    df = pd.concat(chunks)
+    assert df.index.tolist() == [0, 1, 2]
+    assert df['timestamp'].iloc[:2].tolist() == ['22:00:06', '17:24:46']
+    assert pd.isna(df['timestamp'].iloc[2])
+    assert df['month'].tolist() == ['9', '2', 'NULL']
+
+
+def test_json_object_chunks_are_copies(monkeypatch, extractor):
+    stream_from(monkeypatch, json.dumps({'a': {'0': 1, '1': 2, '2': 3}}))
+    chunks = extractor.iter_remote_chunks('s3://bucket/file.json', 'json', chunk_rows=2)
+    first_chunk = next(chunks)
+    first_chunk['a'] = 0
+    assert next(chunks)['a'].tolist() == [3]
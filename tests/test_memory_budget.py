@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+
+import memory_budget
+from memory_budget import MemoryBudget
+
+
+def frame(rows):
+    return pd.DataFrame({'a': range(rows), 'b': [float(i) for i in range(rows)]})
+
+
+def frame_mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 / 1024
+
+
+@pytest.fixture
+def rss(monkeypatch):
+    # the process memory is set by the tests, so the budget only depends on the DataFrames kept
+    usage = {'bytes': 0}
+    monkeypatch.setattr(memory_budget, 'current_rss_bytes', lambda: usage['bytes'])
+    return usage
+
+
+def spill_files(tmp_path):
+    return sorted(path.stem for path in tmp_path.iterdir()) if tmp_path.exists() else []
+
+
+def test_least_recently_used_frame_is_spilled_and_loaded_back(tmp_path, rss):
+    df = frame(200000)
+    budget = MemoryBudget(budget_mb=1.5 * frame_mb(df) // 1 + 1, spill_folder=tmp_path)
+    budget.put('first', df)
+    budget.put('second', frame(200000))
+    assert spill_files(tmp_path) == ['first']
+    assert budget.rows('first') == 200000
+    pd.testing.assert_frame_equal(budget.pop('first'), df)
+    # the least recently used frame is spilled to make room for the frame loaded back
+    assert spill_files(tmp_path) == ['second']
+
+
+def test_released_frames_free_the_budget(tmp_path, rss):
+    budget = MemoryBudget(budget_mb=frame_mb(frame(200000)) // 1 + 1, spill_folder=tmp_path)
+    budget.put('first', frame(200000))
+    budget.release('first')
+    # the process memory does not go down after the release, but the frame is no longer counted
+    rss['bytes'] = int(budget.budget_bytes * 1.5)
+    budget.put('second', frame(200000))
+    assert spill_files(tmp_path) == []
+
+
+def test_frame_over_the_budget_is_kept_on_disk(tmp_path, rss):
+    budget = MemoryBudget(budget_mb=1, spill_folder=tmp_path)
+    df = frame(200000)
+    budget.put('large', df)
+    assert spill_files(tmp_path) == ['large']
+    pd.testing.assert_frame_equal(budget.get('large'), df)
+    assert spill_files(tmp_path) == ['large']
+    budget.release('large')
+    assert spill_files(tmp_path) == []
+
+
+def test_process_memory_is_a_secondary_guard(tmp_path, rss):
+    budget = MemoryBudget(budget_mb=100, spill_folder=tmp_path)
+    budget.put('first', frame(1000))
+    rss['bytes'] = budget.budget_bytes * memory_budget.rss_guard_factor + 1
+    budget.put('second', frame(1000))
+    assert spill_files(tmp_path) == ['first', 'second']
+
+
+def test_no_budget_keeps_frames_in_memory(tmp_path, rss):
+    rss['bytes'] = 10 ** 12
+    budget = MemoryBudget(budget_mb=0, spill_folder=tmp_path)
+    budget.put('first', frame(1000))
+    assert spill_files(tmp_path) == []
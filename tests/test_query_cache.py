@@ -0,0 +1,81 @@
+from datetime import date
+from decimal import Decimal
+
+import query_cache
+from query_cache import QueryCache
+
+
+class FakeResult(list):
+    def fetchall(self):
+        return list(self)
+
+
+class FakeEngine:
+    # answers the catalog queries of the query cache with the versions set by the tests
+    def __init__(self, versions):
+        self.versions = versions
+
+    def execute(self, query, parameters=None):
+        if str(query) == query_cache.relations_query:
+            return FakeResult((name,) for name in self.versions)
+        if str(query) == query_cache.table_versions_query:
+            return FakeResult((name, self.versions[name]) for name in parameters['table_names'])
+        return FakeResult()
+
+
+def test_key_changes_only_with_the_tables_used_by_the_query(tmp_path):
+    engine = FakeEngine({'sales_rollup': 'load 1|100', 'dim_users': 'load 1|200'})
+    cache = QueryCache(folder=tmp_path)
+    key = cache.key(engine, 'SELECT * FROM sales_rollup;')
+    assert cache.key(engine, '  SELECT *\n FROM sales_rollup ') == key
+    engine.versions['dim_users'] = 'load 2|201'
+    assert cache.key(engine, 'SELECT * FROM sales_rollup') == key
+    engine.versions['sales_rollup'] = 'load 2|101'
+    assert cache.key(engine, 'SELECT * FROM sales_rollup') != key
+
+
+def test_result_is_saved_as_plain_data(tmp_path):
+    engine = FakeEngine({'sales_rollup': 'load 1|100'})
+    cache = QueryCache(folder=tmp_path)
+    query = 'SELECT * FROM sales_rollup'
+    rows = [(Decimal('10.50'), 'DE', date(2020, 1, 1)), (None, 'GB', None)]
+    assert cache.get(engine, query) is None
+    cache.put(engine, query, ['total_sales', 'country_code', 'day'], rows)
+    assert [path.suffix for path in tmp_path.iterdir() if path.name != query_cache.index_file_name] == ['.parquet']
+    assert cache.get(engine, query) == (['total_sales', 'country_code', 'day'], rows)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_result_saved_with_the_key_read_before_the_query(tmp_path):
+    engine = FakeEngine({'sales_rollup': 'load 1|100'})
+    cache = QueryCache(folder=tmp_path)
+    query = 'SELECT * FROM sales_rollup'
+    key = cache.key(engine, query)
+    # the table is loaded again while the query is running
+    engine.versions['sales_rollup'] = 'load 2|101'
+    cache.put(engine, query, ['a'], [(1,)], key)
+    assert cache.get(engine, query) is None
+
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    engine = FakeEngine({'a': 'load 1|1', 'b': 'load 1|2', 'c': 'load 1|3'})
+    cache = QueryCache(folder=tmp_path)
+    cache.put(engine, 'SELECT * FROM a', ['x'], [(i,) for i in range(1000)])
+    result_size = next(iter(cache.index.values()))['size']
+    cache.max_size_bytes = 2 * result_size
+    cache.put(engine, 'SELECT * FROM b', ['x'], [(i,) for i in range(1000)])
+    cache.get(engine, 'SELECT * FROM a')
+    cache.put(engine, 'SELECT * FROM c', ['x'], [(i,) for i in range(1000)])
+    assert cache.get(engine, 'SELECT * FROM a') is not None
+    assert cache.get(engine, 'SELECT * FROM b') is None
+    assert cache.get(engine, 'SELECT * FROM c') is not None
+
+
+def test_invalidate_removes_results_of_the_tables(tmp_path):
+    engine = FakeEngine({'a': 'load 1|1', 'b': 'load 1|2'})
+    cache = QueryCache(folder=tmp_path)
+    cache.put(engine, 'SELECT * FROM a', ['x'], [(1,)])
+    cache.put(engine, 'SELECT * FROM b', ['x'], [(1,)])
+    cache.invalidate(['a'])
+    assert cache.get(engine, 'SELECT * FROM a') is None
+    assert cache.get(engine, 'SELECT * FROM b') is not None
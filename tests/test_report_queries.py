@@ -0,0 +1,20 @@
+import duckdb
+import pandas as pd
+
+from report_queries import report_queries
+
+
+def test_sale_times_hours_are_not_limited_to_a_day():
+    query = next(report_query for report_query in report_queries if report_query['step'] == 44)
+    event_ts = pd.to_datetime(['2020-01-01 00:00:00', '2020-01-02 02:30:00.500', '2020-01-04 05:00:01', '2021-01-01 00:00:00'], format='ISO8601')
+    dim_date_times = pd.DataFrame({'year': event_ts.year, 'event_ts': event_ts})
+    connection = duckdb.connect()
+    connection.register('dim_date_times', dim_date_times)
+    result = dict(connection.execute(query.get('offline_query', query['query'])).fetchall())
+    connection.close()
+    # the gaps of 2020 are over 24 hours, the last one is the gap to the first event of 2021
+    average = (event_ts.to_series().diff().shift(-1)[:3]).mean()
+    hours, remainder = divmod(average.total_seconds(), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    assert result[2020] == f' "hours": {int(hours)} "minutes": {int(minutes)} "seconds": {seconds:.6f} "milliseconds": {seconds * 1000:.3f}'
+    assert result[2021] is None
@@ -0,0 +1,67 @@
+import re
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+import pytest
+
+from data_cleaning import DataCleaning
+from report_queries import report_queries
+
+# steps of the report queries reading sales_rollup and the tasks of queries_data.sql joining orders_table instead
+sales_steps = {38: 3, 39: 4, 40: 5, 41: 6, 43: 8}
+
+
+def baseline_queries():
+    text = (Path(__file__).parent.parent / 'queries_data.sql').read_text()
+    sections = re.split(r'-- #### TASK (\d+):.*####', text)
+    return {int(task): query for task, query in zip(sections[1::2], sections[2::2])}
+
+
+@pytest.fixture
+def star_schema():
+    products = pd.DataFrame({'product_code': ['p1', 'p2', 'p3'], 'product_price': [1.5, 2.25, 10.0]})
+    stores = pd.DataFrame({'store_code': ['s1', 's2', 's3', 'web'],
+                           'store_type': ['Local', 'Super Store', None, 'Web Portal'],
+                           'country_code': ['DE', 'GB', 'DE', None]})
+    dates = pd.DataFrame({'date_uuid': ['d1', 'd2', 'd3', 'd4'],
+                          'year': [2020, 2020, 2021, None],
+                          'month': [1, 2, 1, 5]})
+    # orders with blank keys (kept by remove_orphan_keys) and keys of every dimension combination
+    orders = pd.DataFrame({
+        'date_uuid': ['d1', 'd2', 'd3', None, 'd4', 'd1', 'd2', None, 'd3'],
+        'store_code': ['s1', 's2', 'web', 's1', None, 's3', 's1', None, 's2'],
+        'product_code': ['p1', 'p2', 'p3', 'p1', 'p2', None, 'p3', 'p2', 'p1'],
+        'product_quantity': [1, 2, 3, 4, 5, 6, 7, 8, 9],
+    })
+    rollup = DataCleaning().build_sales_rollup(orders, products, stores, dates)
+    connection = duckdb.connect()
+    for name, df in [('orders_table', orders), ('dim_products', products), ('dim_store_details', stores),
+                     ('dim_date_times', dates), ('sales_rollup', rollup)]:
+        connection.register(name, df)
+    yield connection, rollup
+    connection.close()
+
+
+def rows(connection, query):
+    result = connection.execute(query).fetchall()
+    # the rollup sums floats, the baseline sums numeric products, so the values are compared rounded to cents
+    return sorted(tuple(round(float(value), 2) if isinstance(value, (int, float)) or hasattr(value, 'as_tuple') else value
+                        for value in row) for row in result)
+
+
+@pytest.mark.parametrize('step', sorted(sales_steps))
+def test_rollup_matches_baseline_joins(star_schema, step):
+    connection, _ = star_schema
+    query = next(report_query for report_query in report_queries if report_query['step'] == step)
+    baseline = baseline_queries()[sales_steps[step]]
+    assert rows(connection, query.get('offline_query', query['query'])) == rows(connection, baseline)
+
+
+def test_rollup_keeps_unmatched_orders(star_schema):
+    _, rollup = star_schema
+    assert rollup['product_quantity'].sum() == 45
+    assert rollup['number_of_sales'].sum() == 7
+    unmatched_store = rollup[~rollup['has_store']]
+    assert unmatched_store['store_type'].isna().all()
+    assert unmatched_store['channel'].isna().all()